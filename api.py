@@ -0,0 +1,173 @@
+import contextlib
+import json
+import logging
+import os
+
+from starlette.applications import Starlette
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import JSONResponse, Response
+from starlette.routing import Mount, Route
+from starlette.staticfiles import StaticFiles
+
+from imagenes_estaticas import CACHE_INMUTABLE, DIR_ESTATICOS, NOMBRE_MANIFIESTO
+from metricas import METRICAS, TIPO_PROMETHEUS, texto_prometheus
+
+from recomendador import COLUMNAS_ENTRENAMIENTO
+from servicio import get_servicio
+
+# Servicio HTTP JSON (ASGI) sobre el mismo núcleo que la aplicación de
+# Streamlit. Cada worker carga su propio modelo y sus cachés:
+#
+#   uvicorn api:app --host 0.0.0.0 --port 8000 --workers 4
+#
+# Configuración por entorno: RUTA_MODELO (fichero o directorio de un
+# registro de modelos), MODO_DIFUSO, MODO_PREDICCION, API_KEY_AEMET y
+# API_KEY_OPENUV.
+#
+#   POST /recomendar  {"perfil": {...}, "clima": {...}}  (clima opcional)
+#   POST /puntuacion  {"tmax": 24, "tmin": 11, "lluvia": 10, "UV": 4.4}
+#   GET  /prevision   puntuación de exterior para cada día de la semana
+#   GET  /cercanos?lat=39.9&lon=-1.81&k=5&radio_km=2  (k o radio_km, o ambos)
+#   GET  /salud
+#   GET  /metricas    histogramas por etapa y contadores de caché (Prometheus),
+#                     de este worker
+#   GET  /static/img/...  variantes de imagenes_estaticas.py, con caché de un año
+
+MAX_CUERPO_BYTES = 64 * 1024
+# /cercanos solo responde cerca del catálogo y con radios acotados.
+MAX_DISTANCIA_CERCANOS_KM = 100.0
+MAX_RADIO_CERCANOS_KM = 200.0
+_COLUMNAS = set(COLUMNAS_ENTRENAMIENTO)
+
+
+class PeticionInvalida(ValueError):
+    pass
+
+
+async def _leer_json(request):
+    cuerpo = await request.body()
+    if len(cuerpo) > MAX_CUERPO_BYTES:
+        raise PeticionInvalida("Cuerpo demasiado grande.")
+    try:
+        datos = json.loads(cuerpo or b"{}")
+    except ValueError:
+        raise PeticionInvalida("El cuerpo no es JSON válido.")
+    if not isinstance(datos, dict):
+        raise PeticionInvalida("Se esperaba un objeto JSON.")
+    return datos
+
+
+def _validar_numericos(datos, nombre, claves_validas=None):
+    if not isinstance(datos, dict):
+        raise PeticionInvalida(f"'{nombre}' debe ser un objeto.")
+    for clave, valor in datos.items():
+        if claves_validas is not None and clave not in claves_validas:
+            continue
+        if isinstance(valor, bool) or not isinstance(valor, (int, float)):
+            raise PeticionInvalida(f"'{nombre}.{clave}' debe ser numérico.")
+    return datos
+
+
+def _error(e, estado=400):
+    return JSONResponse({"error": str(e)}, status_code=estado)
+
+
+async def recomendar(request):
+    try:
+        datos = await _leer_json(request)
+        perfil = _validar_numericos(datos.get("perfil"), "perfil", _COLUMNAS)
+        clima = datos.get("clima")
+        if clima is not None:
+            clima = _validar_numericos(clima, "clima", {"tmax", "tmin", "lluvia", "UV"})
+    except PeticionInvalida as e:
+        return _error(e)
+    resultado = await run_in_threadpool(get_servicio().recomendar, perfil, clima)
+    return JSONResponse(resultado)
+
+
+async def puntuacion(request):
+    try:
+        clima = _validar_numericos(await _leer_json(request), "clima", {"tmax", "tmin", "lluvia", "UV"})
+    except PeticionInvalida as e:
+        return _error(e)
+    score = await run_in_threadpool(get_servicio().puntuar_clima, clima)
+    return JSONResponse({"score_exterior": score})
+
+
+async def prevision(request):
+    try:
+        dias = await run_in_threadpool(get_servicio().prevision_por_dias)
+    except Exception as e:
+        return _error(e, 503)
+    return JSONResponse({"dias": dias})
+
+
+async def cercanos(request):
+    parametros = request.query_params
+    try:
+        lat = float(parametros["lat"])
+        lon = float(parametros["lon"])
+        k = int(parametros["k"]) if "k" in parametros else None
+        radio_km = float(parametros["radio_km"]) if "radio_km" in parametros else None
+    except KeyError as e:
+        return _error(f"Falta el parámetro {e}.")
+    except ValueError:
+        return _error("lat, lon, k y radio_km deben ser numéricos.")
+    if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+        return _error("Coordenadas fuera de rango.")
+    if k is None and radio_km is None:
+        k = 5
+    if (k is not None and not 0 < k <= 100) or (radio_km is not None and not 0 < radio_km <= MAX_RADIO_CERCANOS_KM):
+        return _error(f"k debe estar entre 1 y 100 y radio_km entre 0 y {MAX_RADIO_CERCANOS_KM:g}.")
+    servicio = get_servicio()
+    if servicio.indice_espacial.distancia_extension_km(lat, lon) > MAX_DISTANCIA_CERCANOS_KM:
+        return _error(f"El punto está a más de {MAX_DISTANCIA_CERCANOS_KM:g} km de los lugares del catálogo.")
+    lugares = await run_in_threadpool(servicio.cercanos, lat, lon, k=k, radio_km=radio_km)
+    return JSONResponse({"lugares": lugares})
+
+
+async def salud(request):
+    try:
+        estadisticas = await run_in_threadpool(get_servicio().estadisticas)
+    except Exception as e:
+        return _error(e, 503)
+    return JSONResponse({"ok": True, "pid": os.getpid(), **estadisticas, "etapas": METRICAS.resumen()})
+
+
+async def metricas(request):
+    return Response(texto_prometheus(), media_type=TIPO_PROMETHEUS)
+
+
+class EstaticosInmutables(StaticFiles):
+    # Los ficheros llevan el hash del contenido en el nombre, así que nunca
+    # cambian; el manifiesto sí y se revalida siempre.
+    def file_response(self, full_path, stat_result, scope, status_code=200):
+        respuesta = super().file_response(full_path, stat_result, scope, status_code)
+        nombre = os.path.basename(full_path)
+        respuesta.headers["Cache-Control"] = "no-cache" if nombre == NOMBRE_MANIFIESTO else CACHE_INMUTABLE
+        return respuesta
+
+
+@contextlib.asynccontextmanager
+async def _ciclo_vida(app):
+    # Crea y calienta el servicio (modelo, motor difuso, clima) antes de
+    # aceptar peticiones; la duración de cada etapa va al log de uvicorn y
+    # a GET /salud.
+    servicio = await run_in_threadpool(get_servicio)
+    logging.getLogger("uvicorn.error").info("Arranque: %s", json.dumps(servicio.arranque, ensure_ascii=False))
+    yield
+
+
+app = Starlette(
+    routes=[
+        Route("/recomendar", recomendar, methods=["POST"]),
+        Route("/puntuacion", puntuacion, methods=["POST"]),
+        Route("/prevision", prevision, methods=["GET"]),
+        Route("/cercanos", cercanos, methods=["GET"]),
+        Route("/salud", salud, methods=["GET"]),
+        Route("/metricas", metricas, methods=["GET"]),
+        Mount("/static/img", EstaticosInmutables(directory=os.environ.get("DIR_IMAGENES", DIR_ESTATICOS),
+                                                 check_dir=False), name="imagenes"),
+    ],
+    lifespan=_ciclo_vida,
+)
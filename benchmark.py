@@ -0,0 +1,316 @@
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+
+from catalogo import get_catalogo
+from logger_backends import BackendEventos
+from mapa import MODOS_MAPA, RenderizadorMapa, datos_popup, popup_html_responsive
+from recomendador import (
+    ACTIVIDADES,
+    FRECUENCIAS_ACTIVIDAD,
+    FRECUENCIAS_RECOMENDACION,
+    GENEROS,
+    RESIDENCIAS,
+    PredictorCacheado,
+    codificar_fila,
+    codificar_formulario,
+    filtrar_por_clima,
+)
+from servicio import RUTA_MODELO, ServicioRecomendacion, crear_motor_difuso
+
+# Banco de pruebas del camino de una recomendación, etapa a etapa y sin red
+# ni Streamlit: el clima sale de un proveedor falso y log_event escribe en
+# un spool temporal que se replica a un backend en memoria en lugar de a
+# Google Sheets. Las respuestas del formulario y los climas se generan con
+# una semilla, así que dos ejecuciones miden lo mismo.
+#
+#   python benchmark.py --iteraciones 300
+#   python benchmark.py --comparar benchmarks/<anterior>.json --umbral 1.2
+#
+# Por defecto las cachés de predicciones, puntuación difusa y mapas están
+# desactivadas y cada iteración mide el cálculo completo; con --caches se
+# usan con su tamaño normal. Los resultados (p50/p95/p99 y operaciones por
+# segundo de cada etapa, más el commit y el entorno) se guardan en JSON.
+
+ETAPAS = (
+    "codificacion", "prediccion", "puntuacion_difusa", "filtro_clima",
+    "alternativas", "popups", "mapa", "log_event",
+)
+DIR_RESULTADOS = "benchmarks"
+FORMATO_RESULTADOS = 1
+
+
+class ProveedorClimaFalso:
+    # Devuelve los climas de la lista por turnos, como si cada petición
+    # llegara en un momento distinto.
+    def __init__(self, climas):
+        self.climas = climas
+        self._i = 0
+
+    def obtener_clima_hoy(self):
+        clima = self.climas[self._i % len(self.climas)]
+        self._i += 1
+        return clima
+
+
+class BackendMemoria(BackendEventos):
+    def __init__(self):
+        self.filas = []
+
+    def append_rows(self, filas):
+        self.filas.extend(filas)
+
+
+def respuestas_aleatorias(n, semilla=0):
+    # Respuestas con la forma de las de formulario_usuario().
+    rng = np.random.default_rng(semilla)
+
+    def elegir(opciones):
+        return opciones[int(rng.integers(len(opciones)))]
+
+    def actividades():
+        return [a for a in ACTIVIDADES if rng.random() < 0.35]
+
+    return [
+        {
+            "edad": int(rng.integers(10, 81)),
+            "genero": elegir(list(GENEROS)),
+            "residencia": elegir(RESIDENCIAS),
+            "frecuencia_actividad": elegir(FRECUENCIAS_ACTIVIDAD),
+            "frecuencia_recomendacion": elegir(FRECUENCIAS_RECOMENDACION),
+            "familias": actividades(),
+            "jovenes": actividades(),
+            "mayores": actividades(),
+        }
+        for _ in range(n)
+    ]
+
+
+def climas_aleatorios(n, semilla=0):
+    # Mezcla de días buenos y malos para que el filtro descarte lugares
+    # en una parte de las iteraciones.
+    rng = np.random.default_rng(semilla + 1)
+    climas = []
+    for _ in range(n):
+        tmax = float(rng.uniform(2, 38))
+        climas.append({
+            "tmax": round(tmax, 1),
+            "tmin": round(tmax - float(rng.uniform(4, 16)), 1),
+            "lluvia": int(rng.integers(0, 101)),
+            "UV": round(float(rng.uniform(0, 10)), 1),
+        })
+    return climas
+
+
+def _escritor_falso(directorio):
+    import logger_gsheets
+    from logger_gsheets import EscritorEventos, ReplicadorSpool, SpoolEventos
+
+    backend = BackendMemoria()
+    spool = SpoolEventos(os.path.join(directorio, "eventos_spool.jsonl"))
+    logger_gsheets._escritor = EscritorEventos(ReplicadorSpool(spool, backend))
+    return logger_gsheets._escritor, backend
+
+
+def resumir(tiempos):
+    t = np.asarray(tiempos, dtype=np.float64)
+    p50, p95, p99 = np.percentile(t, [50, 95, 99]) * 1e3
+    return {
+        "n": int(len(t)),
+        "media_ms": round(float(t.mean() * 1e3), 4),
+        "p50_ms": round(float(p50), 4),
+        "p95_ms": round(float(p95), 4),
+        "p99_ms": round(float(p99), 4),
+        "max_ms": round(float(t.max() * 1e3), 4),
+        "por_segundo": round(float(len(t) / t.sum()), 1) if t.sum() > 0 else None,
+    }
+
+
+def _commit():
+    try:
+        salida = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, timeout=10,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        )
+        cambios = subprocess.run(
+            ["git", "status", "--porcelain", "--untracked-files=no"], capture_output=True, text=True, timeout=30,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        )
+    except (OSError, subprocess.SubprocessError):
+        return None
+    if salida.returncode != 0:
+        return None
+    return salida.stdout.strip() + ("-sucio" if cambios.stdout.strip() else "")
+
+
+def ejecutar(ruta_modelo=RUTA_MODELO, iteraciones=300, calentamiento=20, semilla=0, caches=False,
+             modo_difuso="lut", modo_mapa="diferido", modo_prediccion="rapido"):
+    from logger_gsheets import log_event
+
+    catalogo = get_catalogo()
+    predictor = PredictorCacheado(
+        ruta_modelo, max_entradas=4096 if caches else 0, rapido=modo_prediccion != "dataframe",
+    )
+    n = calentamiento + iteraciones
+    climas = climas_aleatorios(n, semilla)
+    servicio = ServicioRecomendacion(
+        predictor, crear_motor_difuso(modo_difuso), ProveedorClimaFalso(climas),
+        max_entradas_difuso=1024 if caches else 0,
+    )
+    renderizador = RenderizadorMapa(catalogo, max_entradas=256 if caches else 0, modo=modo_mapa)
+    generar_popup = datos_popup if modo_mapa == "diferido" else popup_html_responsive
+    respuestas = respuestas_aleatorias(n, semilla)
+    tiempos = {etapa: [] for etapa in ETAPAS + ("total", "recomendar")}
+
+    with tempfile.TemporaryDirectory() as directorio:
+        escritor, backend = _escritor_falso(directorio)
+        predictor.modelo()
+        for i in range(n):
+            respuesta, clima = respuestas[i], climas[i]
+            marcas = [time.perf_counter()]
+            datos = codificar_formulario(**respuesta)
+            codificar_fila(datos)
+            marcas.append(time.perf_counter())
+            recomendaciones = servicio.predecir(datos)
+            marcas.append(time.perf_counter())
+            score = servicio.puntuar_clima(clima)
+            marcas.append(time.perf_counter())
+            # Sin puntuación la aplicación no filtra (cae en el aviso de error).
+            filtradas = recomendaciones if score is None else filtrar_por_clima(recomendaciones, clima, score)
+            lugares = [k for k, v in filtradas.items() if v == 1]
+            marcas.append(time.perf_counter())
+            alternativas = servicio.alternativas_cercanas(recomendaciones, filtradas)
+            claves_alternativas = [o["clave"] for opciones in alternativas.values() for o in opciones]
+            marcas.append(time.perf_counter())
+            for clave in lugares:
+                generar_popup(catalogo[clave])
+            marcas.append(time.perf_counter())
+            renderizador.html(lugares, claves_alternativas)
+            marcas.append(time.perf_counter())
+            log_event("predicted", {
+                "user_id": f"benchmark-{i}",
+                "n_outputs": len(recomendaciones),
+                "predicted_sum": int(sum(recomendaciones.values())),
+                "model_version": predictor.version_modelo,
+                "recommended_keys": [k for k, v in recomendaciones.items() if v == 1],
+            })
+            marcas.append(time.perf_counter())
+            # Y la misma petición de principio a fin a través del servicio.
+            servicio.recomendar(datos)
+            fin = time.perf_counter()
+            if i < calentamiento:
+                continue
+            for etapa, inicio, final in zip(ETAPAS, marcas, marcas[1:]):
+                tiempos[etapa].append(final - inicio)
+            tiempos["total"].append(marcas[-1] - marcas[0])
+            tiempos["recomendar"].append(fin - marcas[-1])
+        escritor.cerrar()
+        eventos = len(backend.filas)
+
+    return {
+        "formato": FORMATO_RESULTADOS,
+        "fecha": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "commit": _commit(),
+        "entorno": {
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "plataforma": platform.platform(),
+            "cpus": os.cpu_count(),
+        },
+        "config": {
+            "modelo": ruta_modelo,
+            "version_modelo": predictor.version_modelo,
+            "iteraciones": iteraciones,
+            "calentamiento": calentamiento,
+            "semilla": semilla,
+            "caches": caches,
+            "modo_difuso": modo_difuso,
+            "modo_mapa": modo_mapa,
+            "modo_prediccion": modo_prediccion,
+        },
+        "eventos_replicados": eventos,
+        "etapas": {etapa: resumir(t) for etapa, t in tiempos.items()},
+    }
+
+
+def comparar(anterior, actual, umbral=None):
+    # Cociente actual/anterior de p50 y p95 por etapa; con `umbral`, las
+    # etapas cuyo p50 empeora más que eso se devuelven como regresiones.
+    filas, regresiones = [], []
+    for etapa, datos in actual["etapas"].items():
+        base = anterior["etapas"].get(etapa)
+        if not base:
+            continue
+        cociente_p50 = datos["p50_ms"] / base["p50_ms"] if base["p50_ms"] else None
+        cociente_p95 = datos["p95_ms"] / base["p95_ms"] if base["p95_ms"] else None
+        filas.append((etapa, base["p50_ms"], datos["p50_ms"], cociente_p50, cociente_p95))
+        if umbral is not None and cociente_p50 is not None and cociente_p50 > umbral:
+            regresiones.append(etapa)
+    return filas, regresiones
+
+
+def _tabla(resultado):
+    lineas = [f"{'etapa':<18}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'op/s':>10}"]
+    for etapa, d in resultado["etapas"].items():
+        lineas.append(f"{etapa:<18}{d['p50_ms']:>10.3f}{d['p95_ms']:>10.3f}{d['p99_ms']:>10.3f}{d['por_segundo'] or 0:>10.1f}")
+    return "\n".join(lineas)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Mide el coste de cada etapa de una recomendación.")
+    parser.add_argument("--modelo", default=os.environ.get("RUTA_MODELO", RUTA_MODELO),
+                        help="fichero del modelo o directorio de un registro de modelos")
+    parser.add_argument("--iteraciones", type=int, default=300)
+    parser.add_argument("--calentamiento", type=int, default=20)
+    parser.add_argument("--semilla", type=int, default=0)
+    parser.add_argument("--caches", action="store_true", help="usa las cachés con su tamaño normal")
+    parser.add_argument("--modo-difuso", default="lut")
+    parser.add_argument("--modo-mapa", default="diferido", choices=MODOS_MAPA)
+    parser.add_argument("--modo-prediccion", default="rapido", choices=("rapido", "dataframe"))
+    parser.add_argument("--salida", help=f"fichero JSON (por defecto {DIR_RESULTADOS}/<fecha>_<commit>.json)")
+    parser.add_argument("--comparar", help="resultado anterior con el que comparar")
+    parser.add_argument("--umbral", type=float,
+                        help="con --comparar, sale con error si el p50 de alguna etapa empeora más que este cociente")
+    args = parser.parse_args(argv)
+
+    resultado = ejecutar(
+        args.modelo, iteraciones=args.iteraciones, calentamiento=args.calentamiento, semilla=args.semilla,
+        caches=args.caches, modo_difuso=args.modo_difuso, modo_mapa=args.modo_mapa,
+        modo_prediccion=args.modo_prediccion,
+    )
+    salida = args.salida
+    if salida is None:
+        marca = datetime.now().strftime("%Y%m%d-%H%M%S")
+        salida = os.path.join(DIR_RESULTADOS, f"{marca}_{resultado['commit'] or 'sin-commit'}.json")
+    directorio = os.path.dirname(salida)
+    if directorio:
+        os.makedirs(directorio, exist_ok=True)
+    with open(salida, "w", encoding="utf-8") as f:
+        json.dump(resultado, f, ensure_ascii=False, indent=2)
+    print(_tabla(resultado))
+    print(f"\nResultados en {salida}")
+
+    if args.comparar:
+        with open(args.comparar, "r", encoding="utf-8") as f:
+            anterior = json.load(f)
+        filas, regresiones = comparar(anterior, resultado, args.umbral)
+        print(f"\nFrente a {args.comparar} ({anterior.get('commit')}):")
+        print(f"{'etapa':<18}{'p50 antes':>11}{'p50 ahora':>11}{'x p50':>8}{'x p95':>8}")
+        for etapa, antes, ahora, c50, c95 in filas:
+            print(f"{etapa:<18}{antes:>11.3f}{ahora:>11.3f}{c50 or 0:>8.2f}{c95 or 0:>8.2f}")
+        if regresiones:
+            print(f"\nRegresiones (p50 > x{args.umbral}): {', '.join(regresiones)}")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,345 @@
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import uuid
+
+# Caché compartida entre procesos para respuestas de APIs externas, con
+# "stale-while-revalidate" y una sola llamada a la vez por clave
+# (single-flight). Los backends guardan (valor JSON, instante en que se
+# guardó) y ofrecen un cerrojo por clave con caducidad:
+#
+#   leer(clave) -> (valor, guardado_en) | None
+#   escribir(clave, valor, guardado_en)
+#   bloquear(clave, ttl) -> token | None
+#   desbloquear(clave, token)
+#
+# "memoria" solo se comparte entre hilos; "ficheros" y "sqlite" entre los
+# procesos de una máquina; "redis" entre máquinas (acepta cualquier cliente
+# con la API de redis-py, o un sustituto local con get/set/delete).
+
+BACKENDS_CACHE = ("memoria", "ficheros", "sqlite", "redis")
+TTL_BLOQUEO = 45.0
+ESPERA_MAX = 50.0
+INTERVALO_SONDEO = 0.1
+
+
+class CacheMemoria:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._datos = {}
+        self._bloqueos = {}
+
+    def leer(self, clave):
+        with self._lock:
+            return self._datos.get(clave)
+
+    def escribir(self, clave, valor, guardado_en):
+        with self._lock:
+            self._datos[clave] = (valor, guardado_en)
+
+    def bloquear(self, clave, ttl):
+        ahora = time.monotonic()
+        with self._lock:
+            actual = self._bloqueos.get(clave)
+            if actual is not None and actual[1] > ahora:
+                return None
+            token = uuid.uuid4().hex
+            self._bloqueos[clave] = (token, ahora + ttl)
+            return token
+
+    def desbloquear(self, clave, token):
+        with self._lock:
+            actual = self._bloqueos.get(clave)
+            if actual is not None and actual[0] == token:
+                del self._bloqueos[clave]
+
+
+class CacheFicheros:
+    # Un JSON por clave, escrito en .tmp y renombrado. El cerrojo es un
+    # flock sobre un fichero .lock: el sistema lo libera si el proceso
+    # muere, así que no necesita caducidad (solo POSIX).
+    def __init__(self, directorio):
+        self.directorio = directorio
+        os.makedirs(directorio, exist_ok=True)
+        self._lock = threading.Lock()
+        self._abiertos = {}
+
+    def _ruta(self, clave, extension):
+        return os.path.join(self.directorio, re.sub(r"[^A-Za-z0-9_.-]", "_", clave) + extension)
+
+    def leer(self, clave):
+        try:
+            with open(self._ruta(clave, ".json"), "r", encoding="utf-8") as f:
+                entrada = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+        return entrada["valor"], entrada["guardado_en"]
+
+    def escribir(self, clave, valor, guardado_en):
+        ruta = self._ruta(clave, ".json")
+        tmp = f"{ruta}.{uuid.uuid4().hex[:8]}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"valor": valor, "guardado_en": guardado_en}, f, ensure_ascii=False)
+        os.replace(tmp, ruta)
+
+    def bloquear(self, clave, ttl):
+        import fcntl
+
+        fichero = open(self._ruta(clave, ".lock"), "a")
+        try:
+            fcntl.flock(fichero.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            fichero.close()
+            return None
+        token = uuid.uuid4().hex
+        with self._lock:
+            self._abiertos[token] = fichero
+        return token
+
+    def desbloquear(self, clave, token):
+        with self._lock:
+            fichero = self._abiertos.pop(token, None)
+        if fichero is not None:
+            fichero.close()
+
+
+class CacheSQLite:
+    def __init__(self, ruta):
+        self.ruta = ruta
+        directorio = os.path.dirname(ruta)
+        if directorio:
+            os.makedirs(directorio, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(ruta, check_same_thread=False, isolation_level=None, timeout=10)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS entradas (clave TEXT PRIMARY KEY, valor TEXT NOT NULL, guardado_en REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS bloqueos (clave TEXT PRIMARY KEY, token TEXT NOT NULL, expira REAL NOT NULL)"
+        )
+
+    def leer(self, clave):
+        with self._lock:
+            fila = self._conn.execute(
+                "SELECT valor, guardado_en FROM entradas WHERE clave = ?", (clave,)
+            ).fetchone()
+        return None if fila is None else (json.loads(fila[0]), fila[1])
+
+    def escribir(self, clave, valor, guardado_en):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO entradas (clave, valor, guardado_en) VALUES (?, ?, ?)",
+                (clave, json.dumps(valor, ensure_ascii=False), guardado_en),
+            )
+
+    def bloquear(self, clave, ttl):
+        # BEGIN IMMEDIATE serializa a los procesos que compiten por la clave.
+        ahora = time.time()
+        token = uuid.uuid4().hex
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.execute("DELETE FROM bloqueos WHERE clave = ? AND expira < ?", (clave, ahora))
+                cursor = self._conn.execute(
+                    "INSERT OR IGNORE INTO bloqueos (clave, token, expira) VALUES (?, ?, ?)",
+                    (clave, token, ahora + ttl),
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return token if cursor.rowcount == 1 else None
+
+    def desbloquear(self, clave, token):
+        with self._lock:
+            self._conn.execute("DELETE FROM bloqueos WHERE clave = ? AND token = ?", (clave, token))
+
+
+class CacheRedis:
+    def __init__(self, cliente, prefijo="clima:"):
+        self.cliente = cliente
+        self.prefijo = prefijo
+
+    def leer(self, clave):
+        bruto = self.cliente.get(self.prefijo + clave)
+        if bruto is None:
+            return None
+        entrada = json.loads(bruto)
+        return entrada["valor"], entrada["guardado_en"]
+
+    def escribir(self, clave, valor, guardado_en):
+        self.cliente.set(
+            self.prefijo + clave, json.dumps({"valor": valor, "guardado_en": guardado_en}, ensure_ascii=False)
+        )
+
+    def bloquear(self, clave, ttl):
+        token = uuid.uuid4().hex
+        ok = self.cliente.set(self.prefijo + "bloqueo:" + clave, token, nx=True, px=int(ttl * 1000))
+        return token if ok else None
+
+    def desbloquear(self, clave, token):
+        clave_bloqueo = self.prefijo + "bloqueo:" + clave
+        actual = self.cliente.get(clave_bloqueo)
+        if isinstance(actual, bytes):
+            actual = actual.decode()
+        if actual == token:
+            self.cliente.delete(clave_bloqueo)
+
+
+class CacheSWR:
+    # obtener() devuelve el valor si tiene menos de `ttl` segundos. Si es
+    # más viejo pero no supera ttl + max_obsoleto, también lo devuelve y
+    # lanza un refresco en segundo plano. Sin valor utilizable, un único
+    # llamante (el que consigue el cerrojo) llama a `calcular`; el resto
+    # espera a que aparezca el valor nuevo. Los errores no se guardan.
+    # Con copia_local=True, lo que se lee o se escribe en el backend se
+    # guarda también en memoria del proceso, y obtener() sirve esa copia
+    # sin tocar el backend mientras tenga menos de `ttl` segundos; el
+    # backend compartido solo se consulta cuando la copia falta o caduca
+    # (o desde refrescar(), que es lo que hace el programador del clima).
+    def __init__(self, backend, ttl_bloqueo=TTL_BLOQUEO, espera_max=ESPERA_MAX,
+                 intervalo_sondeo=INTERVALO_SONDEO, copia_local=False):
+        self.backend = backend
+        self._local = CacheMemoria() if copia_local else None
+        self.ttl_bloqueo = ttl_bloqueo
+        self.espera_max = espera_max
+        self.intervalo_sondeo = intervalo_sondeo
+        self._lock = threading.Lock()
+        self._refrescando = set()
+        self.aciertos = 0
+        self.obsoletos = 0
+        self.esperas = 0
+        self.llamadas = 0
+        self.lecturas_backend = 0
+        self.errores_refresco = 0
+        self.ultimo_error = None
+
+    def _contar(self, contador):
+        with self._lock:
+            setattr(self, contador, getattr(self, contador) + 1)
+
+    def _fresca(self, entrada, ttl):
+        return entrada is not None and time.time() - entrada[1] <= ttl
+
+    def _leer(self, clave, ttl=None):
+        if self._local is not None and ttl is not None:
+            entrada = self._local.leer(clave)
+            if self._fresca(entrada, ttl):
+                return entrada
+        entrada = self.backend.leer(clave)
+        self._contar("lecturas_backend")
+        if self._local is not None and entrada is not None:
+            self._local.escribir(clave, *entrada)
+        return entrada
+
+    def guardar(self, clave, valor):
+        guardado_en = time.time()
+        self.backend.escribir(clave, valor, guardado_en)
+        if self._local is not None:
+            self._local.escribir(clave, valor, guardado_en)
+
+    def obtener(self, clave, calcular, ttl, max_obsoleto=0.0):
+        entrada = self._leer(clave, ttl)
+        if entrada is not None:
+            edad = time.time() - entrada[1]
+            if edad <= ttl:
+                self._contar("aciertos")
+                return entrada[0]
+            if edad <= ttl + max_obsoleto:
+                self._contar("obsoletos")
+                self._refrescar_en_segundo_plano(clave, calcular, ttl)
+                return entrada[0]
+        return self._calcular_una_vez(clave, calcular, ttl)
+
+    def _calcular_con_bloqueo(self, clave, calcular, ttl, token):
+        try:
+            # Otro proceso puede haber terminado justo antes del cerrojo.
+            entrada = self._leer(clave)
+            if self._fresca(entrada, ttl):
+                return entrada[0]
+            valor = calcular()
+            self.guardar(clave, valor)
+            self._contar("llamadas")
+            return valor
+        finally:
+            self.backend.desbloquear(clave, token)
+
+    def _calcular_una_vez(self, clave, calcular, ttl):
+        limite = time.monotonic() + self.espera_max
+        while True:
+            token = self.backend.bloquear(clave, self.ttl_bloqueo)
+            if token is not None:
+                return self._calcular_con_bloqueo(clave, calcular, ttl, token)
+            time.sleep(self.intervalo_sondeo)
+            entrada = self._leer(clave)
+            if self._fresca(entrada, ttl):
+                self._contar("esperas")
+                return entrada[0]
+            if time.monotonic() >= limite:
+                raise TimeoutError(f"Tiempo agotado esperando el valor de '{clave}'.")
+
+    def refrescar(self, clave, calcular, ttl=0.0):
+        # Refresco explícito (p. ej. desde un programador): vuelve a llamar
+        # a `calcular` salvo que el valor tenga menos de `ttl` segundos.
+        # Devuelve False si otro llamante ya está refrescando la clave.
+        token = self.backend.bloquear(clave, self.ttl_bloqueo)
+        if token is None:
+            return False
+        self._calcular_con_bloqueo(clave, calcular, ttl, token)
+        return True
+
+    def edad(self, clave):
+        entrada = self._leer(clave)
+        return None if entrada is None else time.time() - entrada[1]
+
+    def _refrescar_en_segundo_plano(self, clave, calcular, ttl):
+        with self._lock:
+            if clave in self._refrescando:
+                return
+            self._refrescando.add(clave)
+
+        def tarea():
+            try:
+                token = self.backend.bloquear(clave, self.ttl_bloqueo)
+                if token is not None:
+                    self._calcular_con_bloqueo(clave, calcular, ttl, token)
+            except Exception as e:
+                with self._lock:
+                    self.errores_refresco += 1
+                    self.ultimo_error = e
+            finally:
+                with self._lock:
+                    self._refrescando.discard(clave)
+
+        threading.Thread(target=tarea, name=f"refresco-{clave}", daemon=True).start()
+
+    def estadisticas(self):
+        with self._lock:
+            return {
+                "aciertos": self.aciertos,
+                "obsoletos": self.obsoletos,
+                "esperas": self.esperas,
+                "llamadas": self.llamadas,
+                "lecturas_backend": self.lecturas_backend,
+                "errores_refresco": self.errores_refresco,
+            }
+
+
+def crear_backend_cache(nombre, ruta="cache/clima", redis_url=None):
+    nombre = (nombre or "memoria").strip().lower()
+    if nombre == "memoria":
+        return CacheMemoria()
+    if nombre == "ficheros":
+        return CacheFicheros(ruta)
+    if nombre == "sqlite":
+        return CacheSQLite(ruta if ruta.endswith((".sqlite", ".sqlite3", ".db")) else ruta + ".sqlite3")
+    if nombre == "redis":
+        if not redis_url:
+            raise ValueError("El backend 'redis' necesita REDIS_URL.")
+        import redis
+        return CacheRedis(redis.Redis.from_url(redis_url))
+    raise ValueError(f"Backend de caché desconocido: '{nombre}'. Opciones: {', '.join(BACKENDS_CACHE)}")
@@ -0,0 +1,117 @@
+import json
+import os
+import threading
+from collections.abc import Mapping
+from types import MappingProxyType
+
+# Catálogo de lugares (nombre, coordenadas, imagen, descripción, si es al
+# aire libre y qué salida del modelo le corresponde) en lugares.json, en vez
+# de en el código de la aplicación. Se carga una sola vez por proceso en
+# registros inmutables con índices precalculados. Catalogo se comporta como
+# un diccionario de solo lectura clave -> Lugar, y Lugar admite lugar["lat"]
+# y lugar.get("imagen_url"), así que sirve donde antes se usaba LUGARES_INFO.
+
+RUTA_CATALOGO = os.path.join(os.path.dirname(os.path.abspath(__file__)), "lugares.json")
+VERSIONES_CATALOGO = (1,)
+CAMPOS_OBLIGATORIOS = ("clave", "nombre", "lat", "lon", "exterior")
+
+
+class Lugar:
+    __slots__ = ("clave", "nombre", "lat", "lon", "descripcion", "imagen_url", "exterior", "posicion_modelo")
+
+    def __init__(self, clave, nombre, lat, lon, descripcion="", imagen_url=None, exterior=False,
+                 posicion_modelo=None):
+        valores = (clave, nombre, float(lat), float(lon), descripcion, imagen_url, bool(exterior), posicion_modelo)
+        for campo, valor in zip(self.__slots__, valores):
+            object.__setattr__(self, campo, valor)
+
+    def __setattr__(self, campo, valor):
+        raise AttributeError("Lugar es inmutable.")
+
+    def __delattr__(self, campo):
+        raise AttributeError("Lugar es inmutable.")
+
+    def __getitem__(self, campo):
+        if campo not in self.__slots__:
+            raise KeyError(campo)
+        return getattr(self, campo)
+
+    def get(self, campo, defecto=None):
+        return getattr(self, campo) if campo in self.__slots__ else defecto
+
+    def como_dict(self):
+        return {campo: getattr(self, campo) for campo in self.__slots__}
+
+    def __repr__(self):
+        return f"Lugar({self.clave!r})"
+
+
+class Catalogo(Mapping):
+    __slots__ = ("version", "_por_clave", "claves_modelo", "exteriores", "interiores", "mascara_exterior")
+
+    def __init__(self, lugares, version=None):
+        por_clave = {}
+        for lugar in lugares:
+            if lugar.clave in por_clave:
+                raise ValueError(f"Lugar duplicado en el catálogo: '{lugar.clave}'.")
+            por_clave[lugar.clave] = lugar
+        posiciones = sorted(
+            (lugar.posicion_modelo, lugar.clave) for lugar in lugares if lugar.posicion_modelo is not None
+        )
+        if [p for p, _ in posiciones] != list(range(len(posiciones))):
+            raise ValueError("Las posiciones del modelo del catálogo deben ser 0..n-1 sin huecos ni repetidas.")
+        self.version = version
+        self._por_clave = MappingProxyType(por_clave)
+        # Índices: orden de las salidas del modelo, lugares exteriores e
+        # interiores, y máscara de exteriores alineada con las salidas.
+        self.claves_modelo = tuple(clave for _, clave in posiciones)
+        self.exteriores = frozenset(l.clave for l in lugares if l.exterior)
+        self.interiores = frozenset(l.clave for l in lugares if not l.exterior)
+        self.mascara_exterior = tuple(por_clave[c].exterior for c in self.claves_modelo)
+
+    def __getitem__(self, clave):
+        return self._por_clave[clave]
+
+    def __iter__(self):
+        return iter(self._por_clave)
+
+    def __len__(self):
+        return len(self._por_clave)
+
+    def por_posicion(self, posicion):
+        return self._por_clave[self.claves_modelo[posicion]]
+
+    def comprobar_modelo(self, n_salidas):
+        if n_salidas != len(self.claves_modelo):
+            raise ValueError(
+                f"El modelo tiene {n_salidas} salidas y el catálogo (versión {self.version}) "
+                f"define {len(self.claves_modelo)}."
+            )
+
+
+def cargar_catalogo(ruta=RUTA_CATALOGO):
+    with open(ruta, "r", encoding="utf-8") as f:
+        datos = json.load(f)
+    version = datos.get("version")
+    if version not in VERSIONES_CATALOGO:
+        raise ValueError(f"Versión de catálogo no soportada en '{ruta}': {version}.")
+    lugares = []
+    for i, entrada in enumerate(datos.get("lugares", [])):
+        faltan = [c for c in CAMPOS_OBLIGATORIOS if entrada.get(c) is None]
+        if faltan:
+            raise ValueError(f"Al lugar {i} de '{ruta}' le faltan campos: {', '.join(faltan)}.")
+        lugares.append(Lugar(**{c: entrada[c] for c in Lugar.__slots__ if c in entrada}))
+    return Catalogo(lugares, version=version)
+
+
+_catalogo = None
+_catalogo_lock = threading.Lock()
+
+
+def get_catalogo():
+    global _catalogo
+    if _catalogo is None:
+        with _catalogo_lock:
+            if _catalogo is None:
+                _catalogo = cargar_catalogo(os.environ.get("RUTA_CATALOGO", RUTA_CATALOGO))
+    return _catalogo
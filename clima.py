@@ -0,0 +1,328 @@
+import contextvars
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FuturesTimeout
+from datetime import datetime
+from zoneinfo import ZoneInfo
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from cache_compartido import CacheMemoria, CacheSWR
+from cortacircuitos import CircuitoAbierto, Cortacircuitos
+from metricas import medir
+
+# Previsión de AEMET y UV de OpenUV para Carboneras, sin depender de
+# Streamlit. ProveedorClima pide la previsión de AEMET una vez por día (hora
+# de Madrid) y el UV como mucho cada TTL_OPENUV segundos, a través de una
+# CacheSWR: con un backend compartido (ficheros, sqlite o redis) todas las
+# réplicas reutilizan la misma respuesta y solo una llama a la API. Pasado
+# su TTL, un valor se sigue sirviendo durante MAX_OBSOLETO_* segundos
+# mientras un hilo lo refresca.
+
+ID_MUNICIPIO = "16055"
+LAT = 39.8997
+LON = -1.8123
+TTL_OPENUV = 900
+MAX_OBSOLETO_AEMET = 3 * 3600
+MAX_OBSOLETO_OPENUV = 3600
+
+# Cada API va detrás de un cortacircuitos. Con el de AEMET abierto se sirve
+# la última previsión buena guardada en disco (si no tiene más de
+# MAX_EDAD_ULTIMO_BUENO segundos) o, en su defecto, valores climatológicos
+# del mes; el diccionario devuelto lleva entonces la clave "respaldo".
+RUTA_ULTIMO_BUENO = "cache/ultimo_clima.json"
+MAX_EDAD_ULTIMO_BUENO = 7 * 86400
+# Mes -> (tmax, tmin, probabilidad de lluvia %, UV máximo); valores medios
+# aproximados de la Serranía Baja de Cuenca.
+CLIMA_MENSUAL = {
+    1: (10, -1, 30, 2), 2: (12, 0, 30, 3), 3: (15, 2, 30, 5), 4: (17, 4, 40, 6),
+    5: (22, 8, 40, 8), 6: (28, 12, 25, 9), 7: (32, 15, 10, 9), 8: (31, 15, 10, 8),
+    9: (26, 11, 25, 6), 10: (19, 7, 35, 4), 11: (13, 2, 35, 2), 12: (10, 0, 35, 2),
+}
+
+# Una sesión HTTP por proceso, compartida por todos los hilos, que reutiliza
+# las conexiones keep-alive (AEMET exige dos peticiones seguidas al mismo
+# host). pool_block limita las conexiones simultáneas por host.
+# Timeouts como (conexión, lectura).
+CONEXIONES_POR_HOST = 4
+TIMEOUT_AEMET = (3.05, 10)
+TIMEOUT_OPENUV = (3.05, 8)
+# Lo más que obtener_clima_hoy espera al UV una vez tiene la previsión de
+# AEMET; pasado ese tiempo se queda con el uvMax de AEMET y la descarga
+# sigue en segundo plano para las siguientes peticiones.
+ESPERA_UV = 2.0
+
+_sesion = None
+_sesion_lock = threading.Lock()
+_ejecutor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="clima")
+
+
+def obtener_sesion():
+    global _sesion
+    if _sesion is None:
+        with _sesion_lock:
+            if _sesion is None:
+                sesion = requests.Session()
+                adaptador = HTTPAdapter(
+                    pool_connections=4, pool_maxsize=CONEXIONES_POR_HOST, pool_block=True
+                )
+                sesion.mount("https://", adaptador)
+                sesion.mount("http://", adaptador)
+                _sesion = sesion
+    return _sesion
+
+
+class AEMET:
+    def __init__(self, api_key, sesion=None):
+        self.api_key = api_key
+        self.base_url = "https://opendata.aemet.es/opendata/api"
+        self.sesion = sesion or obtener_sesion()
+
+    def get_prediccion_url(self, id_municipio):
+        resp = self.sesion.get(
+            f"{self.base_url}/prediccion/especifica/municipio/diaria/{id_municipio}",
+            headers={"api_key": self.api_key},
+            timeout=TIMEOUT_AEMET
+        )
+        resp.raise_for_status()
+        return resp.json().get("datos")
+
+    def get_prediccion_completa(self, datos_url):
+        # Todos los días de la predicción diaria (normalmente una semana).
+        resp = self.sesion.get(datos_url, timeout=TIMEOUT_AEMET)
+        resp.raise_for_status()
+        datos = resp.json()
+        if isinstance(datos, list) and datos and "prediccion" in datos[0] and datos[0]["prediccion"].get("dia"):
+            return datos[0]["prediccion"]["dia"]
+        else:
+            raise ValueError("Estructura de JSON inesperada en datos de AEMET")
+
+    def get_datos_prediccion(self, datos_url):
+        return self.get_prediccion_completa(datos_url)[0]
+
+    def extraer_datos_relevantes(self, prediccion_dia):
+        try:
+            fecha = prediccion_dia.get("fecha", None)
+            tmax = prediccion_dia.get("temperatura", {}).get("maxima", None)
+            tmin = prediccion_dia.get("temperatura", {}).get("minima", None)
+
+            prob_lluvia = 0
+            if "probPrecipitacion" in prediccion_dia and len(prediccion_dia["probPrecipitacion"]) > 0:
+                prob_lluvia = prediccion_dia["probPrecipitacion"][0].get("value", 0) or 0
+
+            uv = prediccion_dia.get("uvMax", None)
+
+            return {
+                "fecha": fecha,
+                "tmax": int(tmax) if tmax is not None else None,
+                "tmin": int(tmin) if tmin is not None else None,
+                "lluvia": int(prob_lluvia),
+                "UV": int(uv) if uv is not None else None  
+            }
+        except Exception as e:
+            raise ValueError(f"Error extrayendo datos: {e}")
+
+    def extraer_prevision_semanal(self, dias):
+        # Una lista por variable con un valor por día. "lluvia" es el mismo
+        # valor que da extraer_datos_relevantes (el primer periodo, 00-24) y
+        # "lluvia_max" el máximo de todos los periodos del día.
+        filas = [self.extraer_datos_relevantes(dia) for dia in dias]
+        semana = {clave: [fila[clave] for fila in filas] for clave in ("fecha", "tmax", "tmin", "lluvia", "UV")}
+        semana["lluvia_max"] = [
+            max((int(p.get("value") or 0) for p in dia.get("probPrecipitacion") or []), default=0)
+            for dia in dias
+        ]
+        return semana
+
+class OpenUV:
+    def __init__(self, api_key, sesion=None):
+        self.api_key = api_key
+        self.base_url = "https://api.openuv.io/api/v1"
+        self.sesion = sesion or obtener_sesion()
+
+    def get_current_uv(self, lat, lon):
+        headers = {"x-access-token": self.api_key}
+        params = {"lat": lat, "lng": lon}
+        resp = self.sesion.get(f"{self.base_url}/uv", headers=headers, params=params, timeout=TIMEOUT_OPENUV)
+        resp.raise_for_status()
+        data = resp.json()
+        return round(data["result"]["uv"], 2)
+
+
+def day_bucket_madrid():
+    now_mad = datetime.now(ZoneInfo("Europe/Madrid"))
+    return now_mad.strftime("%Y-%m-%d")
+
+
+def clima_climatologico():
+    hoy = datetime.now(ZoneInfo("Europe/Madrid"))
+    tmax, tmin, lluvia, uv = CLIMA_MENSUAL[hoy.month]
+    return {
+        "fecha": hoy.strftime("%Y-%m-%dT00:00:00"),
+        "tmax": tmax, "tmin": tmin, "lluvia": lluvia, "UV": uv,
+        "respaldo": "climatologia",
+    }
+
+
+def segundos_desde_medianoche_madrid():
+    now_mad = datetime.now(ZoneInfo("Europe/Madrid"))
+    return (now_mad - now_mad.replace(hour=0, minute=0, second=0, microsecond=0)).total_seconds()
+
+
+class ProveedorClima:
+    def __init__(self, api_key_aemet, api_key_openuv, id_municipio=ID_MUNICIPIO,
+                 lat=LAT, lon=LON, ttl_openuv=TTL_OPENUV, cache=None,
+                 ruta_ultimo_bueno=RUTA_ULTIMO_BUENO, espera_uv=ESPERA_UV):
+        self.api_key_aemet = api_key_aemet
+        self.api_key_openuv = api_key_openuv
+        self.id_municipio = id_municipio
+        self.lat = lat
+        self.lon = lon
+        self.ttl_openuv = ttl_openuv
+        self.cache = cache if cache is not None else CacheSWR(CacheMemoria())
+        self.ruta_ultimo_bueno = ruta_ultimo_bueno
+        self.espera_uv = espera_uv
+        self.uv_agotados = 0
+        # Las sondas descargan directamente y, si funcionan, dejan el valor
+        # en la caché y cierran el circuito.
+        self.circuito_aemet = Cortacircuitos("aemet", sonda=self._sondear_aemet)
+        self.circuito_uv = Cortacircuitos("openuv", sonda=self._sondear_uv)
+
+    def _llamar_aemet(self):
+        # Se guarda la semana entera de una vez: la previsión por días no
+        # cuesta ninguna llamada más.
+        aemet = AEMET(api_key=self.api_key_aemet)
+        with medir("aemet"):
+            dias = aemet.get_prediccion_completa(aemet.get_prediccion_url(self.id_municipio))
+        datos = {"hoy": aemet.extraer_datos_relevantes(dias[0]), "semana": aemet.extraer_prevision_semanal(dias)}
+        self._guardar_ultimo_bueno(datos["hoy"])
+        return datos
+
+    def _llamar_uv(self):
+        with medir("openuv"):
+            return OpenUV(api_key=self.api_key_openuv).get_current_uv(lat=self.lat, lon=self.lon)
+
+    def _descargar_aemet(self):
+        if not self.api_key_aemet:
+            raise RuntimeError("Falta API_KEY_AEMET.")
+        return self.circuito_aemet.llamar(self._llamar_aemet)
+
+    def _descargar_uv(self):
+        if not self.api_key_openuv:
+            raise RuntimeError("Falta API_KEY_OPENUV.")
+        return self.circuito_uv.llamar(self._llamar_uv)
+
+    def _sondear_aemet(self):
+        self.cache.guardar(self.clave_aemet, self._llamar_aemet())
+
+    def _sondear_uv(self):
+        self.cache.guardar(self.clave_uv, self._llamar_uv())
+
+    def _guardar_ultimo_bueno(self, datos):
+        if not self.ruta_ultimo_bueno:
+            return
+        try:
+            directorio = os.path.dirname(self.ruta_ultimo_bueno)
+            if directorio:
+                os.makedirs(directorio, exist_ok=True)
+            tmp = f"{self.ruta_ultimo_bueno}.{os.getpid()}.tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump({"datos": datos, "guardado_en": time.time()}, f, ensure_ascii=False)
+            os.replace(tmp, self.ruta_ultimo_bueno)
+        except OSError:
+            pass
+
+    def respaldo_aemet(self):
+        try:
+            with open(self.ruta_ultimo_bueno, "r", encoding="utf-8") as f:
+                ultimo = json.load(f)
+            if time.time() - ultimo["guardado_en"] <= MAX_EDAD_ULTIMO_BUENO:
+                return dict(ultimo["datos"], respaldo="ultimo_bueno")
+        except (OSError, TypeError, ValueError, KeyError):
+            pass
+        return clima_climatologico()
+
+    @property
+    def clave_aemet(self):
+        return f"prevision:{self.id_municipio}"
+
+    @property
+    def clave_uv(self):
+        return f"openuv:{self.lat}:{self.lon}"
+
+    def _prevision(self):
+        # Fresca mientras se haya guardado hoy (hora de Madrid).
+        return self.cache.obtener(
+            self.clave_aemet, self._descargar_aemet,
+            ttl=segundos_desde_medianoche_madrid(), max_obsoleto=MAX_OBSOLETO_AEMET,
+        )
+
+    def _desde_hoy(self, datos):
+        # Pasada la medianoche, la previsión guardada ayer se sigue sirviendo
+        # como obsoleta mientras se refresca, pero su primer día ya no es
+        # hoy: se descartan los días pasados y "hoy" sale de la semana, con
+        # respaldo="prevision_anterior". Sin el día de hoy, "hoy" es None.
+        hoy = day_bucket_madrid()
+        if str(datos["hoy"].get("fecha"))[:10] == hoy:
+            return datos
+        fechas = [str(f)[:10] for f in datos["semana"]["fecha"]]
+        i = next((i for i, f in enumerate(fechas) if f >= hoy), len(fechas))
+        semana = {clave: valores[i:] for clave, valores in datos["semana"].items()}
+        if i == len(fechas) or fechas[i] != hoy:
+            return {"hoy": None, "semana": semana}
+        dia = {clave: semana[clave][0] for clave in ("fecha", "tmax", "tmin", "lluvia", "UV")}
+        return {"hoy": dict(dia, respaldo="prevision_anterior"), "semana": semana}
+
+    def prevision_aemet(self):
+        try:
+            datos = self._desde_hoy(self._prevision())
+        except CircuitoAbierto:
+            return self.respaldo_aemet()
+        if datos["hoy"] is None:
+            return self.respaldo_aemet()
+        return dict(datos["hoy"])
+
+    def prevision_semanal(self):
+        return self._desde_hoy(self._prevision())["semana"]
+
+    def uv_actual(self):
+        return self.cache.obtener(
+            self.clave_uv, self._descargar_uv,
+            ttl=self.ttl_openuv, max_obsoleto=MAX_OBSOLETO_OPENUV,
+        )
+
+    def refrescar_aemet(self):
+        # No vuelve a descargar si otro proceso ya lo hizo hoy.
+        return self.cache.refrescar(self.clave_aemet, self._descargar_aemet, ttl=segundos_desde_medianoche_madrid())
+
+    def refrescar_uv(self):
+        return self.cache.refrescar(self.clave_uv, self._descargar_uv, ttl=self.ttl_openuv / 2)
+
+    def estado_circuitos(self):
+        return {"aemet": self.circuito_aemet.estado_detallado(), "openuv": self.circuito_uv.estado_detallado()}
+
+    def edad_datos(self):
+        return {"aemet": self.cache.edad(self.clave_aemet), "openuv": self.cache.edad(self.clave_uv)}
+
+    def obtener_clima_hoy(self):
+        # El UV se pide en paralelo con la cadena de AEMET, así que en frío
+        # se espera por la más lenta y no por la suma. Si OpenUV falla se
+        # conserva el uvMax de la previsión de AEMET, y lo mismo si tarda
+        # más de espera_uv segundos tras AEMET. El hilo del UV hereda el
+        # contexto para que sus tiempos cuenten en la misma petición.
+        with medir("clima"):
+            uv = _ejecutor.submit(contextvars.copy_context().run, self.uv_actual)
+            clima = self.prevision_aemet()
+            try:
+                clima["UV"] = uv.result(timeout=self.espera_uv)
+            except FuturesTimeout:
+                # Si aún no había empezado (ejecutor ocupado), no se lanza.
+                uv.cancel()
+                self.uv_agotados += 1
+            except Exception:
+                pass
+            return clima
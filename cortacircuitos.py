@@ -0,0 +1,127 @@
+import threading
+import time
+
+# Cortacircuitos para las llamadas a APIs externas. Tras `umbral_fallos`
+# errores seguidos se abre y durante `tiempo_apertura` segundos falla al
+# instante con CircuitoAbierto en lugar de esperar a los timeouts. Si tiene
+# `sonda`, un hilo la ejecuta al vencer ese plazo y solo la sonda decide si
+# se vuelve a cerrar (las peticiones nunca hacen de prueba); si falla, el
+# plazo se duplica hasta `tiempo_apertura_max`. Sin sonda, la primera
+# llamada tras el plazo pasa como prueba (semiabierto).
+
+UMBRAL_FALLOS = 3
+TIEMPO_APERTURA = 30.0
+TIEMPO_APERTURA_MAX = 600.0
+
+
+class CircuitoAbierto(RuntimeError):
+    pass
+
+
+class Cortacircuitos:
+    def __init__(self, nombre, umbral_fallos=UMBRAL_FALLOS, tiempo_apertura=TIEMPO_APERTURA,
+                 tiempo_apertura_max=TIEMPO_APERTURA_MAX, sonda=None):
+        self.nombre = nombre
+        self.umbral_fallos = umbral_fallos
+        self.tiempo_apertura = tiempo_apertura
+        self.tiempo_apertura_max = tiempo_apertura_max
+        self.sonda = sonda
+        self._lock = threading.Lock()
+        self._estado = "cerrado"
+        self._fallos_seguidos = 0
+        self._apertura_actual = tiempo_apertura
+        self._reabrir_en = 0.0
+        self._probando = False
+        self._sondeando = False
+        self.aperturas = 0
+        self.rechazadas = 0
+        self.ultimo_error = None
+
+    @property
+    def estado(self):
+        with self._lock:
+            return self._estado
+
+    def _permitir(self):
+        with self._lock:
+            if self._estado == "cerrado":
+                return
+            if self._estado == "abierto" and self.sonda is None and time.monotonic() >= self._reabrir_en:
+                self._estado = "semiabierto"
+            if self._estado == "semiabierto" and not self._probando:
+                self._probando = True
+                return
+            self.rechazadas += 1
+        raise CircuitoAbierto(f"Servicio '{self.nombre}' no disponible (circuito abierto).")
+
+    def _exito(self):
+        with self._lock:
+            self._estado = "cerrado"
+            self._fallos_seguidos = 0
+            self._apertura_actual = self.tiempo_apertura
+            self._probando = False
+
+    def _fallo(self, error):
+        with self._lock:
+            self.ultimo_error = str(error)
+            self._fallos_seguidos += 1
+            if self._estado == "abierto":
+                # Llamada que empezó antes de abrirse el circuito.
+                return
+            if self._estado == "semiabierto":
+                self._apertura_actual = min(self._apertura_actual * 2, self.tiempo_apertura_max)
+            elif self._fallos_seguidos < self.umbral_fallos:
+                return
+            else:
+                self.aperturas += 1
+            self._estado = "abierto"
+            self._probando = False
+            self._reabrir_en = time.monotonic() + self._apertura_actual
+            lanzar_sonda = self.sonda is not None and not self._sondeando
+            if lanzar_sonda:
+                self._sondeando = True
+        if lanzar_sonda:
+            threading.Thread(target=self._sondear, name=f"sonda-{self.nombre}", daemon=True).start()
+
+    def llamar(self, funcion, *args, **kwargs):
+        self._permitir()
+        try:
+            resultado = funcion(*args, **kwargs)
+        except Exception as e:
+            self._fallo(e)
+            raise
+        self._exito()
+        return resultado
+
+    def _sondear(self):
+        while True:
+            with self._lock:
+                if self._estado == "cerrado":
+                    self._sondeando = False
+                    return
+                espera = self._reabrir_en - time.monotonic()
+            if espera > 0:
+                time.sleep(espera)
+            try:
+                self.sonda()
+            except Exception as e:
+                with self._lock:
+                    self.ultimo_error = str(e)
+                    self._apertura_actual = min(self._apertura_actual * 2, self.tiempo_apertura_max)
+                    self._reabrir_en = time.monotonic() + self._apertura_actual
+                continue
+            with self._lock:
+                self._sondeando = False
+            self._exito()
+            return
+
+    def estado_detallado(self):
+        with self._lock:
+            return {
+                "estado": self._estado,
+                "fallos_seguidos": self._fallos_seguidos,
+                "aperturas": self.aperturas,
+                "rechazadas": self.rechazadas,
+                "reabre_en": round(max(0.0, self._reabrir_en - time.monotonic()), 1) if self._estado != "cerrado" else None,
+                "ultimo_error": self.ultimo_error,
+            }
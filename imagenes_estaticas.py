@@ -0,0 +1,224 @@
+import argparse
+import hashlib
+import html
+import json
+import os
+import sys
+import unicodedata
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import quote, unquote, urlparse
+
+# Variantes redimensionadas de las imágenes de imagenes/ para servirlas desde
+# un sitio propio en lugar de los PNG originales de raw.githubusercontent.com.
+# Cada imagen se convierte a AVIF y WebP en varios anchos y a una miniatura;
+# el nombre de cada fichero lleva un hash del original, así que se pueden
+# servir con caché de un año (api.py monta el directorio en /static/img).
+#
+#   python imagenes_estaticas.py construir
+#
+# Las entradas de LUGARES_INFO no cambian: una imagen_url que apunte a
+# .../imagenes/<fichero> se sustituye por sus variantes si <fichero> está en
+# el manifiesto; las demás (Wikimedia, o sin construir) se dejan como están.
+
+DIR_ORIGEN = "imagenes"
+DIR_ESTATICOS = os.path.join("static", "img")
+NOMBRE_MANIFIESTO = "manifest.json"
+ANCHOS = (320, 640, 960, 1440)
+ANCHO_MINIATURA = 160
+ANCHO_POR_DEFECTO = 640
+FORMATOS_IMAGEN = ("avif", "webp")
+CALIDAD = {"avif": 50, "webp": 78}
+EXTENSIONES_ORIGEN = (".png", ".jpg", ".jpeg", ".webp")
+# Ancho con el que se muestra la imagen del popup: la columna derecha de la
+# rejilla en pantallas anchas y casi toda la pantalla en móviles.
+SIZES_POPUP = "(min-width: 780px) 330px, 86vw"
+CACHE_INMUTABLE = "public, max-age=31536000, immutable"
+
+
+def _clave(nombre):
+    # Los nombres con tildes pueden venir en NFC (URL) o NFD (sistema de ficheros).
+    return unicodedata.normalize("NFC", nombre)
+
+
+def hash_contenido(ruta, longitud=10):
+    h = hashlib.sha256()
+    with open(ruta, "rb") as f:
+        for bloque in iter(lambda: f.read(1 << 20), b""):
+            h.update(bloque)
+    return h.hexdigest()[:longitud]
+
+
+def _guardar(imagen, ruta, formato):
+    if os.path.exists(ruta):
+        return False
+    tmp = f"{ruta}.{uuid.uuid4().hex[:8]}.tmp"
+    imagen.save(tmp, format=formato.upper(), quality=CALIDAD[formato])
+    os.replace(tmp, ruta)
+    return True
+
+
+def _redimensionar(imagen, ancho):
+    from PIL import Image
+
+    if imagen.width <= ancho:
+        return imagen
+    alto = round(imagen.height * ancho / imagen.width)
+    return imagen.resize((ancho, alto), Image.LANCZOS)
+
+
+def construir_imagen(ruta_origen, destino, anchos=ANCHOS, formatos=FORMATOS_IMAGEN):
+    # Los ficheros que ya existen no se vuelven a codificar: el hash en el
+    # nombre garantiza que corresponden al mismo original.
+    from PIL import Image, ImageOps
+
+    base, _ = os.path.splitext(os.path.basename(ruta_origen))
+    huella = hash_contenido(ruta_origen)
+    with Image.open(ruta_origen) as original:
+        imagen = ImageOps.exif_transpose(original)
+        imagen = imagen.convert("RGBA" if "A" in imagen.getbands() or imagen.mode == "P" else "RGB")
+    # Nunca se amplía: los anchos mayores que el original se sustituyen por él.
+    anchos = sorted({min(a, imagen.width) for a in anchos})
+    nuevos = 0
+    variantes = {formato: [] for formato in formatos}
+    for ancho in anchos:
+        reducida = _redimensionar(imagen, ancho)
+        for formato in formatos:
+            fichero = f"{base}-{huella}-{ancho}.{formato}"
+            nuevos += _guardar(reducida, os.path.join(destino, fichero), formato)
+            variantes[formato].append({"ancho": ancho, "fichero": fichero})
+    miniatura = f"{base}-{huella}-{ANCHO_MINIATURA}.webp"
+    nuevos += _guardar(_redimensionar(imagen, ANCHO_MINIATURA), os.path.join(destino, miniatura), "webp")
+    entrada = {
+        "hash": huella,
+        "ancho": imagen.width,
+        "alto": imagen.height,
+        "variantes": variantes,
+        "miniatura": miniatura,
+    }
+    return entrada, nuevos
+
+
+def construir(origen=DIR_ORIGEN, destino=DIR_ESTATICOS, anchos=ANCHOS, formatos=FORMATOS_IMAGEN,
+              limpiar=False, hilos=None):
+    if "webp" not in formatos or not set(formatos) <= set(FORMATOS_IMAGEN):
+        raise ValueError(f"Formatos no válidos: {formatos}. Usa 'webp' y opcionalmente 'avif'.")
+    os.makedirs(destino, exist_ok=True)
+    rutas = sorted(
+        os.path.join(origen, f) for f in os.listdir(origen) if f.lower().endswith(EXTENSIONES_ORIGEN)
+    )
+    # Pillow libera el GIL al codificar, así que los hilos sí reparten la CPU.
+    with ThreadPoolExecutor(max_workers=hilos or os.cpu_count()) as ejecutor:
+        resultados = list(ejecutor.map(lambda r: construir_imagen(r, destino, anchos, formatos), rutas))
+    imagenes = {_clave(os.path.basename(r)): entrada for r, (entrada, _) in zip(rutas, resultados)}
+    manifiesto = {"version": 1, "imagenes": imagenes}
+    ruta_manifiesto = os.path.join(destino, NOMBRE_MANIFIESTO)
+    tmp = f"{ruta_manifiesto}.{uuid.uuid4().hex[:8]}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(manifiesto, f, ensure_ascii=False, indent=2)
+    os.replace(tmp, ruta_manifiesto)
+
+    borrados = 0
+    if limpiar:
+        usados = {NOMBRE_MANIFIESTO}
+        for entrada in imagenes.values():
+            usados.add(entrada["miniatura"])
+            usados.update(v["fichero"] for vs in entrada["variantes"].values() for v in vs)
+        for fichero in os.listdir(destino):
+            if fichero not in usados and not fichero.endswith(".tmp"):
+                os.remove(os.path.join(destino, fichero))
+                borrados += 1
+    return {
+        "imagenes": len(imagenes),
+        "ficheros_nuevos": sum(n for _, n in resultados),
+        "ficheros_borrados": borrados,
+        "manifiesto": ruta_manifiesto,
+    }
+
+
+class ImagenesEstaticas:
+    def __init__(self, manifiesto, url_base):
+        self.imagenes = manifiesto.get("imagenes", {})
+        self.url_base = url_base.rstrip("/")
+
+    def entrada(self, url_original):
+        # Solo las URLs que apuntan a un fichero de imagenes/ tienen variantes.
+        if not url_original:
+            return None
+        partes = urlparse(url_original).path.rsplit("/", 2)
+        if len(partes) < 2 or partes[-2] != DIR_ORIGEN:
+            return None
+        return self.imagenes.get(_clave(unquote(partes[-1])))
+
+    def _url(self, fichero):
+        return f"{self.url_base}/{quote(fichero)}"
+
+    def url(self, url_original, ancho=ANCHO_POR_DEFECTO, formato="webp"):
+        # La variante más pequeña que cubre `ancho`, o la URL original.
+        entrada = self.entrada(url_original)
+        if entrada is None:
+            return url_original
+        variantes = entrada["variantes"][formato]
+        elegida = next((v for v in variantes if v["ancho"] >= ancho), variantes[-1])
+        return self._url(elegida["fichero"])
+
+    def srcset(self, entrada, formato):
+        return ", ".join(f"{self._url(v['fichero'])} {v['ancho']}w" for v in entrada["variantes"][formato])
+
+    def html_picture(self, url_original, alt, estilo="", sizes=SIZES_POPUP):
+        # <picture> con AVIF y WebP; el <img> usa por defecto la variante de
+        # ANCHO_POR_DEFECTO en WebP. None si la imagen no está construida.
+        entrada = self.entrada(url_original)
+        if entrada is None:
+            return None
+        fuentes = "".join(
+            f'<source type="image/{formato}" srcset="{self.srcset(entrada, formato)}" sizes="{sizes}">'
+            for formato in entrada["variantes"] if formato != "webp"
+        )
+        return (
+            f'<picture>{fuentes}'
+            f'<img src="{self.url(url_original)}" srcset="{self.srcset(entrada, "webp")}" sizes="{sizes}" '
+            f'width="{entrada["ancho"]}" height="{entrada["alto"]}" alt="{html.escape(alt)}" '
+            f'loading="lazy" decoding="async" style="{estilo}" />'
+            f'</picture>'
+        )
+
+
+def cargar_imagenes_estaticas(url_base, directorio=DIR_ESTATICOS):
+    # None si no hay URL configurada o no se ha construido el manifiesto: en
+    # ese caso se siguen usando las URLs originales.
+    if not url_base:
+        return None
+    try:
+        with open(os.path.join(directorio, NOMBRE_MANIFIESTO), "r", encoding="utf-8") as f:
+            manifiesto = json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+    return ImagenesEstaticas(manifiesto, url_base)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Genera variantes AVIF/WebP con hash de las imágenes de imagenes/.")
+    sub = parser.add_subparsers(dest="orden", required=True)
+    p = sub.add_parser("construir")
+    p.add_argument("--origen", default=DIR_ORIGEN)
+    p.add_argument("--destino", default=DIR_ESTATICOS)
+    p.add_argument("--anchos", default=",".join(str(a) for a in ANCHOS),
+                   help="anchos separados por comas")
+    p.add_argument("--formatos", default=",".join(FORMATOS_IMAGEN))
+    p.add_argument("--limpiar", action="store_true",
+                   help="borra del destino los ficheros que ya no están en el manifiesto")
+    args = parser.parse_args(argv)
+
+    resultado = construir(
+        args.origen, args.destino,
+        anchos=tuple(int(a) for a in args.anchos.split(",") if a.strip()),
+        formatos=tuple(f.strip().lower() for f in args.formatos.split(",") if f.strip()),
+        limpiar=args.limpiar,
+    )
+    print(json.dumps(resultado, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,164 @@
+import math
+
+import numpy as np
+
+# Índice espacial de rejilla sobre las coordenadas del catálogo para
+# consultas "k más cercanos" y "todo lo que hay a menos de r km" sin
+# recorrer todos los lugares. Las coordenadas se proyectan a km con una
+# equirectangular centrada en el catálogo (error despreciable a escala de
+# una comarca) y se reparten en celdas de `tam_celda_km`; solo se calcula
+# la distancia haversine exacta a los lugares de las celdas candidatas.
+
+RADIO_TIERRA_KM = 6371.0088
+TAM_CELDA_KM = 2.0
+# Margen para la diferencia entre la distancia proyectada y la haversine.
+MARGEN_PROYECCION = 0.98
+# Anillos que se recorren como mucho antes de pasar a fuerza bruta.
+ANILLOS_MAX = 32
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    lat1, lon1, lat2, lon2 = (np.radians(v) for v in (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * RADIO_TIERRA_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+class IndiceEspacial:
+    def __init__(self, claves, lats, lons, tam_celda_km=TAM_CELDA_KM):
+        self.claves = tuple(claves)
+        self.lats = np.asarray(lats, dtype=np.float64)
+        self.lons = np.asarray(lons, dtype=np.float64)
+        self.tam_celda_km = tam_celda_km
+        self._posicion = {clave: i for i, clave in enumerate(self.claves)}
+        self._lat0 = float(np.mean(self.lats)) if len(self.claves) else 0.0
+        self._cos_lat0 = math.cos(math.radians(self._lat0))
+        celdas_x, celdas_y = self._celda(self.lats, self.lons)
+        celdas = {}
+        for i, celda in enumerate(zip(celdas_x.tolist(), celdas_y.tolist())):
+            celdas.setdefault(celda, []).append(i)
+        self._celdas = {celda: np.array(indices, dtype=np.intp) for celda, indices in celdas.items()}
+        if celdas:
+            xs, ys = zip(*celdas)
+            self._extension = (min(xs), max(xs), min(ys), max(ys))
+
+    @classmethod
+    def desde_catalogo(cls, catalogo, tam_celda_km=TAM_CELDA_KM):
+        lugares = list(catalogo.values())
+        return cls(
+            [l.clave for l in lugares], [l.lat for l in lugares], [l.lon for l in lugares],
+            tam_celda_km=tam_celda_km,
+        )
+
+    def __len__(self):
+        return len(self.claves)
+
+    def _celda(self, lat, lon):
+        km_por_grado = math.pi * RADIO_TIERRA_KM / 180.0
+        x = np.floor(np.asarray(lon) * km_por_grado * self._cos_lat0 / self.tam_celda_km).astype(np.int64)
+        y = np.floor(np.asarray(lat) * km_por_grado / self.tam_celda_km).astype(np.int64)
+        return x, y
+
+    def _candidatos(self, celdas):
+        arrays = [self._celdas[c] for c in celdas if c in self._celdas]
+        if not arrays:
+            return np.empty(0, dtype=np.intp)
+        return arrays[0] if len(arrays) == 1 else np.concatenate(arrays)
+
+    def _resultado(self, indices, distancias, permitidos):
+        orden = np.argsort(distancias, kind="stable")
+        resultado = []
+        for i in orden:
+            clave = self.claves[indices[i]]
+            if permitidos is None or clave in permitidos:
+                resultado.append((clave, float(distancias[i])))
+        return resultado
+
+    def _todos(self, lat, lon, permitidos, radio_max_km=None):
+        # Fuerza bruta vectorizada: para puntos lejos del catálogo o
+        # búsquedas que tocarían más celdas que lugares hay.
+        indices = np.arange(len(self.claves))
+        distancias = haversine_km(lat, lon, self.lats, self.lons)
+        if radio_max_km is not None:
+            dentro = distancias <= radio_max_km
+            indices, distancias = indices[dentro], distancias[dentro]
+        return self._resultado(indices, distancias, permitidos)
+
+    def _fuera(self, cx, cy):
+        x_min, x_max, y_min, y_max = self._extension
+        return not (x_min <= cx <= x_max and y_min <= cy <= y_max)
+
+    def distancia_extension_km(self, lat, lon):
+        # Distancia del punto al rectángulo lat/lon que ocupa el catálogo
+        # (0 si está dentro).
+        if not self.claves:
+            return math.inf
+        lat_c = min(max(lat, float(self.lats.min())), float(self.lats.max()))
+        lon_c = min(max(lon, float(self.lons.min())), float(self.lons.max()))
+        return float(haversine_km(lat, lon, lat_c, lon_c))
+
+    def posicion(self, clave):
+        i = self._posicion[clave]
+        return float(self.lats[i]), float(self.lons[i])
+
+    def en_radio(self, lat, lon, radio_km, permitidos=None):
+        # Lugares a menos de `radio_km`, del más cercano al más lejano, como
+        # (clave, distancia_km). `permitidos` limita el resultado a esas claves.
+        if not self.claves:
+            return []
+        cx, cy = (int(v) for v in self._celda(lat, lon))
+        n = int(math.ceil(radio_km / (self.tam_celda_km * MARGEN_PROYECCION)))
+        x_min, x_max, y_min, y_max = self._extension
+        xs = range(max(cx - n, x_min), min(cx + n, x_max) + 1)
+        ys = range(max(cy - n, y_min), min(cy + n, y_max) + 1)
+        if len(xs) * len(ys) > len(self.claves):
+            return self._todos(lat, lon, permitidos, radio_km)
+        celdas = [(x, y) for x in xs for y in ys]
+        indices = self._candidatos(celdas)
+        distancias = haversine_km(lat, lon, self.lats[indices], self.lons[indices])
+        dentro = distancias <= radio_km
+        return self._resultado(indices[dentro], distancias[dentro], permitidos)
+
+    def k_cercanos(self, lat, lon, k, permitidos=None, radio_max_km=None):
+        # Recorre anillos de celdas alrededor del punto hasta que los k
+        # mejores están más cerca que cualquier celda aún sin visitar.
+        if not self.claves or k <= 0:
+            return []
+        cx, cy = (int(v) for v in self._celda(lat, lon))
+        x_min, x_max, y_min, y_max = self._extension
+        anillos_max = max(cx - x_min, x_max - cx, cy - y_min, y_max - cy, 0)
+        # Lejos del catálogo los anillos crecen con el cuadrado de la
+        # distancia sin encontrar nada: fuerza bruta.
+        if self._fuera(cx, cy) or anillos_max > ANILLOS_MAX:
+            return self._todos(lat, lon, permitidos, radio_max_km)[:k]
+        encontrados = []
+        anillo = 0
+        while anillo <= anillos_max:
+            # Solo las celdas del anillo dentro de la extensión ocupada.
+            if anillo == 0:
+                celdas = [(cx, cy)]
+            else:
+                xs = range(max(cx - anillo, x_min), min(cx + anillo, x_max) + 1)
+                ys = range(max(cy - anillo + 1, y_min), min(cy + anillo - 1, y_max) + 1)
+                celdas = [(x, y) for x in xs for y in (cy - anillo, cy + anillo) if y_min <= y <= y_max]
+                celdas += [(x, y) for x in (cx - anillo, cx + anillo) if x_min <= x <= x_max for y in ys]
+            indices = self._candidatos(celdas)
+            if len(indices):
+                distancias = haversine_km(lat, lon, self.lats[indices], self.lons[indices])
+                encontrados.extend(self._resultado(indices, distancias, permitidos))
+                encontrados.sort(key=lambda r: r[1])
+            # Lo no visitado está al menos a `anillo` celdas completas.
+            alcance = anillo * self.tam_celda_km * MARGEN_PROYECCION
+            if radio_max_km is not None and alcance > radio_max_km:
+                break
+            if len(encontrados) >= k and encontrados[k - 1][1] <= alcance:
+                break
+            anillo += 1
+        if radio_max_km is not None:
+            encontrados = [r for r in encontrados if r[1] <= radio_max_km]
+        return encontrados[:k]
+
+    def cercanos_a(self, clave, k, permitidos=None, radio_max_km=None):
+        # Como k_cercanos desde la posición de un lugar del índice, sin él.
+        lat, lon = self.posicion(clave)
+        resultado = self.k_cercanos(lat, lon, k + 1, permitidos, radio_max_km)
+        return [r for r in resultado if r[0] != clave][:k]
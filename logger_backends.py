@@ -0,0 +1,280 @@
+import json
+import os
+import sqlite3
+import threading
+import uuid
+from datetime import datetime
+
+# Destinos para las filas [fecha, evento, datos_json] que replica el spool
+# de logger_gsheets. Todos exponen append_rows(filas), igual que una hoja
+# de gspread, y los locales permiten leer los eventos como DataFrame.
+
+BACKENDS_DISPONIBLES = ("gsheets", "sqlite", "jsonl", "parquet")
+COLUMNAS_EVENTO = ["fecha", "evento", "datos"]
+FICHERO_MAX_FILAS = 100_000
+# Parquet: cuando una partición diaria acumula tantas partes pequeñas de
+# este proceso, se funden en una sola; las que ya tienen PARQUET_FILAS_PARTE
+# filas no se vuelven a reescribir.
+PARQUET_COMPACTAR_PARTES = 20
+PARQUET_FILAS_PARTE = 50_000
+
+
+class BackendEventos:
+    def append_rows(self, filas):
+        raise NotImplementedError
+
+    def cerrar(self):
+        pass
+
+
+class BackendGoogleSheets(BackendEventos):
+    def __init__(self, obtener_hoja):
+        self._obtener_hoja = obtener_hoja
+
+    def append_rows(self, filas):
+        self._obtener_hoja().append_rows(filas)
+
+
+class BackendSQLite(BackendEventos):
+    def __init__(self, ruta):
+        self.ruta = ruta
+        directorio = os.path.dirname(ruta)
+        if directorio:
+            os.makedirs(directorio, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(ruta, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS eventos (fecha TEXT NOT NULL, evento TEXT NOT NULL, datos TEXT)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_eventos_evento_fecha ON eventos (evento, fecha)")
+        self._conn.commit()
+
+    def append_rows(self, filas):
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT INTO eventos (fecha, evento, datos) VALUES (?, ?, ?)",
+                [tuple(f[:3]) for f in filas],
+            )
+
+    def leer(self, evento=None):
+        import pandas as pd
+        consulta = "SELECT fecha, evento, datos FROM eventos"
+        params = ()
+        if evento is not None:
+            consulta += " WHERE evento = ?"
+            params = (evento,)
+        with self._lock:
+            return pd.read_sql_query(consulta, self._conn, params=params)
+
+    def cerrar(self):
+        with self._lock:
+            self._conn.close()
+
+
+class BackendJSONL(BackendEventos):
+    def __init__(self, directorio, max_filas=FICHERO_MAX_FILAS):
+        self.directorio = directorio
+        self.max_filas = max_filas
+        os.makedirs(directorio, exist_ok=True)
+        self._lock = threading.Lock()
+        self._fichero = None
+        self._dia = None
+        self._filas = 0
+
+    def _rotar_si_toca(self, dia):
+        if self._fichero is not None and dia == self._dia and self._filas < self.max_filas:
+            return
+        if self._fichero is not None:
+            self._fichero.close()
+        nombre = f"eventos-{dia}-{datetime.now().strftime('%H%M%S')}-{uuid.uuid4().hex[:6]}.jsonl"
+        self._fichero = open(os.path.join(self.directorio, nombre), "a", encoding="utf-8")
+        self._dia = dia
+        self._filas = 0
+
+    def append_rows(self, filas):
+        with self._lock:
+            for fila in filas:
+                self._rotar_si_toca(str(fila[0])[:10])
+                self._fichero.write(json.dumps(dict(zip(COLUMNAS_EVENTO, fila)), ensure_ascii=False) + "\n")
+                self._filas += 1
+            self._fichero.flush()
+
+    def leer(self, evento=None):
+        import pandas as pd
+        ficheros = sorted(
+            os.path.join(self.directorio, n) for n in os.listdir(self.directorio) if n.endswith(".jsonl")
+        )
+        if not ficheros:
+            return pd.DataFrame(columns=COLUMNAS_EVENTO)
+        df = pd.concat([pd.read_json(f, lines=True, dtype=False) for f in ficheros], ignore_index=True)
+        return df if evento is None else df[df["evento"] == evento].reset_index(drop=True)
+
+    def cerrar(self):
+        with self._lock:
+            if self._fichero is not None:
+                self._fichero.close()
+                self._fichero = None
+
+
+class BackendParquet(BackendEventos):
+    # Cada lote se escribe como una parte propia dentro de una partición
+    # diaria (fecha_dia=AAAA-MM-DD) y, cada PARQUET_COMPACTAR_PARTES lotes,
+    # las partes pequeñas de este proceso se funden en una. Escribir en .tmp
+    # y renombrar evita dejar ficheros a medias si el proceso cae durante
+    # la escritura; si cae entre escribir la parte fundida y borrar las
+    # originales, esas filas quedan duplicadas.
+    def __init__(self, directorio, compactar_partes=PARQUET_COMPACTAR_PARTES,
+                 filas_parte=PARQUET_FILAS_PARTE):
+        import pyarrow  # noqa: F401  (falla pronto si no está instalado)
+        self.directorio = directorio
+        self.compactar_partes = compactar_partes
+        self.filas_parte = filas_parte
+        os.makedirs(directorio, exist_ok=True)
+        # Las partes llevan la marca del proceso que las escribe: cada uno
+        # compacta solo las suyas.
+        self._marca = uuid.uuid4().hex[:8]
+        self._partes_nuevas = {}
+        self.compactaciones = 0
+        self.errores_compactar = 0
+
+    def _escribir(self, tabla, particion, prefijo="part"):
+        import pyarrow.parquet as pq
+        destino = os.path.join(
+            particion,
+            f"{prefijo}-{datetime.now().strftime('%H%M%S%f')}-{self._marca}-{uuid.uuid4().hex[:6]}.parquet",
+        )
+        # El temporal empieza por "." para que leer() (el descubrimiento de
+        # ficheros de pyarrow) no lo abra mientras se escribe.
+        tmp = os.path.join(particion, f".{os.path.basename(destino)}.tmp")
+        pq.write_table(tabla, tmp)
+        os.replace(tmp, destino)
+        return destino
+
+    def _compactar(self, particion):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        pequenas = []
+        for nombre in sorted(os.listdir(particion)):
+            if not nombre.endswith(".parquet") or f"-{self._marca}-" not in nombre:
+                continue
+            ruta = os.path.join(particion, nombre)
+            if pq.ParquetFile(ruta).metadata.num_rows < self.filas_parte:
+                pequenas.append(ruta)
+        if len(pequenas) < 2:
+            return
+        self._escribir(pa.concat_tables([pq.read_table(r) for r in pequenas]), particion, "compacta")
+        for ruta in pequenas:
+            os.remove(ruta)
+        self.compactaciones += 1
+
+    def append_rows(self, filas):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        por_dia = {}
+        for fila in filas:
+            por_dia.setdefault(str(fila[0])[:10], []).append(fila)
+        for dia, filas_dia in por_dia.items():
+            particion = os.path.join(self.directorio, f"fecha_dia={dia}")
+            os.makedirs(particion, exist_ok=True)
+            tabla = pa.table({
+                col: [str(f[i]) for f in filas_dia] for i, col in enumerate(COLUMNAS_EVENTO)
+            })
+            self._escribir(tabla, particion)
+            self._partes_nuevas[particion] = self._partes_nuevas.get(particion, 0) + 1
+            if self._partes_nuevas[particion] >= self.compactar_partes:
+                self._partes_nuevas[particion] = 0
+                # Las filas ya están escritas: un fallo al compactar no
+                # debe hacer que el spool reenvíe el lote.
+                try:
+                    self._compactar(particion)
+                except Exception:
+                    self.errores_compactar += 1
+
+    def leer(self, evento=None, columnas=None):
+        import pandas as pd
+        filtros = [("evento", "==", evento)] if evento is not None else None
+        return pd.read_parquet(self.directorio, columns=columnas, filters=filtros)
+
+
+class BackendEnrutado(BackendEventos):
+    # Si un backend falla, el spool reenvía el lote entero. Para que los que
+    # ya lo recibieron no lo reciban dos veces, se recuerdan las filas que
+    # cada uno aceptó del lote fallido y en el reenvío solo se les manda lo
+    # que venga después. El lote reenviado empieza por las mismas filas:
+    #   - si trae más al final, solo se envían las nuevas;
+    #   - si es más corto (un prefijo de lo ya entregado), no se envía nada
+    #     y lo que sobra se sigue recordando para el lote siguiente;
+    #   - si empieza distinto, lo recordado ya no vale y se envía entero.
+    def __init__(self, defecto, por_evento=None):
+        self.defecto = defecto
+        self.por_evento = dict(por_evento or {})
+        self._lock = threading.Lock()
+        self._entregadas = {}
+
+    def append_rows(self, filas):
+        grupos = {}
+        for fila in filas:
+            backend = self.por_evento.get(fila[1], self.defecto)
+            grupos.setdefault(id(backend), (backend, []))[1].append(fila)
+        with self._lock:
+            for clave, (backend, filas_backend) in grupos.items():
+                previas = self._entregadas.get(clave, [])
+                if filas_backend[:len(previas)] == previas:
+                    nuevas = filas_backend[len(previas):]
+                elif previas[:len(filas_backend)] == filas_backend:
+                    nuevas = []
+                else:
+                    previas, nuevas = [], filas_backend
+                if nuevas:
+                    backend.append_rows(nuevas)
+                self._entregadas[clave] = previas + nuevas
+            # El lote entero ha llegado y el spool lo confirma: de cada
+            # backend solo se recuerda lo entregado más allá de este lote.
+            restantes = {}
+            for clave, previas in self._entregadas.items():
+                confirmadas = len(grupos[clave][1]) if clave in grupos else 0
+                if len(previas) > confirmadas:
+                    restantes[clave] = previas[confirmadas:]
+            self._entregadas = restantes
+
+    def cerrar(self):
+        for backend in {id(b): b for b in [self.defecto, *self.por_evento.values()]}.values():
+            backend.cerrar()
+
+
+def crear_backend(nombre, obtener_hoja=None, sqlite_ruta="logs/eventos.sqlite3",
+                  ficheros_dir="logs/eventos"):
+    # JSONL y Parquet van a subdirectorios distintos de `ficheros_dir`: leer
+    # uno no debe encontrarse los ficheros del otro.
+    nombre = (nombre or "gsheets").strip().lower()
+    if nombre == "gsheets":
+        if obtener_hoja is None:
+            raise ValueError("El backend 'gsheets' necesita una función para obtener la hoja.")
+        return BackendGoogleSheets(obtener_hoja)
+    if nombre == "sqlite":
+        return BackendSQLite(sqlite_ruta)
+    if nombre == "jsonl":
+        return BackendJSONL(os.path.join(ficheros_dir, "jsonl"))
+    if nombre == "parquet":
+        return BackendParquet(os.path.join(ficheros_dir, "parquet"))
+    raise ValueError(f"Backend de logging desconocido: '{nombre}'. Opciones: {', '.join(BACKENDS_DISPONIBLES)}")
+
+
+def crear_backend_enrutado(nombre_defecto, rutas=None, **opciones):
+    # rutas: {"evento": "backend"}; cada backend se crea una sola vez.
+    creados = {}
+
+    def _obtener(nombre):
+        clave = (nombre or "gsheets").strip().lower()
+        if clave not in creados:
+            creados[clave] = crear_backend(clave, **opciones)
+        return creados[clave]
+
+    defecto = _obtener(nombre_defecto)
+    if not rutas:
+        return defecto
+    return BackendEnrutado(defecto, {evento: _obtener(b) for evento, b in rutas.items()})
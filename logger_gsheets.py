@@ -1,8 +1,12 @@
 import streamlit as st
 import json
+import os
+import atexit
+import glob
+import threading
 from datetime import datetime, timedelta
-import gspread
-from google.oauth2.service_account import Credentials
+from logger_backends import crear_backend_enrutado
+from metricas import cronometrado, tiempos_peticion
 
 SCOPE = [
     "https://www.googleapis.com/auth/spreadsheets",
@@ -11,6 +15,36 @@ SCOPE = [
 
 SPREADSHEET_NAME = "Logs_TurismoCarboneras"
 
+# Cada evento se escribe primero en un spool local (JSON-lines, solo
+# añadir) y un hilo en segundo plano lo replica al backend configurado
+# (LOG_BACKEND: gsheets, sqlite, jsonl o parquet; LOG_RUTAS permite mandar
+# eventos concretos a otro backend, p. ej. {"predicted": "sqlite"}) en lotes
+# append_rows, guardando el offset confirmado junto al fichero. Si la hoja
+# falla o se agota la cuota, los eventos esperan en disco y se reintentan
+# con espera exponencial. La entrega es "al menos una vez": si el proceso
+# muere entre el envío y la confirmación, el último lote se reenvía.
+# Cada proceso usa su propio fichero de spool (LOG_SPOOL_RUTA con el pid
+# delante de la extensión) y lo mantiene bloqueado con flock mientras
+# vive; al arrancar, adopta las filas pendientes de los spools cuyo
+# proceso ya no existe (nadie tiene su bloqueo) y los borra.
+LOG_SPOOL_RUTA = "logs/eventos_spool.jsonl"
+LOG_SPOOL_MAX_PENDIENTES = 100_000
+LOG_SPOOL_COMPACTAR_BYTES = 4 * 1024 * 1024
+LOG_TAM_LOTE = 50
+LOG_INTERVALO_FLUSH = 2.0
+LOG_ESPERA_MAX_REINTENTO = 60.0
+LOG_ESPERA_CIERRE = 10.0
+
+def _config(nombre, defecto=None):
+    valor = os.environ.get(nombre)
+    if valor not in (None, ""):
+        return valor
+    try:
+        valor = st.secrets.get(nombre)
+    except Exception:
+        valor = None
+    return defecto if valor in (None, "") else valor
+
 def _load_sa_credentials():
     raw = st.secrets.get("gcp_service_account")
     if raw is None:
@@ -26,10 +60,13 @@ def _load_sa_credentials():
         pk = pk.replace("\\n", "\n")
     creds_dict["private_key"] = pk
 
+    from google.oauth2.service_account import Credentials
     return Credentials.from_service_account_info(creds_dict, scopes=SCOPE)
 
 @st.cache_resource(show_spinner=False)
 def _get_gs_client_and_sheet():
+    import gspread
+
     credentials = _load_sa_credentials()
     client = gspread.authorize(credentials)
     sheet = client.open(SPREADSHEET_NAME).sheet1
@@ -39,20 +76,396 @@ def get_sheet():
     _, sheet = _get_gs_client_and_sheet()
     return sheet
 
+def _rutas_backend():
+    rutas = _config("LOG_RUTAS")
+    if not rutas:
+        return None
+    if isinstance(rutas, str):
+        rutas = json.loads(rutas)
+    return dict(rutas)
+
+def crear_backend_configurado():
+    return crear_backend_enrutado(
+        _config("LOG_BACKEND", "gsheets"),
+        rutas=_rutas_backend(),
+        obtener_hoja=get_sheet,
+        sqlite_ruta=_config("LOG_SQLITE_RUTA", "logs/eventos.sqlite3"),
+        ficheros_dir=_config("LOG_FICHEROS_DIR", "logs/eventos"),
+    )
+
+
+try:
+    import fcntl
+except ImportError:  # Windows: sin bloqueo ni adopción de spools huérfanos
+    fcntl = None
+
+
+class SpoolEnUso(RuntimeError):
+    pass
+
+
+def ruta_spool_proceso(base, pid=None):
+    raiz, extension = os.path.splitext(base)
+    return f"{raiz}.{pid or os.getpid()}{extension}"
+
+
+class SpoolEventos:
+    def __init__(self, ruta, max_pendientes=LOG_SPOOL_MAX_PENDIENTES,
+                 compactar_bytes=LOG_SPOOL_COMPACTAR_BYTES, fsync=False):
+        self.ruta = ruta
+        self.ruta_offset = ruta + ".offset"
+        self._max_pendientes = max_pendientes
+        self._compactar_bytes = compactar_bytes
+        self._fsync = fsync
+        self._lock = threading.Lock()
+        directorio = os.path.dirname(ruta)
+        if directorio:
+            os.makedirs(directorio, exist_ok=True)
+        # El bloqueo se toma antes de reparar: nadie más puede estar
+        # escribiendo la línea que se recorta.
+        self._fichero = open(ruta, "ab")
+        self._bloquear()
+        self._reparar_cola()
+        self._offset = self._leer_offset()
+        self.pendientes = self._contar_pendientes()
+
+    def _bloquear(self):
+        if fcntl is None:
+            return
+        try:
+            fcntl.flock(self._fichero.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            self._fichero.close()
+            raise SpoolEnUso(f"El spool '{self.ruta}' lo está usando otro proceso.")
+
+    def _reparar_cola(self):
+        # Una escritura interrumpida deja una línea sin '\n' al final;
+        # se recorta para que la siguiente fila no quede pegada a ella.
+        if not os.path.exists(self.ruta):
+            return
+        with open(self.ruta, "rb+") as f:
+            f.seek(0, os.SEEK_END)
+            tam = f.tell()
+            if tam == 0:
+                return
+            f.seek(tam - 1)
+            if f.read(1) == b"\n":
+                return
+            bloque = 4096
+            pos = tam
+            while pos > 0:
+                inicio = max(0, pos - bloque)
+                f.seek(inicio)
+                datos = f.read(pos - inicio)
+                idx = datos.rfind(b"\n")
+                if idx >= 0:
+                    f.truncate(inicio + idx + 1)
+                    return
+                pos = inicio
+            f.truncate(0)
+
+    def _leer_offset(self):
+        try:
+            with open(self.ruta_offset, "r", encoding="utf-8") as f:
+                offset = int(f.read().strip() or 0)
+        except (FileNotFoundError, ValueError):
+            offset = 0
+        tam = os.path.getsize(self.ruta) if os.path.exists(self.ruta) else 0
+        return offset if 0 <= offset <= tam else 0
+
+    def _guardar_offset(self, offset):
+        tmp = self.ruta_offset + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(str(offset))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.ruta_offset)
+
+    def _contar_pendientes(self):
+        if not os.path.exists(self.ruta):
+            return 0
+        with open(self.ruta, "rb") as f:
+            f.seek(self._offset)
+            return sum(1 for _ in f)
+
+    def anadir(self, fila):
+        linea = (json.dumps(fila, ensure_ascii=False) + "\n").encode("utf-8")
+        with self._lock:
+            if self.pendientes >= self._max_pendientes:
+                return False
+            self._fichero.write(linea)
+            self._fichero.flush()
+            if self._fsync:
+                os.fsync(self._fichero.fileno())
+            self.pendientes += 1
+        return True
+
+    def leer_pendientes(self, max_filas):
+        with self._lock:
+            offset = self._offset
+        filas = []
+        with open(self.ruta, "rb") as f:
+            f.seek(offset)
+            while len(filas) < max_filas:
+                linea = f.readline()
+                if not linea.endswith(b"\n"):
+                    break
+                offset += len(linea)
+                try:
+                    filas.append(json.loads(linea))
+                except ValueError:
+                    continue
+        return filas, offset
+
+    def confirmar(self, offset, n_filas):
+        with self._lock:
+            self._guardar_offset(offset)
+            self._offset = offset
+            self.pendientes = max(0, self.pendientes - n_filas)
+            if self.pendientes == 0 and offset >= self._compactar_bytes:
+                self._compactar()
+
+    def _compactar(self):
+        # Se trunca antes de reiniciar el offset: si el proceso cae en
+        # medio, un offset mayor que el fichero se interpreta como 0.
+        self._fichero.truncate(0)
+        self._fichero.seek(0)
+        self._guardar_offset(0)
+        self._offset = 0
+
+    def cerrar(self):
+        with self._lock:
+            self._fichero.close()
+
+    def libres(self):
+        with self._lock:
+            return max(0, self._max_pendientes - self.pendientes)
+
+    def borrar(self):
+        self.cerrar()
+        for ruta in (self.ruta, self.ruta_offset):
+            try:
+                os.remove(ruta)
+            except FileNotFoundError:
+                pass
+
+
+def adoptar_spools_huerfanos(spool, base):
+    # Spools de procesos que ya no existen: los de otros pid con el mismo
+    # nombre base y el fichero compartido de versiones anteriores. Sus
+    # filas pendientes pasan a `spool` y se borran. Devuelve las filas
+    # adoptadas. Un spool cuyo dueño sigue vivo está bloqueado y se salta.
+    # Si `spool` se llena, lo que no cabe se queda en el huérfano (con su
+    # offset avanzado hasta lo adoptado) para el siguiente arranque.
+    if fcntl is None:
+        return 0
+    raiz, extension = os.path.splitext(base)
+    candidatos = [base] + [
+        ruta for ruta in glob.glob(f"{glob.escape(raiz)}.*{extension}")
+        if ruta[len(raiz) + 1:len(ruta) - len(extension)].isdigit()
+    ]
+    adoptadas = 0
+    for ruta in sorted(set(candidatos)):
+        if not os.path.exists(ruta) or os.path.abspath(ruta) == os.path.abspath(spool.ruta):
+            continue
+        try:
+            huerfano = SpoolEventos(ruta)
+        except SpoolEnUso:
+            continue
+        filas, offset = huerfano.leer_pendientes(min(huerfano.pendientes, spool.libres()))
+        if not all(spool.anadir(fila) for fila in filas):
+            # Otro hilo lo ha llenado entre medias: sin confirmar, las que
+            # sí entraron se repetirán en la próxima adopción.
+            huerfano.cerrar()
+            break
+        adoptadas += len(filas)
+        if filas:
+            huerfano.confirmar(offset, len(filas))
+        if huerfano.pendientes:
+            huerfano.cerrar()
+            break
+        huerfano.borrar()
+    return adoptadas
+
+
+class ReplicadorSpool:
+    def __init__(self, spool, destino, tam_lote=LOG_TAM_LOTE):
+        self.spool = spool
+        self.destino = destino
+        self.tam_lote = tam_lote
+
+    def replicar(self, max_lotes=None):
+        enviadas = 0
+        lotes = 0
+        while max_lotes is None or lotes < max_lotes:
+            filas, offset = self.spool.leer_pendientes(self.tam_lote)
+            if not filas:
+                break
+            self.destino.append_rows(filas)
+            self.spool.confirmar(offset, len(filas))
+            enviadas += len(filas)
+            lotes += 1
+        return enviadas
+
+
+class EscritorEventos:
+    def __init__(self, replicador, intervalo_flush=LOG_INTERVALO_FLUSH,
+                 espera_max_reintento=LOG_ESPERA_MAX_REINTENTO):
+        self.replicador = replicador
+        self._intervalo_flush = intervalo_flush
+        self._espera_max_reintento = espera_max_reintento
+        self._lock = threading.Lock()
+        self._lock_replica = threading.Lock()
+        self._aviso = threading.Event()
+        self._parar = threading.Event()
+        self._hilo = None
+        # Mientras el destino falla, el hilo espera su turno de reintento
+        # aunque se llene un lote: despertarlo en cada evento anularía la
+        # espera exponencial.
+        self._reintentando = False
+        self.escritos = 0
+        self.enviados = 0
+        self.descartados = 0
+        self.lotes_fallidos = 0
+        self.ultimo_error = None
+
+    def _arrancar(self):
+        if self._hilo is not None and self._hilo.is_alive():
+            return
+        with self._lock:
+            if self._hilo is not None and self._hilo.is_alive():
+                return
+            self._parar.clear()
+            self._hilo = threading.Thread(target=self._bucle, name="escritor-eventos", daemon=True)
+            self._hilo.start()
+
+    def registrar(self, fila):
+        if not self.replicador.spool.anadir(fila):
+            with self._lock:
+                self.descartados += 1
+            return False
+        with self._lock:
+            self.escritos += 1
+        self._arrancar()
+        if not self._reintentando and self.replicador.spool.pendientes >= self.replicador.tam_lote:
+            self._aviso.set()
+        return True
+
+    def _replicar(self):
+        with self._lock_replica:
+            try:
+                n = self.replicador.replicar()
+            except Exception as e:
+                with self._lock:
+                    self.lotes_fallidos += 1
+                    self.ultimo_error = e
+                return False
+        with self._lock:
+            self.enviados += n
+        return True
+
+    def _bucle(self):
+        espera = self._intervalo_flush
+        while not self._parar.is_set():
+            self._aviso.wait(espera)
+            self._aviso.clear()
+            if self._parar.is_set():
+                break
+            if self._replicar():
+                self._reintentando = False
+                espera = self._intervalo_flush
+            else:
+                self._reintentando = True
+                espera = min(espera * 2, self._espera_max_reintento)
+
+    def flush(self):
+        return self._replicar()
+
+    def cerrar(self, timeout=LOG_ESPERA_CIERRE):
+        self._parar.set()
+        self._aviso.set()
+        hilo = self._hilo
+        if hilo is not None and hilo.is_alive():
+            hilo.join(timeout)
+        self._replicar()
+        cerrar_destino = getattr(self.replicador.destino, "cerrar", None)
+        if cerrar_destino is not None:
+            cerrar_destino()
+
+    def estadisticas(self):
+        with self._lock:
+            return {
+                "pendientes": self.replicador.spool.pendientes,
+                "escritos": self.escritos,
+                "enviados": self.enviados,
+                "descartados": self.descartados,
+                "lotes_fallidos": self.lotes_fallidos,
+            }
+
+    def consumir_error(self):
+        with self._lock:
+            error, self.ultimo_error = self.ultimo_error, None
+        return error
+
+
+_escritor = None
+_escritor_lock = threading.Lock()
+
+def get_escritor():
+    global _escritor
+    if _escritor is None:
+        with _escritor_lock:
+            if _escritor is None:
+                base = _config("LOG_SPOOL_RUTA", LOG_SPOOL_RUTA)
+                spool = SpoolEventos(
+                    ruta_spool_proceso(base),
+                    fsync=str(_config("LOG_SPOOL_FSYNC", "")).lower() in ("1", "true", "si", "sí"),
+                )
+                adoptar_spools_huerfanos(spool, base)
+                _escritor = EscritorEventos(ReplicadorSpool(
+                    spool, crear_backend_configurado(),
+                    tam_lote=int(_config("LOG_TAM_LOTE", LOG_TAM_LOTE)),
+                ))
+                atexit.register(_escritor.cerrar)
+    return _escritor
+
+def _avisar_error(e):
+    key = "_gsheets_error_shown"
+    try:
+        if not st.session_state.get(key):
+            st.session_state[key] = True
+            st.error(f"Error al guardar en Google Sheets: {e}")
+    except Exception:
+        pass
+
+_adjuntar_tiempos = None
+
+def _tiempos_activados():
+    global _adjuntar_tiempos
+    if _adjuntar_tiempos is None:
+        _adjuntar_tiempos = str(_config("LOG_TIMINGS", "")).lower() in ("1", "true", "si", "sí")
+    return _adjuntar_tiempos
+
+@cronometrado("log_event")
 def log_event(evento, datos):
     try:
-        sheet = get_sheet()
+        # Con LOG_TIMINGS=1, los milisegundos de cada etapa de la petición en
+        # curso (metricas.peticion) viajan en el evento como "timings".
+        if _tiempos_activados():
+            tiempos = tiempos_peticion()
+            if tiempos:
+                datos = {**datos, "timings": tiempos}
         fila = [
                 (datetime.utcnow() + timedelta(hours=2)).replace(microsecond=0).isoformat(),
                 evento,
                 json.dumps(datos, ensure_ascii=False)
             ]
-        sheet.append_row(fila)
+        escritor = get_escritor()
+        escritor.registrar(fila)
     except Exception as e:
-        key = "_gsheets_error_shown"
-        if not st.session_state.get(key):
-            st.session_state[key] = True
-            st.error(f"Error al guardar en Google Sheets: {e}")
-
-
+        _avisar_error(e)
+        return
 
+    error = escritor.consumir_error()
+    if error is not None:
+        _avisar_error(error)
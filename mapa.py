@@ -0,0 +1,232 @@
+import html
+import json
+
+from cache_lru import CacheLRU
+
+# Construcción del mapa de lugares sin Streamlit. El HTML de cada popup se
+# genera una sola vez y el del mapa completo se memoriza por conjunto de
+# lugares (el orden no importa), de modo que los reruns de Streamlit que no
+# cambian las recomendaciones no vuelven a construir ni serializar nada.
+#
+# En modo "diferido" (el predeterminado) la hoja de estilos de los popups va
+# una sola vez en la cabecera del mapa y cada marcador lleva un popup vacío.
+# De cada lugar solo viajan los datos (nombre, descripción, imagen) en un
+# único objeto JSON, y el cuerpo del popup se construye en el navegador al
+# abrirlo. En modo "inline" cada popup lleva su propio HTML y CSS, como antes.
+#
+# folium (que arrastra pandas) se importa al construir el primer mapa, no al
+# importar el módulo.
+
+POPUP_MAX_W = 720
+CENTRO_MAPA = [39.8997, -1.8123]
+CACHE_MAPAS_MAX = 256
+MODOS_MAPA = ("diferido", "inline")
+
+ESTILO_POPUP = f"""
+      .pop-wrap {{
+        width: min({POPUP_MAX_W}px, 88vw);
+        height: clamp(340px, 58vh, 560px);
+        background:#fff; border-radius:12px;
+        box-sizing:border-box; margin:0 auto; padding:14px 16px;
+        font-family:system-ui,-apple-system,Segoe UI,Roboto,Helvetica,Arial; color:#222;
+        display:flex; flex-direction:column;
+      }}
+      .pop-title {{
+        margin:0 0 10px 0; line-height:1.2;
+        font-size:clamp(20px,2.2vw,28px);
+      }}
+      .pop-grid {{
+        display:grid; grid-template-columns: 1fr; gap:14px;
+        overflow-y:auto; padding-right:4px;
+      }}
+      .cell-text p {{ margin:0; font-size:16px; line-height:1.55; text-align:justify; }}
+
+      @media (min-width: 780px) {{
+        .pop-grid {{ grid-template-columns: 1.1fr 0.9fr; gap:18px; }}
+        .cell-text p {{ font-size:16px; }}
+      }}
+      @media (max-width: 779px) {{
+        .pop-wrap {{ width: 86vw; height: 56vh; }}
+        .cell-img {{ order: -1; }}
+        .cell-text p {{ font-size:15px; line-height:1.6; }}
+      }}
+"""
+
+
+ESTILO_IMAGEN_POPUP = "width:100%;height:auto;border-radius:14px;display:block;"
+
+
+def cuerpo_popup(lugar, imagenes=None):
+    nombre = html.escape(lugar.get("nombre", ""))
+    descripcion = html.escape(lugar.get("descripcion", ""))
+    img = (lugar.get("imagen_url") or "").strip()
+
+    # Con imágenes estáticas construidas, <picture> con srcset; si no, la URL original.
+    picture = imagenes.html_picture(img, lugar.get("nombre", ""), ESTILO_IMAGEN_POPUP) if imagenes and img else None
+    img_block = f"""
+      <div class="cell-img">
+        {picture or f'<img src="{img}" alt="{nombre}" loading="lazy" style="{ESTILO_IMAGEN_POPUP}" />'}
+      </div>
+    """ if img else ""
+
+    return f"""
+    <div class="pop-wrap">
+      <h2 class="pop-title">{nombre}</h2>
+      <div class="pop-grid">
+        {img_block}
+        <div class="cell-text"><p>{descripcion}</p></div>
+      </div>
+    </div>
+    """
+
+
+def popup_html_responsive(lugar, imagenes=None):
+    return f"<style>{ESTILO_POPUP}</style>{cuerpo_popup(lugar, imagenes)}"
+
+
+def datos_popup(lugar, imagenes=None):
+    # Lo mínimo para construir el popup en el navegador: n(ombre),
+    # d(escripción), i(magen) y, si hay imágenes estáticas, el <p>icture ya
+    # generado. El texto va sin escapar: el script lo inserta con textContent.
+    datos = {"n": lugar.get("nombre", ""), "d": lugar.get("descripcion", "")}
+    img = (lugar.get("imagen_url") or "").strip()
+    if img:
+        datos["i"] = img
+        picture = imagenes.html_picture(img, lugar.get("nombre", ""), ESTILO_IMAGEN_POPUP) if imagenes else None
+        if picture:
+            datos["p"] = picture
+    return datos
+
+
+PLANTILLA_POPUPS_DIFERIDOS = """
+{% macro header(this, kwargs) %}
+<style>{{ this.estilo }}</style>
+{% endmacro %}
+{% macro script(this, kwargs) %}
+(function() {
+    var datos = {{ this.datos_json }};
+    var estiloImagen = {{ this.estilo_imagen_json }};
+    function bloque(etiqueta, clase) {
+        var el = document.createElement(etiqueta);
+        if (clase) { el.className = clase; }
+        return el;
+    }
+    function cuerpo(d) {
+        var wrap = bloque('div', 'pop-wrap');
+        var titulo = bloque('h2', 'pop-title');
+        titulo.textContent = d.n;
+        wrap.appendChild(titulo);
+        var grid = bloque('div', 'pop-grid');
+        if (d.i) {
+            var celda = bloque('div', 'cell-img');
+            if (d.p) {
+                celda.innerHTML = d.p;
+            } else {
+                var img = bloque('img');
+                img.src = d.i;
+                img.alt = d.n;
+                img.loading = 'lazy';
+                img.style.cssText = estiloImagen;
+                celda.appendChild(img);
+            }
+            grid.appendChild(celda);
+        }
+        var texto = bloque('div', 'cell-text');
+        var parrafo = bloque('p');
+        parrafo.textContent = d.d;
+        texto.appendChild(parrafo);
+        grid.appendChild(texto);
+        wrap.appendChild(grid);
+        return wrap;
+    }
+    {{ this._parent.get_name() }}.on('popupopen', function(e) {
+        var hueco = e.popup.getElement().querySelector('.pop-diferido');
+        if (!hueco || hueco.dataset.lleno) { return; }
+        var d = datos[hueco.dataset.clave];
+        if (d) { hueco.appendChild(cuerpo(d)); }
+        hueco.dataset.lleno = '1';
+        e.popup.update();
+    });
+})();
+{% endmacro %}
+"""
+_clase_popups_diferidos = None
+
+
+def popups_diferidos(datos, estilo=ESTILO_POPUP):
+    # Elemento de folium con la hoja de estilos y los datos de los popups.
+    # La clase se crea la primera vez para no importar branca antes de tiempo.
+    global _clase_popups_diferidos
+    if _clase_popups_diferidos is None:
+        from branca.element import MacroElement
+        from jinja2 import Template
+
+        class PopupsDiferidos(MacroElement):
+            _template = Template(PLANTILLA_POPUPS_DIFERIDOS)
+
+            def __init__(self, datos, estilo):
+                super().__init__()
+                self._name = "PopupsDiferidos"
+                self.estilo = estilo
+                # "</" escapado para que una descripción no pueda cerrar el <script>.
+                self.datos_json = json.dumps(datos, ensure_ascii=False).replace("</", "<\\/")
+                self.estilo_imagen_json = json.dumps(ESTILO_IMAGEN_POPUP)
+
+        _clase_popups_diferidos = PopupsDiferidos
+    return _clase_popups_diferidos(datos, estilo)
+
+
+class RenderizadorMapa:
+    def __init__(self, lugares_info, max_entradas=CACHE_MAPAS_MAX, modo="diferido", imagenes=None):
+        if modo not in MODOS_MAPA:
+            raise ValueError(f"Modo de mapa desconocido: '{modo}'. Opciones: {', '.join(MODOS_MAPA)}")
+        self.lugares_info = lugares_info
+        self.modo = modo
+        generar = datos_popup if modo == "diferido" else popup_html_responsive
+        self.popups = {
+            clave: generar(lugar, imagenes)
+            for clave, lugar in lugares_info.items()
+            if lugar.get("lat") is not None and lugar.get("lon") is not None
+        }
+        self.cache = CacheLRU(max_entradas=max_entradas)
+
+    def _popup(self, clave):
+        import folium
+
+        if self.modo == "diferido":
+            contenido = f'<div class="pop-diferido" data-clave="{html.escape(clave)}"></div>'
+        else:
+            contenido = self.popups[clave]
+        return folium.Popup(folium.Html(contenido, script=True), max_width=POPUP_MAX_W, keep_in_view=True)
+
+    def _construir(self, claves, alternativas):
+        import folium
+        from folium.plugins import MarkerCluster
+
+        m = folium.Map(location=CENTRO_MAPA, zoom_start=12, tiles="OpenStreetMap")
+        cluster = MarkerCluster().add_to(m)
+        for clave in claves + alternativas:
+            lugar = self.lugares_info[clave]
+            alternativa = clave in alternativas
+            folium.Marker(
+                location=[lugar["lat"], lugar["lon"]],
+                popup=self._popup(clave),
+                tooltip=("Alternativa a cubierto: " if alternativa else "") + lugar.get("nombre", ""),
+                icon=folium.Icon(color="blue" if alternativa else "green", icon="info-sign")
+            ).add_to(cluster)
+        if self.modo == "diferido":
+            m.add_child(popups_diferidos({clave: self.popups[clave] for clave in claves + alternativas}))
+        return m.get_root().render()
+
+    def _ordenar(self, lugares, excluir=()):
+        pedidos = set(lugares) - set(excluir)
+        return tuple(c for c in self.lugares_info if c in pedidos and c in self.popups)
+
+    def html(self, lugares, alternativas=()):
+        # Los marcadores se añaden en el orden de lugares_info para que el
+        # mismo conjunto produzca siempre el mismo HTML. Las `alternativas`
+        # (lugares propuestos en lugar de los descartados por el tiempo) van
+        # en otro color.
+        claves = self._ordenar(lugares)
+        alternativas = self._ordenar(alternativas, excluir=claves)
+        return self.cache.obtener((claves, alternativas), lambda: self._construir(claves, alternativas))
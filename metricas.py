@@ -0,0 +1,223 @@
+import bisect
+import contextlib
+import contextvars
+import functools
+import math
+import threading
+import time
+
+# Métricas del proceso: cuánto tarda cada etapa de una recomendación
+# (clima de AEMET y OpenUV, carga del modelo, predicción, puntuación
+# difusa, mapa, log_event...) en histogramas acumulados en memoria, y los
+# contadores de las cachés registradas. texto_prometheus() lo devuelve en
+# el formato de texto de Prometheus; api.py lo sirve en /metricas y la
+# aplicación de Streamlit, con METRICAS_PUERTO, en un servidor local.
+#
+#   with medir("prediccion"):
+#       ...
+#   @cronometrado("log_event")
+#   def log_event(...): ...
+#
+# Dentro de `with peticion():` además se acumulan los milisegundos de cada
+# etapa de esa petición, que tiempos_peticion() devuelve (log_event los
+# añade como "timings" con LOG_TIMINGS=1).
+
+PREFIJO = "recomendador"
+# Límites superiores de los buckets, en segundos.
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Campos de estadisticas() de las cachés que no son contadores.
+CAMPOS_CACHE_GAUGE = ("entradas", "max_entradas", "tasa_aciertos")
+
+
+class Histograma:
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = tuple(buckets)
+        self._cuentas = [0] * (len(self.buckets) + 1)
+        self._suma = 0.0
+        self._lock = threading.Lock()
+
+    def observar(self, segundos):
+        i = bisect.bisect_left(self.buckets, segundos)
+        with self._lock:
+            self._cuentas[i] += 1
+            self._suma += segundos
+
+    def instantanea(self):
+        # (cuentas acumuladas por bucket incluido +Inf, total, suma).
+        with self._lock:
+            cuentas, suma = list(self._cuentas), self._suma
+        acumuladas, total = [], 0
+        for c in cuentas:
+            total += c
+            acumuladas.append(total)
+        return acumuladas, total, suma
+
+
+class Metricas:
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self._histogramas = {}
+        self._errores = {}
+        self._caches = {}
+        self._lock = threading.Lock()
+
+    def _histograma(self, etapa):
+        histograma = self._histogramas.get(etapa)
+        if histograma is None:
+            with self._lock:
+                histograma = self._histogramas.setdefault(etapa, Histograma(self.buckets))
+        return histograma
+
+    def observar(self, etapa, segundos, error=False):
+        self._histograma(etapa).observar(segundos)
+        if error:
+            with self._lock:
+                self._errores[etapa] = self._errores.get(etapa, 0) + 1
+        tiempos = _tiempos.get()
+        if tiempos is not None:
+            tiempos[etapa] = tiempos.get(etapa, 0.0) + segundos * 1000
+
+    def registrar_cache(self, nombre, cache):
+        # Cualquier objeto con estadisticas() -> dict (CacheLRU, CacheSWR).
+        with self._lock:
+            self._caches[nombre] = cache
+
+    def resumen(self):
+        # Para /salud: número de observaciones y media por etapa en ms.
+        resultado = {}
+        for etapa, histograma in sorted(self._histogramas.items()):
+            _, total, suma = histograma.instantanea()
+            resultado[etapa] = {
+                "n": total,
+                "media_ms": round(suma / total * 1000, 3) if total else None,
+                "errores": self._errores.get(etapa, 0),
+            }
+        return resultado
+
+    def texto_prometheus(self):
+        lineas = [
+            f"# HELP {PREFIJO}_etapa_segundos Duración de cada etapa de la recomendación.",
+            f"# TYPE {PREFIJO}_etapa_segundos histogram",
+        ]
+        for etapa, histograma in sorted(self._histogramas.items()):
+            acumuladas, total, suma = histograma.instantanea()
+            for limite, cuenta in zip(self.buckets + (math.inf,), acumuladas):
+                le = "+Inf" if limite == math.inf else repr(limite)
+                lineas.append(f'{PREFIJO}_etapa_segundos_bucket{{etapa="{etapa}",le="{le}"}} {cuenta}')
+            lineas.append(f'{PREFIJO}_etapa_segundos_sum{{etapa="{etapa}"}} {suma:.6f}')
+            lineas.append(f'{PREFIJO}_etapa_segundos_count{{etapa="{etapa}"}} {total}')
+        lineas += [
+            f"# HELP {PREFIJO}_etapa_errores_total Etapas que terminaron con una excepción.",
+            f"# TYPE {PREFIJO}_etapa_errores_total counter",
+        ]
+        with self._lock:
+            errores = dict(self._errores)
+            caches = dict(self._caches)
+        for etapa, n in sorted(errores.items()):
+            lineas.append(f'{PREFIJO}_etapa_errores_total{{etapa="{etapa}"}} {n}')
+
+        series = {}
+        for nombre, cache in sorted(caches.items()):
+            try:
+                estadisticas = cache.estadisticas()
+            except Exception:
+                continue
+            for campo, valor in estadisticas.items():
+                if isinstance(valor, bool) or not isinstance(valor, (int, float)):
+                    continue
+                series.setdefault(campo, []).append((nombre, valor))
+        for campo, valores in sorted(series.items()):
+            if campo in CAMPOS_CACHE_GAUGE:
+                metrica, tipo = f"{PREFIJO}_cache_{campo}", "gauge"
+            else:
+                metrica, tipo = f"{PREFIJO}_cache_{campo}_total", "counter"
+            lineas.append(f"# TYPE {metrica} {tipo}")
+            lineas += [f'{metrica}{{cache="{nombre}"}} {valor}' for nombre, valor in valores]
+        return "\n".join(lineas) + "\n"
+
+
+METRICAS = Metricas()
+_tiempos = contextvars.ContextVar("tiempos_peticion", default=None)
+
+
+@contextlib.contextmanager
+def medir(etapa, metricas=None):
+    inicio = time.perf_counter()
+    error = False
+    try:
+        yield
+    except BaseException:
+        error = True
+        raise
+    finally:
+        (metricas or METRICAS).observar(etapa, time.perf_counter() - inicio, error)
+
+
+def cronometrado(etapa):
+    def decorador(funcion):
+        @functools.wraps(funcion)
+        def envoltorio(*args, **kwargs):
+            with medir(etapa):
+                return funcion(*args, **kwargs)
+        return envoltorio
+    return decorador
+
+
+@contextlib.contextmanager
+def peticion():
+    # Los hilos que la petición lanza con contextvars.copy_context()
+    # comparten el mismo diccionario.
+    token = _tiempos.set({})
+    try:
+        yield
+    finally:
+        _tiempos.reset(token)
+
+
+def tiempos_peticion():
+    tiempos = _tiempos.get()
+    if tiempos is None:
+        return None
+    return {etapa: round(ms, 3) for etapa, ms in tiempos.items()}
+
+
+def registrar_cache(nombre, cache):
+    METRICAS.registrar_cache(nombre, cache)
+
+
+def texto_prometheus():
+    return METRICAS.texto_prometheus()
+
+
+TIPO_PROMETHEUS = "text/plain; version=0.0.4; charset=utf-8"
+_servidor = None
+_servidor_lock = threading.Lock()
+
+
+def arrancar_servidor(puerto, host="127.0.0.1"):
+    # Servidor HTTP mínimo en un hilo para los procesos que no tienen uno
+    # propio (Streamlit). Solo se arranca una vez por proceso.
+    global _servidor
+    with _servidor_lock:
+        if _servidor is not None:
+            return _servidor
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        class Manejador(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] not in ("/metricas", "/metrics"):
+                    self.send_error(404)
+                    return
+                cuerpo = texto_prometheus().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", TIPO_PROMETHEUS)
+                self.send_header("Content-Length", str(len(cuerpo)))
+                self.end_headers()
+                self.wfile.write(cuerpo)
+
+            def log_message(self, *args):
+                pass
+
+        _servidor = ThreadingHTTPServer((host, int(puerto)), Manejador)
+        threading.Thread(target=_servidor.serve_forever, name="metricas", daemon=True).start()
+        return _servidor
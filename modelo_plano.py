@@ -0,0 +1,228 @@
+import json
+import os
+import sys
+import uuid
+
+import numpy as np
+
+# Formato plano del modelo multi-salida (MultiOutputClassifier de
+# RandomForestClassifier): todos los nodos de todos los árboles de todas las
+# salidas en arrays de NumPy contiguos dentro de un único fichero, que se
+# abre con np.memmap. Cargarlo no deserializa objetos de Python y los
+# workers de una máquina comparten las mismas páginas a través de la caché
+# del sistema operativo.
+#
+#   python modelo_plano.py exportar modelo_turismo.pkl modelo_turismo.arboles
+#   python modelo_plano.py paridad modelo_turismo.pkl modelo_turismo.arboles
+#
+# Fichero: MAGIA, longitud de la cabecera (uint32 little-endian), cabecera
+# JSON y los arrays, cada uno alineado a ALINEACION bytes. Las hojas
+# apuntan a sí mismas y tienen umbral +inf, así que el recorrido avanza
+# profundidad_max pasos sin comprobar si ha llegado a una hoja.
+
+MAGIA = b"ARBOLES1"
+FORMATO = 1
+ALINEACION = 64
+EXTENSION_MODELO_PLANO = ".arboles"
+# Elementos (filas x árboles) que se recorren a la vez en cada bloque.
+ELEMENTOS_POR_BLOQUE = 1 << 20
+
+
+def _bosques(modelo):
+    salidas = getattr(modelo, "estimators_", None)
+    if not isinstance(salidas, list) or not salidas:
+        raise ValueError("Solo se exportan modelos MultiOutputClassifier de bosques.")
+    for bosque in salidas:
+        arboles = getattr(bosque, "estimators_", None)
+        if (not hasattr(bosque, "classes_") or not isinstance(arboles, list)
+                or not all(hasattr(a, "tree_") and a.tree_.n_outputs == 1 for a in arboles)):
+            raise ValueError("Cada salida debe ser un RandomForestClassifier de una sola salida.")
+    return salidas
+
+
+def convertir(modelo):
+    # Arrays del formato plano. `valor` guarda para cada nodo las
+    # probabilidades por clase tal como las calcula predict_proba del árbol.
+    bosques = _bosques(modelo)
+    n_clases = max(len(b.classes_) for b in bosques)
+    feature, umbral, izquierdo, derecho, valor, raices = [], [], [], [], [], []
+    inicio_salidas, clases = [0], []
+    base = 0
+    profundidad = 0
+    for bosque in bosques:
+        for arbol in bosque.estimators_:
+            t = arbol.tree_
+            hoja = t.children_left == -1
+            indices = np.arange(t.node_count, dtype=np.int64) + base
+            feature.append(np.where(hoja, 0, t.feature).astype(np.int32))
+            umbral.append(np.where(hoja, np.inf, t.threshold).astype(np.float64))
+            izquierdo.append(np.where(hoja, indices, t.children_left + base).astype(np.int32))
+            derecho.append(np.where(hoja, indices, t.children_right + base).astype(np.int32))
+            proba = t.value[:, 0, :len(bosque.classes_)].astype(np.float64)
+            normalizador = proba.sum(axis=1)[:, None]
+            normalizador[normalizador == 0.0] = 1.0
+            proba = proba / normalizador
+            valor.append(np.pad(proba, ((0, 0), (0, n_clases - proba.shape[1]))))
+            raices.append(base)
+            base += t.node_count
+            profundidad = max(profundidad, t.max_depth)
+        inicio_salidas.append(len(raices))
+        clases.append(np.pad(np.asarray(bosque.classes_, dtype=np.int64), (0, n_clases - len(bosque.classes_))))
+    if base >= np.iinfo(np.int32).max:
+        raise ValueError("Demasiados nodos para índices int32.")
+    arrays = {
+        "feature": np.concatenate(feature),
+        "umbral": np.concatenate(umbral),
+        "izquierdo": np.concatenate(izquierdo),
+        "derecho": np.concatenate(derecho),
+        "valor": np.concatenate(valor),
+        "raices": np.array(raices, dtype=np.int32),
+        "inicio_salidas": np.array(inicio_salidas, dtype=np.int32),
+        "clases": np.stack(clases),
+    }
+    meta = {
+        "formato": FORMATO,
+        "n_salidas": len(bosques),
+        "n_columnas": int(getattr(bosques[0], "n_features_in_", 0)),
+        "profundidad_max": int(profundidad),
+        "columnas": [str(c) for c in getattr(modelo, "feature_names_in_", [])],
+    }
+    return arrays, meta
+
+
+def exportar(modelo, ruta, origen=None):
+    arrays, meta = convertir(modelo)
+    if origen is not None:
+        meta["origen"] = origen
+    descriptores = {}
+    posicion = 0
+    for nombre, array in arrays.items():
+        posicion = -(-posicion // ALINEACION) * ALINEACION
+        descriptores[nombre] = {"dtype": array.dtype.str, "forma": list(array.shape), "offset": posicion}
+        posicion += array.nbytes
+    cabecera = json.dumps({"meta": meta, "arrays": descriptores}).encode("utf-8")
+    inicio_datos = -(-(len(MAGIA) + 4 + len(cabecera)) // ALINEACION) * ALINEACION
+    tmp = f"{ruta}.{uuid.uuid4().hex[:8]}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(MAGIA)
+        f.write(np.uint32(len(cabecera)).tobytes())
+        f.write(cabecera)
+        for nombre, array in arrays.items():
+            f.seek(inicio_datos + descriptores[nombre]["offset"])
+            f.write(np.ascontiguousarray(array).tobytes())
+    os.replace(tmp, ruta)
+    return meta
+
+
+class ModeloPlano:
+    # Predictor sobre los arrays del fichero. predict() acepta lo mismo
+    # que el modelo original (DataFrame o matriz) y predecir_matriz() la
+    # matriz float32 de recomendador.codificar_matriz.
+    def __init__(self, arrays, meta):
+        self.meta = meta
+        self.feature = arrays["feature"]
+        self.umbral = arrays["umbral"]
+        self.izquierdo = arrays["izquierdo"]
+        self.derecho = arrays["derecho"]
+        self.valor = arrays["valor"]
+        self.raices = arrays["raices"]
+        self.inicio_salidas = arrays["inicio_salidas"]
+        self.clases = arrays["clases"]
+        self.n_outputs_ = int(meta["n_salidas"])
+        self.n_features_in_ = int(meta["n_columnas"])
+        self.profundidad_max = int(meta["profundidad_max"])
+        self.columnas = meta.get("columnas") or None
+        self._filas_por_bloque = max(1, ELEMENTOS_POR_BLOQUE // max(1, len(self.raices)))
+
+    def _recorrer(self, matriz):
+        # Nodo actual de cada (árbol, fila). Se recorre por árboles para que
+        # cada bloque de accesos caiga en los nodos contiguos de un mismo
+        # árbol; la matriz se traspone por el mismo motivo.
+        n = len(matriz)
+        columnas = np.ascontiguousarray(matriz.T).ravel()
+        filas = np.arange(n, dtype=np.int64)[None, :]
+        nodos = np.repeat(self.raices.astype(np.int64)[:, None], n, axis=1)
+        for _ in range(self.profundidad_max):
+            x = columnas[self.feature[nodos] * n + filas]
+            nodos = np.where(x <= self.umbral[nodos], self.izquierdo[nodos], self.derecho[nodos])
+        return nodos
+
+    def _predecir_bloque(self, matriz):
+        hojas = self._recorrer(matriz)
+        resultado = np.empty((len(matriz), self.n_outputs_), dtype=np.int64)
+        for j in range(self.n_outputs_):
+            inicio, fin = self.inicio_salidas[j], self.inicio_salidas[j + 1]
+            # cumsum suma árbol a árbol en el mismo orden que
+            # RandomForestClassifier.predict_proba, así que los empates se
+            # resuelven igual.
+            proba = np.cumsum(self.valor[hojas[inicio:fin]], axis=0)[-1] / (fin - inicio)
+            resultado[:, j] = self.clases[j][np.argmax(proba, axis=1)]
+        return resultado
+
+    def predecir_matriz(self, matriz):
+        matriz = np.asarray(matriz, dtype=np.float32)
+        if len(matriz) <= self._filas_por_bloque:
+            return self._predecir_bloque(matriz)
+        return np.concatenate([
+            self._predecir_bloque(matriz[i:i + self._filas_por_bloque])
+            for i in range(0, len(matriz), self._filas_por_bloque)
+        ])
+
+    def predict(self, X):
+        if hasattr(X, "columns") and self.columnas:
+            X = X.reindex(columns=self.columnas, fill_value=0)
+        return self.predecir_matriz(np.asarray(X, dtype=np.float32))
+
+
+def cargar(ruta):
+    with open(ruta, "rb") as f:
+        if f.read(len(MAGIA)) != MAGIA:
+            raise ValueError(f"'{ruta}' no es un modelo en formato plano.")
+        longitud = int(np.frombuffer(f.read(4), dtype="<u4")[0])
+        cabecera = json.loads(f.read(longitud).decode("utf-8"))
+    if cabecera["meta"].get("formato") != FORMATO:
+        raise ValueError(f"Formato de modelo plano no soportado en '{ruta}'.")
+    inicio_datos = -(-(len(MAGIA) + 4 + longitud) // ALINEACION) * ALINEACION
+    mapa = np.memmap(ruta, mode="r", dtype=np.uint8)
+    arrays = {}
+    for nombre, d in cabecera["arrays"].items():
+        dtype = np.dtype(d["dtype"])
+        cuenta = int(np.prod(d["forma"], dtype=np.int64))
+        arrays[nombre] = np.frombuffer(
+            mapa, dtype=dtype, count=cuenta, offset=inicio_datos + d["offset"]
+        ).reshape(d["forma"])
+    return ModeloPlano(arrays, cabecera["meta"])
+
+
+def comprobar_paridad(modelo, plano, n_perfiles=2000, semilla=0):
+    import pandas as pd
+
+    from recomendador import COLUMNAS_ENTRENAMIENTO, perfiles_aleatorios
+
+    df = pd.DataFrame(perfiles_aleatorios(n_perfiles, semilla))[COLUMNAS_ENTRENAMIENTO]
+    esperadas = modelo.predict(df)
+    obtenidas = plano.predict(df)
+    distintos = int((esperadas != obtenidas).any(axis=1).sum())
+    return {"n": n_perfiles, "distintos": distintos, "ok": distintos == 0}
+
+
+if __name__ == "__main__":
+    import joblib
+
+    from recomendador import hash_fichero
+
+    orden = sys.argv[1] if len(sys.argv) > 1 else "exportar"
+    origen = sys.argv[2] if len(sys.argv) > 2 else "modelo_turismo.pkl"
+    destino = sys.argv[3] if len(sys.argv) > 3 else os.path.splitext(origen)[0] + EXTENSION_MODELO_PLANO
+    if orden == "exportar":
+        modelo = joblib.load(origen)
+        meta = exportar(modelo, destino, origen={"fichero": os.path.basename(origen), "sha256": hash_fichero(origen)})
+        resultado = comprobar_paridad(modelo, cargar(destino))
+        resumen = {k: v for k, v in meta.items() if k != "columnas"}
+        print(json.dumps({"destino": destino, "bytes": os.path.getsize(destino), **resumen, "paridad": resultado}, indent=2))
+        sys.exit(0 if resultado["ok"] else 1)
+    if orden == "paridad":
+        resultado = comprobar_paridad(joblib.load(origen), cargar(destino))
+        print(json.dumps(resultado, indent=2))
+        sys.exit(0 if resultado["ok"] else 1)
+    sys.exit(f"Orden desconocida: {orden}. Usa 'exportar' o 'paridad'.")
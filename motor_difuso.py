@@ -0,0 +1,414 @@
+import hashlib
+import json
+import os
+import sys
+
+import numpy as np
+
+# Definición única del sistema difuso de idoneidad para actividades de
+# exterior. A partir de ella se construye el ControlSystem de skfuzzy y la
+# tabla precalculada (LUT) que evita simular el sistema en cada petición.
+
+ANTECEDENTES = {
+    "tmax": ((-5, 45), {
+        "frio": ("trapmf", [-5, -5, 5, 12]),
+        "moderado": ("trimf", [10, 20, 28]),
+        "calido": ("trapmf", [25, 30, 45, 45]),
+    }),
+    "tmin": ((-10, 35), {
+        "muy_frio": ("trapmf", [-10, -10, 0, 5]),
+        "frio": ("trimf", [3, 8, 13]),
+        "suave": ("trapmf", [10, 15, 35, 35]),
+    }),
+    "prob_lluvia": ((0, 100), {
+        "baja": ("trapmf", [0, 0, 20, 30]),
+        "media": ("trimf", [20, 50, 80]),
+        "alta": ("trapmf", [70, 85, 100, 100]),
+    }),
+    "UV": ((0, 12), {
+        "bajo": ("trapmf", [0, 0, 3, 6]),
+        "moderado": ("trimf", [4, 7, 9]),
+        "alto": ("trapmf", [6, 10, 14, 14]),
+    }),
+}
+
+CONSECUENTE = ("recom_exterior", {
+    "no": ("trapmf", [0, 0, 0.2, 0.4]),
+    "posible": ("trimf", [0.3, 0.5, 0.7]),
+    "si": ("trapmf", [0.6, 0.8, 1, 1]),
+})
+
+# Cada regla es (antecedente, término del consecuente). Un antecedente es
+# (variable, término) o ("y" | "o", antecedente, antecedente, ...).
+REGLAS = [
+    (("prob_lluvia", "alta"), "no"),
+    (("y", ("tmax", "frio"), ("tmin", "muy_frio")), "no"),
+    (("y", ("tmax", "calido"), ("UV", "alto")), "no"),
+    (("y", ("prob_lluvia", "media"), ("o", ("tmax", "moderado"), ("tmax", "calido"))), "posible"),
+    (("y", ("prob_lluvia", "baja"), ("tmax", "frio"), ("tmin", "frio")), "posible"),
+    (("y", ("prob_lluvia", "baja"), ("UV", "moderado")), "posible"),
+    (("y", ("prob_lluvia", "baja"), ("tmax", "moderado"), ("tmin", "suave")), "si"),
+    (("y", ("prob_lluvia", "baja"), ("UV", "bajo")), "si"),
+    (("y", ("prob_lluvia", "baja"), ("tmax", "calido"), ("UV", "bajo")), "si"),
+]
+
+RUTA_LUT = "motor_difuso_lut.npz"
+FORMATO_LUT = 1
+TOLERANCIA_VALIDACION = 0.1
+
+
+def universo(nombre):
+    (minimo, maximo), _ = ANTECEDENTES[nombre]
+    return np.arange(minimo, maximo + 1, 1)
+
+
+def universo_consecuente():
+    return np.arange(0, 1.1, 0.1)
+
+
+def huella_definicion():
+    definicion = {
+        "formato": FORMATO_LUT,
+        "antecedentes": ANTECEDENTES,
+        "consecuente": CONSECUENTE,
+        "reglas": REGLAS,
+    }
+    return hashlib.sha256(json.dumps(definicion, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def construir_sistema_difuso():
+    import skfuzzy as fuzz
+    from skfuzzy import control as ctrl
+
+    variables = {}
+    for nombre, (_, terminos) in ANTECEDENTES.items():
+        variable = ctrl.Antecedent(universo(nombre), nombre)
+        for termino, (forma, params) in terminos.items():
+            variable[termino] = getattr(fuzz, forma)(variable.universe, params)
+        variables[nombre] = variable
+
+    nombre_cons, terminos_cons = CONSECUENTE
+    consecuente = ctrl.Consequent(universo_consecuente(), nombre_cons)
+    for termino, (forma, params) in terminos_cons.items():
+        consecuente[termino] = getattr(fuzz, forma)(consecuente.universe, params)
+
+    def _expresion(nodo):
+        if nodo[0] in ("y", "o"):
+            partes = [_expresion(hijo) for hijo in nodo[1:]]
+            resultado = partes[0]
+            for parte in partes[1:]:
+                resultado = (resultado & parte) if nodo[0] == "y" else (resultado | parte)
+            return resultado
+        variable, termino = nodo
+        return variables[variable][termino]
+
+    reglas = [ctrl.Rule(_expresion(antecedente), consecuente[termino]) for antecedente, termino in REGLAS]
+    return ctrl.ControlSystem(reglas)
+
+
+def simular(sistema_ctrl, tmax, tmin, lluvia, uv):
+    from skfuzzy import control as ctrl
+
+    sim = ctrl.ControlSystemSimulation(sistema_ctrl)
+    sim.input["tmax"] = tmax
+    sim.input["tmin"] = tmin
+    sim.input["prob_lluvia"] = lluvia
+    sim.input["UV"] = uv
+    sim.compute()
+    return sim.output.get(CONSECUENTE[0])
+
+
+def _trimf(x, abc):
+    # Misma forma que skfuzzy.trimf, muestreada sobre el universo x.
+    a, b, c = abc
+    y = np.zeros(len(x))
+    if a != b:
+        tramo = (a < x) & (x < b)
+        y[tramo] = (x[tramo] - a) / float(b - a)
+    if b != c:
+        tramo = (b < x) & (x < c)
+        y[tramo] = (c - x[tramo]) / float(c - b)
+    y[x == b] = 1
+    return y
+
+
+def _trapmf(x, abcd):
+    a, b, c, d = abcd
+    y = np.ones(len(x))
+    tramo = x <= b
+    y[tramo] = _trimf(x[tramo], (a, b, b))
+    tramo = x >= c
+    y[tramo] = _trimf(x[tramo], (c, c, d))
+    y[(x < a) | (x > d)] = 0
+    return y
+
+
+_FORMAS = {"trimf": _trimf, "trapmf": _trapmf}
+
+
+def _mfs_antecedentes():
+    return {
+        (nombre, termino): (universo(nombre), _FORMAS[forma](universo(nombre), params))
+        for nombre, (_, terminos) in ANTECEDENTES.items()
+        for termino, (forma, params) in terminos.items()
+    }
+
+
+def activaciones_reglas(entradas, mfs=None):
+    # entradas: {variable: array}; los arrays se combinan por broadcasting.
+    # Devuelve el grado de corte de cada término del consecuente (max de
+    # las reglas que lo activan), con min/max como operadores y/o.
+    mfs = mfs if mfs is not None else _mfs_antecedentes()
+
+    def _evaluar(nodo):
+        if nodo[0] in ("y", "o"):
+            operador = np.minimum if nodo[0] == "y" else np.maximum
+            resultado = _evaluar(nodo[1])
+            for hijo in nodo[2:]:
+                resultado = operador(resultado, _evaluar(hijo))
+            return resultado
+        xs, mf = mfs[nodo]
+        return np.interp(entradas[nodo[0]], xs, mf)
+
+    cortes = {termino: None for termino in CONSECUENTE[1]}
+    for antecedente, termino in REGLAS:
+        fuerza = _evaluar(antecedente)
+        cortes[termino] = fuerza if cortes[termino] is None else np.maximum(cortes[termino], fuerza)
+    return cortes
+
+
+class MotorNumPy:
+    # Inferencia Mamdani completa en NumPy sobre lotes de condiciones:
+    # pertenencias, reglas, agregación por máximo y centroide. Reproduce el
+    # cálculo de skfuzzy: el universo del consecuente se completa con los
+    # puntos donde cada término corta su nivel de activación y el área se
+    # integra suponiendo tramos lineales entre puntos consecutivos.
+    TAM_BLOQUE = 65536
+
+    def __init__(self):
+        self.mfs = _mfs_antecedentes()
+        self.universo_salida = universo_consecuente()
+        self.mfs_salida = [
+            _FORMAS[forma](self.universo_salida, params) for forma, params in CONSECUENTE[1].values()
+        ]
+
+    def _cortes_universo(self, xmf, cortes):
+        # Equivalente vectorizado de _interp_universe_fast de skfuzzy: un
+        # candidato por tramo del universo, NaN donde no hay cruce.
+        x = self.universo_salida
+        y = cortes[:, None]
+        por_encima = np.where(y == 0.0, xmf[None, :] > y, xmf[None, :] >= y)
+        cruza = por_encima[:, 1:] != por_encima[:, :-1]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            xx = x[:-1] + (y - xmf[:-1]) * np.diff(x) / np.diff(xmf)
+        return np.where(cruza, xx, np.nan)
+
+    def _defuzzificar(self, cortes):
+        n = cortes.shape[0]
+        puntos = np.concatenate(
+            [np.broadcast_to(self.universo_salida, (n, len(self.universo_salida)))]
+            + [self._cortes_universo(mf, cortes[:, t]) for t, mf in enumerate(self.mfs_salida)],
+            axis=1,
+        )
+        puntos.sort(axis=1)
+        validos = ~np.isnan(puntos)
+        agregada = np.zeros_like(puntos)
+        for t, mf in enumerate(self.mfs_salida):
+            np.maximum(agregada, np.minimum(cortes[:, t:t + 1], np.interp(puntos, self.universo_salida, mf)), out=agregada)
+
+        x1, x2 = puntos[:, :-1], puntos[:, 1:]
+        y1, y2 = agregada[:, :-1], agregada[:, 1:]
+        tramo = validos[:, 1:] & (x2 != x1) & ((y1 != 0.0) | (y2 != 0.0))
+        dx = np.where(tramo, x2 - x1, 0.0)
+        suma_y = np.where(tramo, y1 + y2, 1.0)
+        area = 0.5 * dx * (y1 + y2)
+        momento = (2.0 / 3.0 * dx * (y2 + 0.5 * y1)) / suma_y + x1
+        suma_area = np.where(tramo, area, 0.0).sum(axis=1)
+        suma_momento = np.where(tramo, momento * area, 0.0).sum(axis=1)
+        resultado = suma_momento / np.fmax(suma_area, np.finfo(float).eps)
+        resultado[(cortes == 0.0).all(axis=1)] = np.nan
+        return resultado
+
+    def puntuar_lote(self, tmax, tmin, lluvia, uv):
+        # Devuelve un array de puntuaciones; NaN donde ninguna regla se activa.
+        entradas = [np.asarray(v, dtype=np.float64) for v in (tmax, tmin, lluvia, uv)]
+        forma = np.broadcast_shapes(*(e.shape for e in entradas))
+        planos = [np.broadcast_to(e, forma).ravel() for e in entradas]
+        salida = np.empty(planos[0].size, dtype=np.float64)
+        for inicio in range(0, salida.size, self.TAM_BLOQUE):
+            bloque = slice(inicio, inicio + self.TAM_BLOQUE)
+            cortes = activaciones_reglas(dict(zip(ANTECEDENTES, (p[bloque] for p in planos))), self.mfs)
+            salida[bloque] = self._defuzzificar(np.stack(list(cortes.values()), axis=1))
+        return salida.reshape(forma)
+
+    def puntuar(self, tmax, tmin, lluvia, uv):
+        valor = float(self.puntuar_lote(tmax, tmin, lluvia, uv))
+        return None if np.isnan(valor) else valor
+
+
+def compilar_lut(sistema_ctrl):
+    # La salida del sistema solo depende de los cortes de los términos del
+    # consecuente, así que basta con simular skfuzzy una vez por cada
+    # combinación distinta de cortes presente en la rejilla de enteros.
+    nombres = list(ANTECEDENTES)
+    ejes = [universo(n) for n in nombres]
+    entradas = {
+        n: eje.reshape([-1 if i == k else 1 for i in range(len(ejes))])
+        for k, (n, eje) in enumerate(zip(nombres, ejes))
+    }
+    forma = tuple(len(eje) for eje in ejes)
+    cortes = activaciones_reglas(entradas)
+    # Los cortes están en [0, 1]; cuantizados a 1e-6 caben los tres en
+    # una sola clave int64, mucho más rápida de agrupar que filas 3D.
+    clave = np.zeros(forma, dtype=np.int64)
+    for corte in cortes.values():
+        clave = clave * 1_000_001 + np.rint(np.broadcast_to(corte, forma) * 1_000_000).astype(np.int64)
+    _, representantes, inversa = np.unique(clave.ravel(), return_index=True, return_inverse=True)
+
+    valores = np.empty(len(representantes), dtype=np.float64)
+    for i, plano in enumerate(representantes):
+        coords = np.unravel_index(plano, forma)
+        punto = [float(eje[c]) for eje, c in zip(ejes, coords)]
+        # Sin ninguna regla activa skfuzzy no produce salida; se guarda NaN.
+        salida = simular(sistema_ctrl, *punto)
+        valores[i] = np.nan if salida is None else salida
+    return valores[inversa.ravel()].reshape(forma).astype(np.float32)
+
+
+class MotorLUT:
+    def __init__(self, lut, minimos, respaldo=None):
+        self.lut = lut
+        self.minimos = np.asarray(minimos, dtype=np.float64)
+        self.maximos = self.minimos + np.array(lut.shape) - 1
+        self.respaldo = respaldo
+
+    def puntuar(self, tmax, tmin, lluvia, uv):
+        entrada = (tmax, tmin, lluvia, uv)
+        pos = np.clip(np.array(entrada, dtype=np.float64), self.minimos, self.maximos) - self.minimos
+        base = np.floor(pos).astype(np.intp)
+        frac = pos - base
+        if not frac.any():
+            valor = float(self.lut[tuple(base)])
+        else:
+            # Interpolación multilineal entre los vértices de la celda.
+            valor = 0.0
+            limite = np.array(self.lut.shape) - 1
+            for esquina in range(16):
+                desplazamiento = np.array([(esquina >> k) & 1 for k in range(4)])
+                peso = np.prod(np.where(desplazamiento, frac, 1.0 - frac))
+                if peso == 0.0:
+                    continue
+                idx = np.minimum(base + desplazamiento, limite)
+                valor += peso * float(self.lut[tuple(idx)])
+        if np.isnan(valor):
+            # Ninguna regla se activa en algún vértice de la celda: en los
+            # puntos de la rejilla skfuzzy tampoco da salida; entre ellos se
+            # calcula el valor exacto para no interpolar con huecos.
+            if self.respaldo is None or not frac.any():
+                return None
+            return self.respaldo.puntuar(*entrada)
+        return valor
+
+    def puntuar_lote(self, tmax, tmin, lluvia, uv):
+        # Versión vectorizada de puntuar; NaN donde ninguna regla se activa.
+        entradas = [np.asarray(v, dtype=np.float64) for v in (tmax, tmin, lluvia, uv)]
+        forma = np.broadcast_shapes(*(e.shape for e in entradas))
+        pos = np.stack([np.broadcast_to(e, forma).ravel() for e in entradas], axis=1)
+        pos = np.clip(pos, self.minimos, self.maximos) - self.minimos
+        base = np.floor(pos).astype(np.intp)
+        frac = pos - base
+        limite = np.array(self.lut.shape) - 1
+        salida = np.zeros(len(pos), dtype=np.float64)
+        for esquina in range(16):
+            desplazamiento = np.array([(esquina >> k) & 1 for k in range(4)])
+            peso = np.prod(np.where(desplazamiento, frac, 1.0 - frac), axis=1)
+            idx = np.minimum(base + desplazamiento, limite)
+            valores = self.lut[tuple(idx.T)].astype(np.float64)
+            # Los vértices con peso 0 no cuentan aunque sean NaN.
+            salida += np.where(peso > 0.0, peso * valores, 0.0)
+        huecos = np.isnan(salida) & frac.any(axis=1)
+        if huecos.any() and self.respaldo is not None:
+            salida[huecos] = self.respaldo.puntuar_lote(*(np.broadcast_to(e, forma).ravel()[huecos] for e in entradas))
+        return salida.reshape(forma)
+
+
+def guardar_lut(lut, ruta=RUTA_LUT):
+    minimos = np.array([ANTECEDENTES[n][0][0] for n in ANTECEDENTES], dtype=np.float64)
+    tmp = ruta + ".tmp.npz"
+    np.savez_compressed(tmp, lut=lut, minimos=minimos, huella=np.array(huella_definicion()))
+    os.replace(tmp, ruta)
+
+
+def cargar_lut(ruta=RUTA_LUT, respaldo=None):
+    with np.load(ruta) as datos:
+        if str(datos["huella"]) != huella_definicion():
+            raise ValueError(f"La LUT de '{ruta}' no corresponde a la definición actual del sistema difuso.")
+        return MotorLUT(datos["lut"], datos["minimos"], respaldo=respaldo)
+
+
+def cargar_o_compilar_lut(sistema_ctrl=None, ruta=RUTA_LUT):
+    # El ControlSystem (y skfuzzy) solo hace falta si hay que compilar.
+    respaldo = MotorNumPy()
+    try:
+        return cargar_lut(ruta, respaldo=respaldo)
+    except (FileNotFoundError, ValueError, KeyError):
+        pass
+    lut = compilar_lut(sistema_ctrl if sistema_ctrl is not None else construir_sistema_difuso())
+    try:
+        guardar_lut(lut, ruta)
+    except OSError:
+        pass
+    minimos = [ANTECEDENTES[n][0][0] for n in ANTECEDENTES]
+    return MotorLUT(lut, minimos, respaldo=respaldo)
+
+
+def validar_motor(motor, sistema_ctrl, n_muestras=2000, tolerancia=TOLERANCIA_VALIDACION, semilla=0):
+    # Compara un motor (LUT o NumPy) con skfuzzy en puntos de la rejilla,
+    # donde debe coincidir exactamente, y en puntos con el UV en decimales,
+    # como llega de OpenUV (AEMET da enteros para temperaturas y lluvia);
+    # ahí la LUT interpola y se admite la tolerancia indicada.
+    rng = np.random.default_rng(semilla)
+    rangos = [ANTECEDENTES[n][0] for n in ANTECEDENTES]
+    enteros = [[int(rng.integers(lo, hi + 1)) for lo, hi in rangos] for _ in range(n_muestras // 2)]
+    decimales = [
+        [int(rng.integers(lo, hi + 1)) for lo, hi in rangos[:-1]] + [round(float(rng.uniform(*rangos[-1])), 2)]
+        for _ in range(n_muestras - n_muestras // 2)
+    ]
+
+    def _errores(puntos):
+        errores = []
+        for punto in puntos:
+            esperado = simular(sistema_ctrl, *punto)
+            obtenido = motor.puntuar(*punto)
+            if esperado is None or obtenido is None:
+                errores.append(0.0 if esperado is None and obtenido is None else float("inf"))
+            else:
+                errores.append(abs(obtenido - esperado))
+        return np.array(errores)
+
+    err_rejilla = _errores(enteros)
+    err_interp = _errores(decimales)
+    return {
+        "n": int(err_rejilla.size + err_interp.size),
+        "error_max_rejilla": float(err_rejilla.max(initial=0.0)),
+        "error_max_interpolado": float(err_interp.max(initial=0.0)),
+        "error_medio_interpolado": float(err_interp.mean()) if err_interp.size else 0.0,
+        "tolerancia": tolerancia,
+        "ok": bool(err_rejilla.max(initial=0.0) <= 1e-6 and err_interp.max(initial=0.0) <= tolerancia),
+    }
+
+
+if __name__ == "__main__":
+    orden = sys.argv[1] if len(sys.argv) > 1 else "compilar"
+    ruta = sys.argv[2] if len(sys.argv) > 2 else RUTA_LUT
+    sistema = construir_sistema_difuso()
+    if orden == "compilar":
+        guardar_lut(compilar_lut(sistema), ruta)
+        print(f"LUT guardada en {ruta}")
+    elif orden in ("validar", "validar-numpy"):
+        motor = cargar_lut(ruta, respaldo=MotorNumPy()) if orden == "validar" else MotorNumPy()
+        resultado = validar_motor(motor, sistema, tolerancia=TOLERANCIA_VALIDACION if orden == "validar" else 1e-6)
+        print(json.dumps(resultado, indent=2))
+        sys.exit(0 if resultado["ok"] else 1)
+    else:
+        sys.exit(f"Orden desconocida: {orden}. Usa 'compilar', 'validar' o 'validar-numpy'.")
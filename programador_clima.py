@@ -0,0 +1,114 @@
+import random
+import threading
+import time
+from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo
+
+# Hilo que mantiene caliente la caché del clima para que las peticiones no
+# esperen a AEMET ni a OpenUV: la previsión se descarga al arrancar y poco
+# después de cada medianoche de Madrid (el cambio de day_bucket_madrid) y el
+# UV un poco antes de que caduque su TTL. Los fallos se reintentan con
+# espera exponencial y jitter para que las réplicas no golpeen la API a la
+# vez.
+
+DESFASE_MEDIANOCHE = 60.0
+JITTER_MEDIANOCHE = 120.0
+ESPERA_REINTENTO_BASE = 5.0
+ESPERA_REINTENTO_MAX = 600.0
+ESPERA_MAX_BUCLE = 60.0
+
+
+def segundos_hasta_medianoche_madrid():
+    ahora = datetime.now(ZoneInfo("Europe/Madrid"))
+    manana = (ahora + timedelta(days=1)).replace(hour=0, minute=0, second=0, microsecond=0)
+    return (manana - ahora).total_seconds()
+
+
+class TareaPrefetch:
+    def __init__(self, nombre, refrescar, espera_tras_exito):
+        self.nombre = nombre
+        self._refrescar = refrescar
+        self._espera_tras_exito = espera_tras_exito
+        self.proxima = time.monotonic()
+        self.ejecuciones = 0
+        self.fallos_seguidos = 0
+        self.ultimo_exito = None
+        self.ultimo_error = None
+
+    def ejecutar(self, espera_base=ESPERA_REINTENTO_BASE, espera_max=ESPERA_REINTENTO_MAX):
+        self.ejecuciones += 1
+        try:
+            self._refrescar()
+        except Exception as e:
+            self.fallos_seguidos += 1
+            self.ultimo_error = str(e)
+            espera = min(espera_max, espera_base * 2 ** (self.fallos_seguidos - 1))
+            espera = random.uniform(espera / 2, espera)
+        else:
+            self.fallos_seguidos = 0
+            self.ultimo_error = None
+            self.ultimo_exito = time.time()
+            espera = self._espera_tras_exito()
+        self.proxima = time.monotonic() + espera
+
+    def estado(self):
+        return {
+            "ultimo_exito": (
+                datetime.fromtimestamp(self.ultimo_exito, ZoneInfo("Europe/Madrid")).isoformat(timespec="seconds")
+                if self.ultimo_exito is not None else None
+            ),
+            "fallos_seguidos": self.fallos_seguidos,
+            "ultimo_error": self.ultimo_error,
+            "proximo_en": round(max(0.0, self.proxima - time.monotonic()), 1),
+        }
+
+
+class ProgramadorClima:
+    def __init__(self, proveedor, espera_base=ESPERA_REINTENTO_BASE, espera_max=ESPERA_REINTENTO_MAX):
+        self.proveedor = proveedor
+        self._espera_base = espera_base
+        self._espera_max = espera_max
+        self.tareas = [
+            TareaPrefetch(
+                "aemet", proveedor.refrescar_aemet,
+                lambda: segundos_hasta_medianoche_madrid() + DESFASE_MEDIANOCHE + random.uniform(0, JITTER_MEDIANOCHE),
+            ),
+            TareaPrefetch(
+                "openuv", proveedor.refrescar_uv,
+                lambda: proveedor.ttl_openuv * random.uniform(0.85, 0.95),
+            ),
+        ]
+        self._lock = threading.Lock()
+        self._parar = threading.Event()
+        self._hilo = None
+
+    def arrancar(self):
+        with self._lock:
+            if self._hilo is not None and self._hilo.is_alive():
+                return
+            self._parar.clear()
+            self._hilo = threading.Thread(target=self._bucle, name="prefetch-clima", daemon=True)
+            self._hilo.start()
+
+    def parar(self, timeout=5.0):
+        self._parar.set()
+        hilo = self._hilo
+        if hilo is not None and hilo.is_alive():
+            hilo.join(timeout)
+
+    def _bucle(self):
+        while not self._parar.is_set():
+            for tarea in self.tareas:
+                if tarea.proxima <= time.monotonic() and not self._parar.is_set():
+                    tarea.ejecutar(self._espera_base, self._espera_max)
+            espera = min(t.proxima for t in self.tareas) - time.monotonic()
+            # Se despierta al menos cada minuto por si el reloj ha saltado.
+            self._parar.wait(min(max(espera, 0.0), ESPERA_MAX_BUCLE))
+
+    def estado(self):
+        edades = self.proveedor.edad_datos()
+        return {
+            "activo": self._hilo is not None and self._hilo.is_alive(),
+            "edad_datos": {k: (round(v, 1) if v is not None else None) for k, v in edades.items()},
+            "tareas": {t.nombre: t.estado() for t in self.tareas},
+        }
@@ -0,0 +1,185 @@
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from recomendador import (
+    COLUMNAS_ENTRENAMIENTO,
+    LUGARES_MODELO,
+    PredictorCacheado,
+    codificar_matriz,
+    filtrar_lote_por_clima,
+)
+
+# Puntuación offline de ficheros de perfiles codificados (mismo esquema que
+# COLUMNAS_ENTRENAMIENTO) para volver a puntuar el tráfico histórico cuando
+# se publica un modelo nuevo. El fichero se lee y se escribe por bloques, así
+# que la memoria depende de TAM_BLOQUE y no del número de filas.
+#
+#   python puntuar_lote.py perfiles.parquet salida.parquet --clima 24 11 10 4.4
+#
+# El formato se deduce de la extensión: .csv, .parquet o .jsonl/.json.
+
+TAM_BLOQUE = 50_000
+FORMATOS = {".csv": "csv", ".parquet": "parquet", ".jsonl": "jsonl", ".json": "jsonl"}
+
+
+def formato_de(ruta):
+    formato = FORMATOS.get(os.path.splitext(ruta)[1].lower())
+    if formato is None:
+        raise ValueError(f"Formato no soportado: '{ruta}'. Usa {', '.join(sorted(FORMATOS))}.")
+    return formato
+
+
+def leer_bloques(ruta, tam_bloque=TAM_BLOQUE, columnas=None):
+    # En Parquet solo se leen las columnas necesarias; en CSV y JSONL las
+    # sobrantes se descartan al codificar.
+    formato = formato_de(ruta)
+    if formato == "csv":
+        yield from pd.read_csv(ruta, chunksize=tam_bloque)
+    elif formato == "jsonl":
+        yield from pd.read_json(ruta, lines=True, chunksize=tam_bloque, dtype=False)
+    else:
+        import pyarrow.parquet as pq
+
+        fichero = pq.ParquetFile(ruta)
+        if columnas is not None:
+            disponibles = set(fichero.schema_arrow.names)
+            columnas = [c for c in columnas if c in disponibles]
+        for lote in fichero.iter_batches(batch_size=tam_bloque, columns=columnas):
+            yield lote.to_pandas()
+
+
+class EscritorBloques:
+    # Escribe en `ruta.tmp` y renombra al cerrar: un proceso interrumpido
+    # nunca deja una salida a medias con el nombre definitivo.
+    def __init__(self, ruta):
+        self.ruta = ruta
+        self.formato = formato_de(ruta)
+        self._tmp = ruta + ".tmp"
+        directorio = os.path.dirname(ruta)
+        if directorio:
+            os.makedirs(directorio, exist_ok=True)
+        self._fichero = None
+        self._parquet = None
+        self.filas = 0
+
+    def escribir(self, df):
+        if self.formato == "parquet":
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+
+            if self._parquet is None:
+                tabla = pa.Table.from_pandas(df, preserve_index=False)
+                self._parquet = pq.ParquetWriter(self._tmp, tabla.schema)
+            else:
+                tabla = pa.Table.from_pandas(df, schema=self._parquet.schema, preserve_index=False)
+            self._parquet.write_table(tabla)
+        else:
+            cabecera = self._fichero is None
+            if cabecera:
+                self._fichero = open(self._tmp, "w", encoding="utf-8", newline="")
+            if self.formato == "csv":
+                df.to_csv(self._fichero, index=False, header=cabecera)
+            else:
+                df.to_json(self._fichero, orient="records", lines=True, force_ascii=False)
+        self.filas += len(df)
+
+    def cerrar(self):
+        if self._parquet is not None:
+            self._parquet.close()
+        elif self._fichero is not None:
+            self._fichero.close()
+        else:
+            # Entrada vacía: salida vacía con las columnas de lugares.
+            self.escribir(pd.DataFrame({lugar: pd.Series(dtype=np.int8) for lugar in LUGARES_MODELO}))
+            return self.cerrar()
+        os.replace(self._tmp, self.ruta)
+
+    def descartar(self):
+        for f in (self._parquet, self._fichero):
+            if f is not None:
+                f.close()
+        if os.path.exists(self._tmp):
+            os.remove(self._tmp)
+
+
+def score_exterior_para(tmax, tmin, lluvia, uv):
+    # MotorNumPy reproduce la inferencia de skfuzzy sin depender de él.
+    from motor_difuso import MotorNumPy
+    return MotorNumPy().puntuar(tmax, tmin, lluvia, uv)
+
+
+def puntuar_bloques(bloques, predecir_lote, score_exterior=None, conservar=()):
+    # Por cada bloque de perfiles devuelve un DataFrame con las columnas de
+    # `conservar` (p. ej. user_id) y una columna 0/1 por lugar.
+    for df in bloques:
+        predicciones = filtrar_lote_por_clima(predecir_lote(codificar_matriz(df)), score_exterior)
+        salida = pd.DataFrame(predicciones, columns=LUGARES_MODELO, index=df.index)
+        if conservar:
+            salida = pd.concat([df[list(conservar)], salida], axis=1)
+        yield salida.reset_index(drop=True)
+
+
+def puntuar_fichero(entrada, salida, predecir_lote, score_exterior=None,
+                    tam_bloque=TAM_BLOQUE, conservar=()):
+    inicio = time.perf_counter()
+    bloques = leer_bloques(entrada, tam_bloque, columnas=list(conservar) + COLUMNAS_ENTRENAMIENTO)
+    escritor = EscritorBloques(salida)
+    n_bloques = 0
+    try:
+        for df in puntuar_bloques(bloques, predecir_lote, score_exterior, conservar):
+            escritor.escribir(df)
+            n_bloques += 1
+        escritor.cerrar()
+    except BaseException:
+        escritor.descartar()
+        raise
+    segundos = time.perf_counter() - inicio
+    return {
+        "filas": escritor.filas,
+        "bloques": n_bloques,
+        "score_exterior": score_exterior,
+        "segundos": round(segundos, 3),
+        "filas_por_segundo": round(escritor.filas / segundos, 1) if segundos > 0 else None,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Puntúa un fichero de perfiles codificados con el modelo de recomendación.")
+    parser.add_argument("entrada")
+    parser.add_argument("salida")
+    parser.add_argument("--modelo", default="modelo_turismo.pkl")
+    parser.add_argument("--clima", nargs=4, type=float, metavar=("TMAX", "TMIN", "LLUVIA", "UV"),
+                        help="aplica el filtro meteorológico con este tiempo")
+    parser.add_argument("--tam-bloque", type=int, default=TAM_BLOQUE)
+    parser.add_argument("--conservar", default="",
+                        help="columnas de la entrada que se copian a la salida, separadas por comas")
+    parser.add_argument("--dataframe", action="store_true",
+                        help="usa el predict original de scikit-learn en lugar del camino rápido")
+    args = parser.parse_args(argv)
+
+    # Sin comprobaciones periódicas: todo el fichero se puntúa con el modelo
+    # cargado al principio aunque se sustituya durante la ejecución.
+    predictor = PredictorCacheado(args.modelo, rapido=not args.dataframe,
+                                  intervalo_comprobacion=float("inf"))
+    hash_modelo = predictor.hash_modelo
+    version_modelo = predictor.version_modelo
+    score = score_exterior_para(*args.clima) if args.clima else None
+    conservar = tuple(c for c in (c.strip() for c in args.conservar.split(",")) if c)
+    resultado = puntuar_fichero(
+        args.entrada, args.salida, predictor.predecir_lote,
+        score_exterior=score, tam_bloque=args.tam_bloque, conservar=conservar,
+    )
+    resultado["hash_modelo"] = hash_modelo
+    resultado["version_modelo"] = version_modelo
+    print(json.dumps(resultado, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,433 @@
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
+import warnings
+
+import numpy as np
+
+from cache_lru import CacheLRU
+from catalogo import get_catalogo
+from metricas import medir
+
+COLUMNAS_ENTRENAMIENTO = [
+    'edad', 'genero', 'actividad_frecuencia', 'freq_recom',
+    'residencia_No', 'residencia_No, pero soy de aquí',
+    'residencia_Solo en verano o en vacaciones', 'residencia_Sí, todo el año',
+    'recom_familias_Naturaleza y paseos', 'recom_familias_Rutas',
+    'recom_familias_Monumentos o historia', 'recom_familias_Sitios tranquilos para descansar',
+    'recom_familias_Eventos o fiestas', 'recom_familias_Bares y restaurantes',
+    'recom_jovenes_Naturaleza y paseos', 'recom_jovenes_Rutas',
+    'recom_jovenes_Monumentos o historia', 'recom_jovenes_Sitios tranquilos para descansar',
+    'recom_jovenes_Eventos o fiestas', 'recom_jovenes_Bares y restaurantes',
+    'recom_mayores_Naturaleza y paseos', 'recom_mayores_Rutas',
+    'recom_mayores_Monumentos o historia', 'recom_mayores_Sitios tranquilos para descansar',
+    'recom_mayores_Eventos o fiestas', 'recom_mayores_Bares y restaurantes'
+]
+
+# Orden de las salidas del modelo multi-salida y lugares al aire libre (que
+# se descartan cuando el tiempo no acompaña), ambos desde el catálogo.
+CATALOGO = get_catalogo()
+LUGARES_MODELO = list(CATALOGO.claves_modelo)
+LUGARES_EXTERIOR = set(CATALOGO.exteriores)
+UMBRAL_EXTERIOR = 0.40
+
+CACHE_PREDICCIONES_MAX = 4096
+INTERVALO_COMPROBAR_MODELO = 5.0
+
+_INDICE_COLUMNAS = {col: i for i, col in enumerate(COLUMNAS_ENTRENAMIENTO)}
+_MASCARA_EXTERIOR = np.array(CATALOGO.mascara_exterior, dtype=bool)
+_buffers = threading.local()
+
+
+# Opciones del formulario de la aplicación, en el orden en que se codifican.
+GENEROS = {"Hombre": 0, "Mujer": 1, "Otro": 0.5}
+RESIDENCIAS = ["Sí, todo el año", "Solo en verano o en vacaciones", "No, pero soy de aquí", "No"]
+FRECUENCIAS_ACTIVIDAD = ["Solo en fiestas o vacaciones", "De vez en cuando", "Varias veces por semana", "A diario"]
+FRECUENCIAS_RECOMENDACION = ["Nunca", "Pocas veces", "A veces", "A menudo", "Siempre"]
+ACTIVIDADES = [
+    "Naturaleza y paseos", "Rutas", "Monumentos o historia",
+    "Sitios tranquilos para descansar", "Eventos o fiestas",
+    "Bares y restaurantes"
+]
+
+
+def codificar_formulario(edad, genero, residencia, frecuencia_actividad, frecuencia_recomendacion,
+                         familias=(), jovenes=(), mayores=()):
+    # Respuestas del formulario (los textos de las opciones) -> perfil con
+    # las columnas de COLUMNAS_ENTRENAMIENTO: one-hot de la residencia,
+    # frecuencias ordinales y una columna por actividad y grupo.
+    datos_usuario = {
+        "edad": edad,
+        "genero": GENEROS[genero],
+        "actividad_frecuencia": FRECUENCIAS_ACTIVIDAD.index(frecuencia_actividad),
+        "freq_recom": FRECUENCIAS_RECOMENDACION.index(frecuencia_recomendacion) + 1,
+    }
+    datos_usuario.update({f"residencia_{opcion}": int(opcion == residencia) for opcion in RESIDENCIAS})
+    for grupo, seleccionadas in (("familias", familias), ("jovenes", jovenes), ("mayores", mayores)):
+        datos_usuario.update({f"recom_{grupo}_{a}": int(a in seleccionadas) for a in ACTIVIDADES})
+    return datos_usuario
+
+
+def clave_perfil(datos_usuario):
+    # Vector codificado canónico: mismas columnas y orden que el modelo, con
+    # 0 para las que falten (igual que al construir el DataFrame).
+    return tuple(float(datos_usuario.get(col, 0)) for col in COLUMNAS_ENTRENAMIENTO)
+
+
+def entrada_dataframe(datos_usuario):
+    import pandas as pd
+
+    df_usuario = pd.DataFrame([datos_usuario])
+    for col in COLUMNAS_ENTRENAMIENTO:
+        if col not in df_usuario.columns:
+            df_usuario[col] = 0
+    return df_usuario[COLUMNAS_ENTRENAMIENTO]
+
+
+def codificar_fila(datos_usuario, fila=None):
+    # Codifica el perfil directamente en una fila float32 (el tipo con el que
+    # trabajan internamente los árboles de scikit-learn) en el orden de
+    # COLUMNAS_ENTRENAMIENTO; las columnas ausentes quedan a 0.
+    if fila is None:
+        fila = np.zeros((1, len(COLUMNAS_ENTRENAMIENTO)), dtype=np.float32)
+    else:
+        fila.fill(0)
+    for col, valor in datos_usuario.items():
+        i = _INDICE_COLUMNAS.get(col)
+        if i is not None:
+            fila[0, i] = valor
+    return fila
+
+
+def codificar_matriz(df):
+    # Versión por lotes de codificar_fila: columnas ausentes o vacías a 0,
+    # columnas sobrantes ignoradas.
+    return np.ascontiguousarray(
+        df.reindex(columns=COLUMNAS_ENTRENAMIENTO, fill_value=0).fillna(0).to_numpy(dtype=np.float32)
+    )
+
+
+def _fila_del_hilo():
+    fila = getattr(_buffers, "fila", None)
+    if fila is None:
+        fila = _buffers.fila = np.zeros((1, len(COLUMNAS_ENTRENAMIENTO)), dtype=np.float32)
+    return fila
+
+
+def _es_bosque(estimador):
+    arboles = getattr(estimador, "estimators_", None)
+    return (
+        hasattr(estimador, "classes_")
+        and isinstance(arboles, list)
+        and all(hasattr(arbol, "tree_") for arbol in arboles)
+    )
+
+
+def _predecir_bosque(bosque, matriz):
+    # Igual que RandomForestClassifier.predict (argmax de la probabilidad
+    # media de los árboles), pero sin la validación de entrada ni el reparto
+    # en hilos que, para una sola fila, cuestan más que recorrer los árboles.
+    # `matriz` debe ser float32 y contigua.
+    proba = None
+    for arbol in bosque.estimators_:
+        p = arbol.predict_proba(matriz, check_input=False)
+        if proba is None:
+            proba = p
+        else:
+            proba += p
+    return bosque.classes_[np.argmax(proba, axis=1)]
+
+
+def _salidas_bosque(modelo):
+    salidas = getattr(modelo, "estimators_", None)
+    if isinstance(salidas, list) and salidas and all(_es_bosque(e) for e in salidas):
+        return salidas
+    return None
+
+
+def dimension_salida(modelo):
+    # Número de salidas del modelo: n_outputs_ en los estimadores nativos,
+    # un estimador por salida en MultiOutputClassifier y, si no, una
+    # predicción de prueba.
+    n = getattr(modelo, "n_outputs_", None)
+    if n is not None:
+        return int(n)
+    salidas = getattr(modelo, "estimators_", None)
+    if isinstance(salidas, list) and salidas and all(hasattr(e, "classes_") for e in salidas):
+        return len(salidas)
+    prediccion = np.asarray(_predict_sin_aviso(modelo, np.zeros((1, len(COLUMNAS_ENTRENAMIENTO)), dtype=np.float32)))
+    return 1 if prediccion.ndim == 1 else prediccion.shape[1]
+
+
+def _predict_sin_aviso(modelo, matriz):
+    with warnings.catch_warnings():
+        warnings.filterwarnings("ignore", message="X does not have valid feature names")
+        return modelo.predict(matriz.astype(np.float64))
+
+
+def crear_prediccion_rapida(modelo):
+    if hasattr(modelo, "predecir_matriz"):
+        # Modelo en formato plano (modelo_plano.py): ya es vectorizado.
+        def predecir(datos_usuario):
+            fila = codificar_fila(datos_usuario, _fila_del_hilo())
+            return tuple(int(p) for p in modelo.predecir_matriz(fila)[0])
+        return predecir
+    salidas = _salidas_bosque(modelo)
+    if salidas is not None:
+        def predecir(datos_usuario):
+            fila = codificar_fila(datos_usuario, _fila_del_hilo())
+            return tuple(int(_predecir_bosque(bosque, fila)[0]) for bosque in salidas)
+    else:
+        def predecir(datos_usuario):
+            fila = codificar_fila(datos_usuario, _fila_del_hilo())
+            return tuple(int(p) for p in _predict_sin_aviso(modelo, fila)[0])
+    return predecir
+
+
+def crear_prediccion_lote(modelo, rapido=True):
+    # Recibe la matriz (n, 26) de codificar_matriz y devuelve una matriz
+    # int8 (n, 17) con las salidas en el orden de LUGARES_MODELO.
+    if rapido and hasattr(modelo, "predecir_matriz"):
+        def predecir_lote(matriz):
+            return modelo.predecir_matriz(matriz).astype(np.int8)
+        return predecir_lote
+    salidas = _salidas_bosque(modelo) if rapido else None
+    if salidas is not None:
+        def predecir_lote(matriz):
+            resultado = np.empty((len(matriz), len(salidas)), dtype=np.int8)
+            for j, bosque in enumerate(salidas):
+                resultado[:, j] = _predecir_bosque(bosque, matriz)
+            return resultado
+    elif rapido:
+        def predecir_lote(matriz):
+            return _predict_sin_aviso(modelo, matriz).astype(np.int8)
+    else:
+        def predecir_lote(matriz):
+            import pandas as pd
+            return modelo.predict(pd.DataFrame(matriz, columns=COLUMNAS_ENTRENAMIENTO)).astype(np.int8)
+    return predecir_lote
+
+
+def filtrar_por_clima(recomendaciones, clima, score_exterior):
+    filtradas = recomendaciones.copy()
+    if score_exterior < UMBRAL_EXTERIOR:
+        for lugar in LUGARES_EXTERIOR:
+            if lugar in filtradas:
+                filtradas[lugar] = 0
+    return filtradas
+
+
+def filtrar_lote_por_clima(predicciones, score_exterior):
+    # filtrar_por_clima sobre una matriz (n, 17), modificándola en sitio.
+    # Sin puntuación (ninguna regla difusa activa) no se filtra nada, igual
+    # que en la aplicación, donde ese caso cae en el aviso de error de clima.
+    if score_exterior is not None and score_exterior < UMBRAL_EXTERIOR:
+        predicciones[:, _MASCARA_EXTERIOR] = 0
+    return predicciones
+
+
+def predecir_dataframe(modelo, datos_usuario):
+    return tuple(int(p) for p in modelo.predict(entrada_dataframe(datos_usuario))[0])
+
+
+def perfiles_aleatorios(n, semilla=0):
+    # Perfiles del mismo espacio discreto que produce el formulario.
+    rng = np.random.default_rng(semilla)
+    residencias = [c for c in COLUMNAS_ENTRENAMIENTO if c.startswith("residencia_")]
+    actividades = [c for c in COLUMNAS_ENTRENAMIENTO if c.startswith("recom_")]
+    perfiles = []
+    for _ in range(n):
+        perfil = {
+            "edad": int(rng.integers(10, 81)),
+            "genero": float(rng.choice([0, 0.5, 1])),
+            "actividad_frecuencia": int(rng.integers(0, 4)),
+            "freq_recom": int(rng.integers(1, 6)),
+        }
+        perfil.update({c: 0 for c in residencias})
+        perfil[residencias[int(rng.integers(len(residencias)))]] = 1
+        perfil.update({c: int(rng.integers(0, 2)) for c in actividades})
+        perfiles.append(perfil)
+    return perfiles
+
+
+def comprobar_paridad(modelo, n_perfiles=200, semilla=0):
+    # El camino DataFrame se evalúa en un único predict sobre todos los
+    # perfiles; el rápido, perfil a perfil como en la aplicación.
+    import pandas as pd
+
+    perfiles = perfiles_aleatorios(n_perfiles, semilla)
+    rapida = crear_prediccion_rapida(modelo)
+    esperadas = modelo.predict(pd.DataFrame(perfiles)[COLUMNAS_ENTRENAMIENTO])
+    distintos = sum(
+        1 for perfil, esperada in zip(perfiles, esperadas)
+        if rapida(perfil) != tuple(int(p) for p in esperada)
+    )
+    return {"n": n_perfiles, "distintos": distintos, "ok": distintos == 0}
+
+
+def hash_fichero(ruta):
+    h = hashlib.sha256()
+    with open(ruta, "rb") as f:
+        for bloque in iter(lambda: f.read(1 << 20), b""):
+            h.update(bloque)
+    return h.hexdigest()
+
+
+def _cargar_joblib(ruta):
+    import joblib
+    return joblib.load(ruta)
+
+
+def cargar_modelo(ruta):
+    # Los ficheros .arboles (modelo_plano.py) se abren con memmap; el resto
+    # con joblib.
+    from modelo_plano import EXTENSION_MODELO_PLANO, cargar
+
+    if ruta.endswith(EXTENSION_MODELO_PLANO):
+        return cargar(ruta)
+    return _cargar_joblib(ruta)
+
+
+class PredictorCacheado:
+    # Carga el modelo de `ruta` y memoriza sus predicciones por perfil. Cada
+    # pocos segundos comprueba mtime y tamaño del fichero; si cambian y el
+    # hash del contenido también, recarga el modelo y vacía la caché. Si
+    # `ruta` es un directorio, es un registro de modelos (registro_modelos.py)
+    # y se vigila su manifiesto: se carga la versión activa, tras comprobar
+    # su hash y su esquema. Con rapido=False se usa el camino original a
+    # través de un DataFrame. Un modelo que no se puede cargar o cuyas
+    # salidas no coinciden con el catálogo no se acepta: en la primera carga
+    # se lanza el error y en una recarga se sigue con el anterior y el error
+    # queda en `error_recarga`.
+    def __init__(self, ruta, cargar=cargar_modelo, max_entradas=CACHE_PREDICCIONES_MAX,
+                 intervalo_comprobacion=INTERVALO_COMPROBAR_MODELO, rapido=True):
+        self.ruta = ruta
+        self.registro = os.path.isdir(ruta)
+        self._cargar = cargar
+        self.rapido = rapido
+        self._intervalo = intervalo_comprobacion
+        self._lock = threading.Lock()
+        self.cache = CacheLRU(max_entradas=max_entradas)
+        self._estado_actual = None
+        self._firma = None
+        self._ultima_comprobacion = 0.0
+        self.recargas = 0
+        self.error_recarga = None
+
+    def _firma_actual(self):
+        if self.registro:
+            from registro_modelos import ruta_manifiesto
+            st = os.stat(ruta_manifiesto(self.ruta))
+        else:
+            st = os.stat(self.ruta)
+        return (st.st_mtime_ns, st.st_size)
+
+    def _artefacto(self):
+        # (ruta del modelo, hash, versión, entrada del manifiesto o None).
+        if not self.registro:
+            hash_nuevo = hash_fichero(self.ruta)
+            return self.ruta, hash_nuevo, hash_nuevo[:12], None
+        from registro_modelos import resolver
+        return resolver(self.ruta)
+
+    def _preparar(self, ruta, entrada):
+        with medir("carga_modelo"):
+            modelo = self._cargar(ruta)
+        CATALOGO.comprobar_modelo(dimension_salida(modelo))
+        if entrada is not None:
+            from registro_modelos import comprobar_modelo
+            comprobar_modelo(modelo, entrada)
+        if self.rapido:
+            prediccion = crear_prediccion_rapida(modelo)
+        else:
+            prediccion = lambda datos, modelo=modelo: predecir_dataframe(modelo, datos)
+        prediccion_lote = crear_prediccion_lote(modelo, rapido=self.rapido)
+        # Una primera predicción antes de publicarlo, para que la primera
+        # petición con el modelo nuevo no pague el arranque en frío.
+        prediccion({})
+        return modelo, prediccion, prediccion_lote
+
+    def _estado(self):
+        ahora = time.monotonic()
+        estado = self._estado_actual
+        if estado is not None and ahora - self._ultima_comprobacion < self._intervalo:
+            return estado
+        # Mientras un hilo comprueba o carga un modelo nuevo, los demás
+        # siguen sirviendo con el actual en vez de esperarlo.
+        if not self._lock.acquire(blocking=estado is None):
+            return estado
+        try:
+            self._ultima_comprobacion = ahora
+            actual = self._estado_actual
+            firma = None
+            try:
+                firma = self._firma_actual()
+                if actual is not None and firma == self._firma:
+                    return actual
+                ruta, hash_nuevo, version, entrada = self._artefacto()
+                if actual is None or hash_nuevo != actual[1]:
+                    modelo, prediccion, prediccion_lote = self._preparar(ruta, entrada)
+                    self._estado_actual = (modelo, hash_nuevo, prediccion, prediccion_lote, version)
+                    self.cache.invalidar()
+                    self.recargas += 1
+                elif version != actual[4]:
+                    self._estado_actual = actual[:4] + (version,)
+                self.error_recarga = None
+            except Exception as e:
+                if actual is None:
+                    raise
+                self.error_recarga = str(e)
+                # Sin firma (el stat falló, p. ej. mientras se sustituye el
+                # manifiesto) se sigue con el actual y en la siguiente
+                # comprobación se vuelve a resolver el artefacto entero.
+                if firma is None:
+                    self._firma = None
+                    return actual
+            self._firma = firma
+            return self._estado_actual
+        finally:
+            self._lock.release()
+
+    def modelo(self):
+        return self._estado()[0]
+
+    @property
+    def hash_modelo(self):
+        return self._estado()[1]
+
+    @property
+    def version_modelo(self):
+        return self._estado()[4]
+
+    def predecir(self, datos_usuario):
+        return self.predecir_con_version(datos_usuario)[0]
+
+    def predecir_con_version(self, datos_usuario):
+        # Las predicciones y la versión del modelo que las ha hecho, leídas
+        # del mismo estado aunque haya una recarga entre medias. La clave
+        # incluye el hash del modelo: una predicción calculada con el modelo
+        # anterior nunca se sirve tras una recarga.
+        with medir("prediccion"):
+            _, hash_modelo, prediccion, _, version = self._estado()
+            predicciones = self.cache.obtener(
+                (hash_modelo, clave_perfil(datos_usuario)), lambda: prediccion(datos_usuario)
+            )
+        return predicciones, version
+
+    def predecir_lote(self, matriz):
+        # Sin caché: en lotes grandes casi todos los perfiles son distintos.
+        with medir("prediccion_lote"):
+            return self._estado()[3](matriz)
+
+
+if __name__ == "__main__":
+    orden = sys.argv[1] if len(sys.argv) > 1 else "paridad"
+    ruta = sys.argv[2] if len(sys.argv) > 2 else "modelo_turismo.pkl"
+    if orden == "paridad":
+        resultado = comprobar_paridad(cargar_modelo(ruta))
+        print(json.dumps(resultado, indent=2))
+        sys.exit(0 if resultado["ok"] else 1)
+    sys.exit(f"Orden desconocida: {orden}. Usa 'paridad'.")
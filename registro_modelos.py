@@ -0,0 +1,211 @@
+import argparse
+import json
+import os
+import shutil
+import sys
+import uuid
+from datetime import datetime, timezone
+
+from recomendador import (
+    COLUMNAS_ENTRENAMIENTO,
+    LUGARES_MODELO,
+    cargar_modelo,
+    dimension_salida,
+    hash_fichero,
+)
+
+# Registro local de modelos: un directorio con los artefactos publicados
+# (nombre con versión y hash, nunca se sobrescriben) y un manifest.json con
+# la versión, el hash y el esquema de entrada/salida de cada uno y cuál está
+# activo. Con RUTA_MODELO apuntando al directorio, PredictorCacheado vigila
+# el manifiesto y cambia al modelo activo en caliente, sin reiniciar:
+#
+#   python registro_modelos.py publicar modelo_turismo.pkl --version 2026-10-17
+#   python registro_modelos.py activar 2026-09-01      # volver a una anterior
+#   python registro_modelos.py listar
+#   python registro_modelos.py verificar
+#
+# Publicar comprueba que el modelo acepta las 26 columnas de
+# COLUMNAS_ENTRENAMIENTO y devuelve las 17 salidas de LUGARES_MODELO; al
+# cargarlo, el predictor vuelve a comprobar el hash y el esquema.
+
+DIR_MODELOS = "modelos"
+NOMBRE_MANIFIESTO = "manifest.json"
+FORMATO_REGISTRO = 1
+
+
+def ruta_manifiesto(directorio):
+    return os.path.join(directorio, NOMBRE_MANIFIESTO)
+
+
+def esquema_actual():
+    return {"entradas": list(COLUMNAS_ENTRENAMIENTO), "salidas": list(LUGARES_MODELO)}
+
+
+def leer_manifiesto(directorio):
+    with open(ruta_manifiesto(directorio), "r", encoding="utf-8") as f:
+        manifiesto = json.load(f)
+    if manifiesto.get("formato") != FORMATO_REGISTRO:
+        raise ValueError(f"Formato de registro no soportado en '{directorio}': {manifiesto.get('formato')}.")
+    return manifiesto
+
+
+def _escribir_manifiesto(directorio, manifiesto):
+    # Se sustituye de una vez: los procesos que lo leen ven el anterior o el
+    # nuevo, nunca uno a medio escribir.
+    ruta = ruta_manifiesto(directorio)
+    tmp = f"{ruta}.{uuid.uuid4().hex[:8]}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(manifiesto, f, ensure_ascii=False, indent=2)
+    os.replace(tmp, ruta)
+
+
+def comprobar_esquema(entrada):
+    esperado = esquema_actual()
+    for campo in ("entradas", "salidas"):
+        if entrada.get(campo) != esperado[campo]:
+            raise ValueError(
+                f"El esquema de {campo} del modelo {entrada.get('version')} no coincide con el de la "
+                f"aplicación ({len(entrada.get(campo) or [])} frente a {len(esperado[campo])})."
+            )
+
+
+def comprobar_modelo(modelo, entrada):
+    # El modelo cargado frente al esquema de su entrada del manifiesto.
+    comprobar_esquema(entrada)
+    n_columnas = getattr(modelo, "n_features_in_", None)
+    if n_columnas is not None and n_columnas != len(entrada["entradas"]):
+        raise ValueError(f"El modelo espera {n_columnas} columnas y el manifiesto declara {len(entrada['entradas'])}.")
+    columnas = getattr(modelo, "feature_names_in_", None)
+    if columnas is None:
+        columnas = getattr(modelo, "columnas", None)
+    if columnas is not None and len(columnas) and list(columnas) != entrada["entradas"]:
+        raise ValueError("Las columnas con las que se entrenó el modelo no coinciden con las del manifiesto.")
+    n_salidas = dimension_salida(modelo)
+    if n_salidas != len(entrada["salidas"]):
+        raise ValueError(f"El modelo tiene {n_salidas} salidas y el manifiesto declara {len(entrada['salidas'])}.")
+
+
+def resolver(directorio):
+    # (ruta, hash, versión, entrada) del modelo activo, tras comprobar que
+    # el fichero es el que se publicó.
+    manifiesto = leer_manifiesto(directorio)
+    version = manifiesto.get("activa")
+    entrada = manifiesto.get("modelos", {}).get(version)
+    if entrada is None:
+        raise ValueError(f"El registro '{directorio}' no tiene una versión activa válida: {version}.")
+    comprobar_esquema(entrada)
+    ruta = os.path.join(directorio, entrada["fichero"])
+    hash_modelo = hash_fichero(ruta)
+    if hash_modelo != entrada["sha256"]:
+        raise ValueError(f"El hash de '{entrada['fichero']}' no coincide con el del manifiesto.")
+    return ruta, hash_modelo, version, entrada
+
+
+def publicar(origen, version, directorio=DIR_MODELOS, activar=True, plano=False):
+    # Copia el modelo al registro (o lo exporta al formato plano de
+    # modelo_plano.py) y lo añade al manifiesto; con activar=True pasa a ser
+    # el que sirven los procesos.
+    os.makedirs(directorio, exist_ok=True)
+    try:
+        manifiesto = leer_manifiesto(directorio)
+    except FileNotFoundError:
+        manifiesto = {"formato": FORMATO_REGISTRO, "activa": None, "modelos": {}}
+    if version in manifiesto["modelos"]:
+        raise ValueError(f"La versión {version} ya está publicada en '{directorio}'.")
+    entrada = {"version": version, **esquema_actual()}
+    modelo = cargar_modelo(origen)
+    comprobar_modelo(modelo, entrada)
+
+    tmp = os.path.join(directorio, f".{version}.{uuid.uuid4().hex[:8]}.tmp")
+    if plano:
+        from modelo_plano import EXTENSION_MODELO_PLANO, exportar
+        exportar(modelo, tmp, origen={"fichero": os.path.basename(origen), "sha256": hash_fichero(origen)})
+        extension = EXTENSION_MODELO_PLANO
+    else:
+        shutil.copyfile(origen, tmp)
+        extension = os.path.splitext(origen)[1]
+    sha256 = hash_fichero(tmp)
+    fichero = f"{version}-{sha256[:10]}{extension}"
+    os.replace(tmp, os.path.join(directorio, fichero))
+
+    entrada.update({
+        "fichero": fichero,
+        "sha256": sha256,
+        "bytes": os.path.getsize(os.path.join(directorio, fichero)),
+        "origen": os.path.basename(origen),
+        "publicado": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+    })
+    manifiesto["modelos"][version] = entrada
+    if activar:
+        manifiesto["activa"] = version
+    _escribir_manifiesto(directorio, manifiesto)
+    return entrada
+
+
+def activar(version, directorio=DIR_MODELOS):
+    manifiesto = leer_manifiesto(directorio)
+    entrada = manifiesto["modelos"].get(version)
+    if entrada is None:
+        raise ValueError(f"La versión {version} no está publicada en '{directorio}'.")
+    comprobar_esquema(entrada)
+    manifiesto["activa"] = version
+    _escribir_manifiesto(directorio, manifiesto)
+    return entrada
+
+
+def verificar(directorio=DIR_MODELOS):
+    # Hash y esquema de todas las versiones publicadas.
+    manifiesto = leer_manifiesto(directorio)
+    resultado = {}
+    for version, entrada in manifiesto["modelos"].items():
+        try:
+            comprobar_esquema(entrada)
+            ruta = os.path.join(directorio, entrada["fichero"])
+            resultado[version] = "ok" if hash_fichero(ruta) == entrada["sha256"] else "hash distinto"
+        except (OSError, ValueError) as e:
+            resultado[version] = str(e)
+    return {"activa": manifiesto.get("activa"), "modelos": resultado,
+            "ok": all(v == "ok" for v in resultado.values())}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Registro local de versiones del modelo.")
+    parser.add_argument("--directorio", default=os.environ.get("DIR_MODELOS", DIR_MODELOS))
+    sub = parser.add_subparsers(dest="orden", required=True)
+    p = sub.add_parser("publicar")
+    p.add_argument("origen")
+    p.add_argument("--version", required=True)
+    p.add_argument("--plano", action="store_true", help="lo guarda en el formato plano de modelo_plano.py")
+    p.add_argument("--no-activar", action="store_true", help="lo publica sin hacerlo activo")
+    p = sub.add_parser("activar")
+    p.add_argument("version")
+    sub.add_parser("listar")
+    sub.add_parser("verificar")
+    args = parser.parse_args(argv)
+
+    if args.orden == "publicar":
+        resultado = publicar(args.origen, args.version, args.directorio,
+                             activar=not args.no_activar, plano=args.plano)
+        resultado = {k: v for k, v in resultado.items() if k not in ("entradas", "salidas")}
+    elif args.orden == "activar":
+        resultado = {"activa": activar(args.version, args.directorio)["version"]}
+    elif args.orden == "listar":
+        manifiesto = leer_manifiesto(args.directorio)
+        resultado = {
+            "activa": manifiesto.get("activa"),
+            "modelos": {
+                v: {k: e[k] for k in ("fichero", "bytes", "publicado")}
+                for v, e in manifiesto["modelos"].items()
+            },
+        }
+    else:
+        resultado = verificar(args.directorio)
+        print(json.dumps(resultado, indent=2, ensure_ascii=False))
+        return 0 if resultado["ok"] else 1
+    print(json.dumps(resultado, indent=2, ensure_ascii=False))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,315 @@
+import contextlib
+import os
+import threading
+import time
+
+import numpy as np
+
+from cache_compartido import CacheSWR, crear_backend_cache
+from cache_lru import CacheLRU
+from clima import ProveedorClima
+from indice_espacial import IndiceEspacial
+from metricas import medir, registrar_cache
+from programador_clima import ProgramadorClima
+from recomendador import (
+    CACHE_PREDICCIONES_MAX,
+    CATALOGO,
+    COLUMNAS_ENTRENAMIENTO,
+    LUGARES_MODELO,
+    UMBRAL_EXTERIOR,
+    PredictorCacheado,
+    filtrar_por_clima,
+)
+
+# Núcleo de la recomendación sin Streamlit: predicción del perfil, clima
+# del día, puntuación difusa y filtro meteorológico. La aplicación de
+# Streamlit y el servicio HTTP (api.py) son dos clientes del mismo
+# ServicioRecomendacion; cada proceso tiene el suyo.
+
+RUTA_MODELO = "modelo_turismo.pkl"
+CACHE_DIFUSO_MAX = 1024
+MODOS_DIFUSO = ("lut", "numpy", "skfuzzy")
+# Alternativas a cubierto que se ofrecen por cada lugar exterior descartado
+# por el tiempo, y distancia máxima a la que se buscan.
+K_ALTERNATIVAS = 2
+RADIO_ALTERNATIVAS_KM = 30.0
+# Valores que se usan cuando a la previsión le falta alguna variable.
+CLIMA_POR_DEFECTO = {"tmax": 20, "tmin": 10, "lluvia": 0, "UV": 5}
+
+
+def normalizar_clima(valores):
+    return tuple(round(float(v), 2) if isinstance(v, (int, float)) else v for v in valores)
+
+
+def entrada_difusa(clima):
+    return normalizar_clima(clima.get(k, defecto) for k, defecto in CLIMA_POR_DEFECTO.items())
+
+
+class MotorSkfuzzy:
+    def __init__(self, sistema_ctrl=None):
+        from motor_difuso import construir_sistema_difuso
+        self.sistema_ctrl = sistema_ctrl if sistema_ctrl is not None else construir_sistema_difuso()
+
+    def puntuar(self, tmax, tmin, lluvia, uv):
+        from motor_difuso import simular
+        return simular(self.sistema_ctrl, tmax, tmin, lluvia, uv)
+
+
+def crear_motor_difuso(modo="lut"):
+    from motor_difuso import MotorNumPy, RUTA_LUT, cargar_o_compilar_lut
+
+    modo = (modo or "lut").strip().lower()
+    if modo == "lut":
+        return cargar_o_compilar_lut(ruta=RUTA_LUT)
+    if modo == "numpy":
+        return MotorNumPy()
+    if modo == "skfuzzy":
+        return MotorSkfuzzy()
+    raise ValueError(f"Modo difuso desconocido: '{modo}'. Opciones: {', '.join(MODOS_DIFUSO)}")
+
+
+class Cronometro:
+    # Duración en segundos de cada etapa del arranque. Con tolerar=True un
+    # error de la etapa se anota en lugar de propagarse.
+    def __init__(self):
+        self.etapas = {}
+        self.errores = {}
+
+    @contextlib.contextmanager
+    def etapa(self, nombre, tolerar=False):
+        inicio = time.perf_counter()
+        try:
+            yield
+        except Exception as e:
+            if not tolerar:
+                raise
+            self.errores[nombre] = str(e)
+        finally:
+            self.etapas[nombre] = round(time.perf_counter() - inicio, 4)
+
+    def informe(self):
+        return {
+            "etapas": dict(self.etapas),
+            "total": round(sum(self.etapas.values()), 4),
+            "errores": dict(self.errores),
+        }
+
+
+class ServicioRecomendacion:
+    def __init__(self, predictor, motor_difuso, proveedor_clima=None,
+                 max_entradas_difuso=CACHE_DIFUSO_MAX, programador_clima=None, indice_espacial=None):
+        self.predictor = predictor
+        self.motor_difuso = motor_difuso
+        self.proveedor_clima = proveedor_clima
+        self.programador_clima = programador_clima
+        self.cache_difuso = CacheLRU(max_entradas=max_entradas_difuso)
+        self.indice_espacial = indice_espacial if indice_espacial is not None else IndiceEspacial.desde_catalogo(CATALOGO)
+        self.arranque = None
+
+    def calentar(self, cronometro=None, clima=True):
+        # Primera predicción y primera puntuación difusa (tocan por primera
+        # vez las páginas del modelo y de la LUT) y clima del día en la
+        # caché, para que no las pague el primer visitante. Un fallo del
+        # clima no impide arrancar: se anota en el informe.
+        cronometro = cronometro if cronometro is not None else Cronometro()
+        with cronometro.etapa("prediccion"):
+            self.predictor.predecir_lote(np.zeros((1, len(COLUMNAS_ENTRENAMIENTO)), dtype=np.float32))
+        with cronometro.etapa("puntuacion_difusa"):
+            self.motor_difuso.puntuar(*entrada_difusa(CLIMA_POR_DEFECTO))
+        if clima and self.proveedor_clima is not None:
+            with cronometro.etapa("clima", tolerar=True):
+                self.obtener_clima()
+        self.arranque = cronometro.informe()
+        return self.arranque
+
+    def predecir(self, datos_usuario):
+        return self._predecir(datos_usuario)[0]
+
+    def _predecir(self, datos_usuario):
+        predicciones, version = self.predictor.predecir_con_version(datos_usuario)
+        return {lugar: int(pred) for lugar, pred in zip(LUGARES_MODELO, predicciones)}, version
+
+    def obtener_clima(self):
+        if self.proveedor_clima is None:
+            raise RuntimeError("No hay proveedor de clima configurado.")
+        return self.proveedor_clima.obtener_clima_hoy()
+
+    def puntuar_clima(self, clima):
+        entrada = entrada_difusa(clima)
+        with medir("puntuacion_difusa"):
+            return self.cache_difuso.obtener(("score",) + entrada, lambda: self.motor_difuso.puntuar(*entrada))
+
+    def puntuar_dias(self, semana):
+        # Puntúa todos los días de prevision_semanal en una sola pasada
+        # vectorizada. Las variables que AEMET no da para los últimos días
+        # (normalmente el UV) toman el valor de CLIMA_POR_DEFECTO.
+        entradas = [
+            np.array([defecto if v is None else v for v in semana[k]], dtype=np.float64)
+            for k, defecto in CLIMA_POR_DEFECTO.items()
+        ]
+        puntuar_lote = getattr(self.motor_difuso, "puntuar_lote", None)
+        if puntuar_lote is not None:
+            scores = puntuar_lote(*entradas)
+        else:
+            scores = np.array([
+                np.nan if s is None else s for s in (self.motor_difuso.puntuar(*fila) for fila in zip(*entradas))
+            ], dtype=np.float64)
+        dias = []
+        for i, score in enumerate(scores):
+            dia = {k: v[i] for k, v in semana.items()}
+            dia["score_exterior"] = None if np.isnan(score) else float(score)
+            dia["exterior_recomendable"] = dia["score_exterior"] is not None and score >= UMBRAL_EXTERIOR
+            dias.append(dia)
+        return dias
+
+    def prevision_por_dias(self):
+        if self.proveedor_clima is None:
+            raise RuntimeError("No hay proveedor de clima configurado.")
+        return self.puntuar_dias(self.proveedor_clima.prevision_semanal())
+
+    def cercanos(self, lat, lon, k=5, radio_km=None):
+        if radio_km is not None and k is None:
+            resultado = self.indice_espacial.en_radio(lat, lon, radio_km)
+        else:
+            resultado = self.indice_espacial.k_cercanos(lat, lon, k, radio_max_km=radio_km)
+        return [{"clave": clave, "distancia_km": round(d, 3)} for clave, d in resultado]
+
+    def alternativas_cercanas(self, recomendaciones, filtradas):
+        # Para cada lugar que el filtro meteorológico ha quitado, los lugares
+        # a cubierto más cercanos que no estén ya recomendados.
+        descartados = [k for k, v in recomendaciones.items() if v == 1 and filtradas.get(k) == 0]
+        if not descartados:
+            return {}
+        permitidos = CATALOGO.interiores - {k for k, v in filtradas.items() if v == 1}
+        return {
+            clave: [
+                {"clave": c, "distancia_km": round(d, 3)}
+                for c, d in self.indice_espacial.cercanos_a(
+                    clave, K_ALTERNATIVAS, permitidos=permitidos, radio_max_km=RADIO_ALTERNATIVAS_KM
+                )
+            ]
+            for clave in descartados
+        }
+
+    def recomendar(self, datos_usuario, clima=None):
+        # Si no se pasa `clima` se usa la previsión del día. Cualquier fallo
+        # del clima o de la puntuación deja las recomendaciones sin filtrar y
+        # se informa en "error_clima", como hacía la aplicación.
+        with medir("recomendar"):
+            return self._recomendar(datos_usuario, clima)
+
+    def _recomendar(self, datos_usuario, clima):
+        recomendaciones, version = self._predecir(datos_usuario)
+        resultado = {
+            "recomendaciones": recomendaciones,
+            "filtradas": recomendaciones,
+            "clima": None,
+            "score_exterior": None,
+            "error_clima": None,
+            "hash_modelo": self.predictor.hash_modelo,
+            "version_modelo": version,
+        }
+        try:
+            if clima is None:
+                clima = self.obtener_clima()
+            resultado["clima"] = clima
+            score_exterior = self.puntuar_clima(clima)
+            resultado["filtradas"] = filtrar_por_clima(recomendaciones, clima, score_exterior)
+            resultado["score_exterior"] = score_exterior
+        except Exception as e:
+            resultado["error_clima"] = str(e)
+        resultado["lugares_recomendados"] = [k for k, v in resultado["filtradas"].items() if v == 1]
+        resultado["alternativas"] = self.alternativas_cercanas(recomendaciones, resultado["filtradas"])
+        return resultado
+
+    def estadisticas(self):
+        estadisticas = {
+            "hash_modelo": self.predictor.hash_modelo,
+            "version_modelo": self.predictor.version_modelo,
+            "recargas_modelo": self.predictor.recargas,
+            "error_recarga_modelo": self.predictor.error_recarga,
+            "version_catalogo": CATALOGO.version,
+            "cache_predicciones": self.predictor.cache.estadisticas(),
+            "cache_difuso": self.cache_difuso.estadisticas(),
+        }
+        if self.proveedor_clima is not None:
+            estadisticas["cache_clima"] = self.proveedor_clima.cache.estadisticas()
+            estadisticas["circuitos"] = self.proveedor_clima.estado_circuitos()
+        if self.programador_clima is not None:
+            estadisticas["clima"] = self.programador_clima.estado()
+        if self.arranque is not None:
+            estadisticas["arranque"] = self.arranque
+        return estadisticas
+
+
+def crear_cache_clima(nombre=None, ruta=None, redis_url=None):
+    # Con un backend compartido, cada proceso guarda además una copia en
+    # memoria que mantiene al día el programador del clima: las peticiones
+    # no leen SQLite, los ficheros o Redis salvo cuando la copia caduca.
+    entorno = os.environ.get
+    nombre = (nombre or entorno("CACHE_CLIMA", "sqlite")).strip().lower()
+    backend = crear_backend_cache(
+        nombre,
+        ruta=ruta or entorno("CACHE_CLIMA_RUTA", "cache/clima"),
+        redis_url=redis_url or entorno("REDIS_URL"),
+    )
+    return CacheSWR(backend, copia_local=nombre != "memoria")
+
+
+def _activado(nombre, valor=None):
+    if valor is None:
+        valor = os.environ.get(nombre, "1").strip().lower() not in ("0", "false", "no")
+    return valor
+
+
+def crear_servicio(ruta_modelo=None, modo_difuso=None, modo_prediccion=None,
+                   api_key_aemet=None, api_key_openuv=None, cache_clima=None,
+                   prefetch_clima=None, calentar=None):
+    # Los parámetros que no se pasan se leen del entorno. Salvo con
+    # CALENTAR=0, deja listos modelo, motor difuso y clima antes de
+    # devolver el servicio (con la duración de cada etapa en
+    # servicio.arranque); salvo con PREFETCH_CLIMA=0, arranca después el
+    # hilo que precarga el clima.
+    entorno = os.environ.get
+    cronometro = Cronometro()
+    predictor = PredictorCacheado(
+        ruta_modelo or entorno("RUTA_MODELO", RUTA_MODELO),
+        max_entradas=CACHE_PREDICCIONES_MAX,
+        rapido=(modo_prediccion or entorno("MODO_PREDICCION", "rapido")) != "dataframe",
+    )
+    proveedor = ProveedorClima(
+        api_key_aemet or entorno("API_KEY_AEMET"),
+        api_key_openuv or entorno("API_KEY_OPENUV"),
+        cache=cache_clima if cache_clima is not None else crear_cache_clima(),
+    )
+    # Carga ya el modelo: si sus salidas no coinciden con el catálogo, el
+    # fallo aparece al arrancar y no en la primera recomendación.
+    with cronometro.etapa("modelo"):
+        predictor.modelo()
+    with cronometro.etapa("motor_difuso"):
+        motor = crear_motor_difuso(modo_difuso or entorno("MODO_DIFUSO", "lut"))
+    servicio = ServicioRecomendacion(predictor, motor, proveedor)
+    registrar_cache("predicciones", predictor.cache)
+    registrar_cache("difuso", servicio.cache_difuso)
+    registrar_cache("clima", proveedor.cache)
+    if _activado("CALENTAR", calentar):
+        servicio.calentar(cronometro)
+    else:
+        servicio.arranque = cronometro.informe()
+    if _activado("PREFETCH_CLIMA", prefetch_clima):
+        servicio.programador_clima = ProgramadorClima(proveedor)
+        servicio.programador_clima.arrancar()
+    return servicio
+
+
+_servicio = None
+_servicio_lock = threading.Lock()
+
+
+def get_servicio():
+    global _servicio
+    if _servicio is None:
+        with _servicio_lock:
+            if _servicio is None:
+                _servicio = crear_servicio()
+    return _servicio
@@ -0,0 +1,43 @@
+import os
+import sys
+
+import pytest
+
+# Los módulos del proyecto están en la raíz del repositorio.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def entrenar_modelo_pequeno(semilla=2):
+    # Modelo pequeño con la misma forma que el real: 26 columnas y 17
+    # salidas, alguna con tres clases y alguna con una sola.
+    import numpy as np
+    import pandas as pd
+    from sklearn.ensemble import RandomForestClassifier
+    from sklearn.multioutput import MultiOutputClassifier
+
+    from recomendador import COLUMNAS_ENTRENAMIENTO, LUGARES_MODELO, perfiles_aleatorios
+
+    df = pd.DataFrame(perfiles_aleatorios(400, semilla=1))[COLUMNAS_ENTRENAMIENTO]
+    x = df.to_numpy(dtype=np.float64)
+    rng = np.random.default_rng(semilla)
+    salidas = []
+    for j in range(len(LUGARES_MODELO)):
+        pesos = rng.normal(size=x.shape[1])
+        puntuacion = (x - x.mean(axis=0)) @ pesos + rng.normal(scale=0.5, size=len(x))
+        salidas.append((puntuacion > 0).astype(int) + (j % 5 == 0) * (puntuacion > 1))
+    y = np.column_stack(salidas)
+    y[:, -1] = 1
+    modelo = MultiOutputClassifier(RandomForestClassifier(n_estimators=15, max_depth=6, random_state=0))
+    return modelo.fit(df, y)
+
+
+@pytest.fixture(scope="session")
+def fabrica_modelos():
+    pytest.importorskip("sklearn")
+    modelos = {}
+
+    def fabricar(semilla=2):
+        if semilla not in modelos:
+            modelos[semilla] = entrenar_modelo_pequeno(semilla)
+        return modelos[semilla]
+    return fabricar
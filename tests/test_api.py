@@ -0,0 +1,78 @@
+import joblib
+import pytest
+
+pytest.importorskip("starlette")
+try:
+    from starlette.testclient import TestClient
+except (ImportError, RuntimeError):
+    # Sin httpx2 (o httpx en versiones anteriores de Starlette).
+    pytest.skip("starlette.testclient necesita httpx2", allow_module_level=True)
+
+import servicio
+from recomendador import LUGARES_MODELO, perfiles_aleatorios
+
+CLIMA = {"tmax": 24, "tmin": 11, "lluvia": 10, "UV": 4.4}
+
+
+@pytest.fixture
+def cliente(tmp_path, monkeypatch, fabrica_modelos):
+    # Servicio sin red: modelo pequeño, clima en memoria, sin precarga ni
+    # calentamiento y sin claves de AEMET ni OpenUV.
+    ruta = str(tmp_path / "modelo.pkl")
+    joblib.dump(fabrica_modelos(), ruta)
+    monkeypatch.setenv("RUTA_MODELO", ruta)
+    monkeypatch.setenv("CACHE_CLIMA", "memoria")
+    monkeypatch.setenv("PREFETCH_CLIMA", "0")
+    monkeypatch.setenv("CALENTAR", "0")
+    monkeypatch.delenv("API_KEY_AEMET", raising=False)
+    monkeypatch.delenv("API_KEY_OPENUV", raising=False)
+    monkeypatch.setattr(servicio, "_servicio", None)
+
+    import api
+    with TestClient(api.app) as cliente:
+        yield cliente
+
+
+def test_recomendar(cliente):
+    perfil = perfiles_aleatorios(1, semilla=3)[0]
+    respuesta = cliente.post("/recomendar", json={"perfil": perfil, "clima": CLIMA})
+    assert respuesta.status_code == 200
+    datos = respuesta.json()
+    assert sorted(datos["recomendaciones"]) == sorted(LUGARES_MODELO)
+    assert datos["clima"] == CLIMA
+    assert datos["error_clima"] is None
+    assert 0 <= datos["score_exterior"] <= 10
+    assert set(datos["lugares_recomendados"]) <= set(LUGARES_MODELO)
+
+
+@pytest.mark.parametrize("cuerpo", [
+    b"{no es json",
+    b"[1, 2]",
+    b'{"perfil": "hola"}',
+    b'{"clima": {"tmax": 20}}',
+    b'{"perfil": {"edad": "treinta"}}',
+    b'{"perfil": {}, "clima": {"tmax": "calor"}}',
+])
+def test_peticion_invalida_es_un_4xx(cliente, cuerpo):
+    respuesta = cliente.post("/recomendar", content=cuerpo, headers={"content-type": "application/json"})
+    assert 400 <= respuesta.status_code < 500
+    assert "error" in respuesta.json()
+
+
+def test_puntuacion_invalida_es_un_4xx(cliente):
+    assert cliente.post("/puntuacion", json={"tmax": "calor"}).status_code == 400
+    assert cliente.post("/puntuacion", json=CLIMA).status_code == 200
+
+
+def test_salud_y_metricas(cliente):
+    cliente.post("/recomendar", json={"perfil": perfiles_aleatorios(1, semilla=4)[0], "clima": CLIMA})
+
+    salud = cliente.get("/salud")
+    assert salud.status_code == 200
+    assert salud.json()["ok"] is True
+    assert "arranque" in salud.json()
+
+    metricas = cliente.get("/metricas")
+    assert metricas.status_code == 200
+    assert metricas.headers["content-type"].startswith("text/plain")
+    assert "recomendar" in metricas.text
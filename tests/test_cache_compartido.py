@@ -0,0 +1,213 @@
+import threading
+import time
+
+import pytest
+
+from cache_compartido import CacheFicheros, CacheMemoria, CacheRedis, CacheSQLite, CacheSWR
+
+
+class BackendContado(CacheMemoria):
+    # CacheMemoria que cuenta las lecturas, como si fuera SQLite o Redis.
+    def __init__(self):
+        super().__init__()
+        self.lecturas = 0
+
+    def leer(self, clave):
+        self.lecturas += 1
+        return super().leer(clave)
+
+
+def test_copia_local_no_lee_el_backend_mientras_esta_fresca():
+    backend = BackendContado()
+    cache = CacheSWR(backend, copia_local=True)
+    assert cache.obtener("k", lambda: 1, ttl=60) == 1
+    lecturas = backend.lecturas
+    for _ in range(100):
+        assert cache.obtener("k", lambda: 2, ttl=60) == 1
+    assert backend.lecturas == lecturas
+
+
+def test_copia_local_caducada_vuelve_al_backend():
+    backend = BackendContado()
+    cache = CacheSWR(backend, copia_local=True)
+    cache.obtener("k", lambda: 1, ttl=60)
+    # Otro proceso deja un valor más nuevo en el backend compartido.
+    backend.escribir("k", 2, time.time())
+    assert cache.obtener("k", lambda: 3, ttl=60) == 1
+    assert cache.obtener("k", lambda: 3, ttl=0.0, max_obsoleto=60) == 2
+
+
+def test_refrescar_actualiza_la_copia_local():
+    backend = BackendContado()
+    cache = CacheSWR(backend, copia_local=True)
+    cache.obtener("k", lambda: 1, ttl=60)
+    assert cache.refrescar("k", lambda: 2) is True
+    lecturas = backend.lecturas
+    assert cache.obtener("k", lambda: 3, ttl=60) == 2
+    assert backend.lecturas == lecturas
+
+
+def test_sin_copia_local_cada_obtener_lee_el_backend():
+    backend = BackendContado()
+    cache = CacheSWR(backend)
+    cache.obtener("k", lambda: 1, ttl=60)
+    lecturas = backend.lecturas
+    cache.obtener("k", lambda: 1, ttl=60)
+    assert backend.lecturas == lecturas + 1
+
+
+class RedisFalso:
+    # Lo que CacheRedis usa de redis-py: get, set con nx/px y delete.
+    def __init__(self):
+        self._datos = {}
+        self._caduca = {}
+        self._lock = threading.Lock()
+
+    def _purgar(self, clave):
+        if clave in self._caduca and self._caduca[clave] <= time.monotonic():
+            self._datos.pop(clave, None)
+            self._caduca.pop(clave, None)
+
+    def get(self, clave):
+        with self._lock:
+            self._purgar(clave)
+            return self._datos.get(clave)
+
+    def set(self, clave, valor, nx=False, px=None):
+        with self._lock:
+            self._purgar(clave)
+            if nx and clave in self._datos:
+                return None
+            self._datos[clave] = valor.encode() if isinstance(valor, str) else valor
+            if px is not None:
+                self._caduca[clave] = time.monotonic() + px / 1000
+            else:
+                self._caduca.pop(clave, None)
+            return True
+
+    def delete(self, clave):
+        with self._lock:
+            self._datos.pop(clave, None)
+            self._caduca.pop(clave, None)
+
+
+@pytest.fixture(params=["memoria", "ficheros", "sqlite", "redis"])
+def crear_backend(request, tmp_path):
+    # Devuelve una función que crea backends sobre el mismo almacén, como
+    # harían dos procesos distintos (salvo "memoria", que es uno solo).
+    if request.param == "memoria":
+        backend = CacheMemoria()
+        return lambda: backend
+    if request.param == "ficheros":
+        return lambda: CacheFicheros(str(tmp_path / "cache"))
+    if request.param == "sqlite":
+        return lambda: CacheSQLite(str(tmp_path / "cache.sqlite3"))
+    cliente = RedisFalso()
+    return lambda: CacheRedis(cliente)
+
+
+class Calculo:
+    # Cuenta las llamadas y tarda `retraso` segundos en devolver `valor`.
+    def __init__(self, valor, retraso=0.0, error=None):
+        self.valor = valor
+        self.retraso = retraso
+        self.error = error
+        self.llamadas = 0
+        self._lock = threading.Lock()
+
+    def __call__(self):
+        with self._lock:
+            self.llamadas += 1
+        time.sleep(self.retraso)
+        if self.error is not None:
+            raise self.error
+        return self.valor
+
+
+def _en_hilos(n, funcion):
+    resultados, errores = [None] * n, []
+
+    def trabajar(i):
+        try:
+            resultados[i] = funcion(i)
+        except Exception as e:
+            errores.append(e)
+
+    hilos = [threading.Thread(target=trabajar, args=(i,)) for i in range(n)]
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+    assert not errores, errores
+    return resultados
+
+
+def test_una_sola_llamada_con_muchos_llamantes(crear_backend):
+    # Ocho llamantes repartidos en dos "procesos" sin valor guardado.
+    caches = [CacheSWR(crear_backend(), intervalo_sondeo=0.01) for _ in range(2)]
+    calculo = Calculo({"uv": 5}, retraso=0.2)
+    resultados = _en_hilos(8, lambda i: caches[i % 2].obtener("k", calculo, ttl=60))
+    assert resultados == [{"uv": 5}] * 8
+    assert calculo.llamadas == 1
+    assert sum(c.estadisticas()["llamadas"] for c in caches) == 1
+
+
+def test_sirve_el_obsoleto_y_refresca_en_segundo_plano(crear_backend):
+    backend = crear_backend()
+    backend.escribir("k", "viejo", time.time() - 100)
+    cache = CacheSWR(backend)
+    calculo = Calculo("nuevo", retraso=0.2)
+
+    inicio = time.monotonic()
+    resultados = _en_hilos(5, lambda i: cache.obtener("k", calculo, ttl=10, max_obsoleto=1000))
+    assert time.monotonic() - inicio < 0.15
+    assert resultados == ["viejo"] * 5
+    assert cache.estadisticas()["obsoletos"] == 5
+
+    limite = time.monotonic() + 2
+    while backend.leer("k")[0] != "nuevo" and time.monotonic() < limite:
+        time.sleep(0.01)
+    assert cache.obtener("k", calculo, ttl=10) == "nuevo"
+    assert calculo.llamadas == 1
+
+
+def test_demasiado_viejo_se_calcula_en_el_momento(crear_backend):
+    backend = crear_backend()
+    backend.escribir("k", "viejo", time.time() - 100)
+    cache = CacheSWR(backend)
+    assert cache.obtener("k", Calculo("nuevo"), ttl=10, max_obsoleto=50) == "nuevo"
+    assert cache.estadisticas()["obsoletos"] == 0
+
+
+def test_los_errores_no_se_guardan_y_liberan_el_cerrojo(crear_backend):
+    backend = crear_backend()
+    cache = CacheSWR(backend)
+    with pytest.raises(ConnectionError):
+        cache.obtener("k", Calculo(None, error=ConnectionError("caída")), ttl=60)
+    assert backend.leer("k") is None
+    assert cache.obtener("k", Calculo("bien"), ttl=60) == "bien"
+
+
+def test_error_del_refresco_en_segundo_plano(crear_backend):
+    backend = crear_backend()
+    backend.escribir("k", "viejo", time.time() - 100)
+    cache = CacheSWR(backend)
+    assert cache.obtener("k", Calculo(None, error=ConnectionError("caída")), ttl=10, max_obsoleto=1000) == "viejo"
+    limite = time.monotonic() + 2
+    while cache.estadisticas()["errores_refresco"] == 0 and time.monotonic() < limite:
+        time.sleep(0.01)
+    assert cache.estadisticas()["errores_refresco"] == 1
+    assert isinstance(cache.ultimo_error, ConnectionError)
+    assert backend.leer("k")[0] == "viejo"
+
+
+def test_espera_acotada_si_otro_tiene_el_cerrojo(crear_backend):
+    backend = crear_backend()
+    token = backend.bloquear("k", 60)
+    assert token is not None
+    cache = CacheSWR(crear_backend(), espera_max=0.2, intervalo_sondeo=0.02)
+    calculo = Calculo("nuevo")
+    with pytest.raises(TimeoutError):
+        cache.obtener("k", calculo, ttl=60)
+    assert calculo.llamadas == 0
+    backend.desbloquear("k", token)
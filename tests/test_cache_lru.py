@@ -0,0 +1,76 @@
+import threading
+
+import pytest
+
+from cache_lru import CacheLRU
+
+
+def test_acierto_fallo_y_orden_de_expulsion():
+    cache = CacheLRU(max_entradas=2)
+    assert cache.obtener("a", lambda: 1) == 1
+    assert cache.obtener("b", lambda: 2) == 2
+    # "a" pasa a ser la más reciente: la siguiente expulsión es "b".
+    assert cache.obtener("a", lambda: 99) == 1
+    cache.obtener("c", lambda: 3)
+    assert cache.obtener("b", lambda: 20) == 20
+    assert cache.obtener("c", lambda: 30) == 3
+    estadisticas = cache.estadisticas()
+    assert (estadisticas["aciertos"], estadisticas["fallos"]) == (2, 4)
+    assert estadisticas["expulsiones"] == 2
+    assert estadisticas["entradas"] == len(cache) == 2
+
+
+def test_las_excepciones_no_se_guardan():
+    cache = CacheLRU()
+
+    def falla():
+        raise ValueError("sin valor")
+
+    with pytest.raises(ValueError):
+        cache.obtener("k", falla)
+    assert len(cache) == 0
+    assert cache.obtener("k", lambda: 1) == 1
+
+
+def test_invalidar():
+    cache = CacheLRU()
+    cache.obtener("a", lambda: 1)
+    cache.obtener("b", lambda: 2)
+    cache.invalidar("a")
+    assert cache.obtener("a", lambda: 10) == 10
+    assert cache.obtener("b", lambda: 20) == 2
+    cache.invalidar()
+    assert len(cache) == 0
+    assert cache.estadisticas()["invalidaciones"] == 2
+
+
+def test_sin_entradas_siempre_calcula():
+    cache = CacheLRU(max_entradas=0)
+    llamadas = []
+    for _ in range(3):
+        cache.obtener("k", lambda: llamadas.append(1) or len(llamadas))
+    assert len(llamadas) == 3
+    assert len(cache) == 0
+
+
+def test_hilos_concurrentes():
+    cache = CacheLRU(max_entradas=50)
+    errores = []
+
+    def trabajar(semilla):
+        try:
+            for i in range(2000):
+                clave = (i * semilla) % 80
+                assert cache.obtener(clave, lambda: clave * 2) == clave * 2
+        except Exception as e:
+            errores.append(e)
+
+    hilos = [threading.Thread(target=trabajar, args=(s,)) for s in (1, 3, 7, 11)]
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+    assert not errores
+    estadisticas = cache.estadisticas()
+    assert estadisticas["aciertos"] + estadisticas["fallos"] == 8000
+    assert len(cache) <= 50
@@ -0,0 +1,82 @@
+import threading
+import time
+
+import clima
+from clima import ProveedorClima
+
+
+class ProveedorFalso(ProveedorClima):
+    # AEMET inmediato; el UV tarda `retraso_uv` segundos.
+    def __init__(self, retraso_uv, **opciones):
+        super().__init__("clave", "clave", ruta_ultimo_bueno=None, **opciones)
+        self.retraso_uv = retraso_uv
+        self.uv_servido = threading.Event()
+
+    def prevision_aemet(self):
+        return {"fecha": "2026-10-17T00:00:00", "tmax": 20, "tmin": 8, "lluvia": 10, "UV": 4}
+
+    def uv_actual(self):
+        time.sleep(self.retraso_uv)
+        self.uv_servido.set()
+        return 6.5
+
+
+def test_uv_de_openuv_si_llega_a_tiempo():
+    assert ProveedorFalso(0.01, espera_uv=1.0).obtener_clima_hoy()["UV"] == 6.5
+
+
+def test_uv_lento_usa_el_de_aemet():
+    proveedor = ProveedorFalso(1.0, espera_uv=0.05)
+    inicio = time.monotonic()
+    clima = proveedor.obtener_clima_hoy()
+    assert time.monotonic() - inicio < 0.5
+    assert clima["UV"] == 4
+    assert proveedor.uv_agotados == 1
+    proveedor.uv_servido.wait(2)
+
+
+class ProveedorConPrevision(ProveedorClima):
+    # _prevision devuelve lo que haya en la caché, sin descargar nada.
+    def __init__(self, datos):
+        super().__init__("clave", "clave", ruta_ultimo_bueno=None)
+        self.datos = datos
+
+    def _prevision(self):
+        return self.datos
+
+
+def prevision_desde(dia):
+    fechas = [f"2026-10-{d:02d}T00:00:00" for d in range(dia, dia + 3)]
+    semana = {
+        "fecha": fechas, "tmax": [20, 22, 24], "tmin": [8, 9, 10],
+        "lluvia": [10, 20, 30], "UV": [4, 5, None], "lluvia_max": [15, 25, 35],
+    }
+    hoy = {"fecha": fechas[0], "tmax": 20, "tmin": 8, "lluvia": 10, "UV": 4}
+    return {"hoy": hoy, "semana": semana}
+
+
+def test_prevision_del_dia(monkeypatch):
+    monkeypatch.setattr(clima, "day_bucket_madrid", lambda: "2026-10-17")
+    proveedor = ProveedorConPrevision(prevision_desde(17))
+    assert proveedor.prevision_aemet() == prevision_desde(17)["hoy"]
+    assert proveedor.prevision_semanal()["tmax"] == [20, 22, 24]
+
+
+def test_prevision_de_ayer_no_se_sirve_como_hoy(monkeypatch):
+    # Tras la medianoche, la previsión guardada ayer aún es servible como
+    # obsoleta: "hoy" pasa a ser su segundo día.
+    monkeypatch.setattr(clima, "day_bucket_madrid", lambda: "2026-10-17")
+    proveedor = ProveedorConPrevision(prevision_desde(16))
+    hoy = proveedor.prevision_aemet()
+    assert hoy["fecha"].startswith("2026-10-17")
+    assert (hoy["tmax"], hoy["tmin"], hoy["lluvia"], hoy["UV"]) == (22, 9, 20, 5)
+    assert hoy["respaldo"] == "prevision_anterior"
+    semana = proveedor.prevision_semanal()
+    assert semana["fecha"] == ["2026-10-17T00:00:00", "2026-10-18T00:00:00"]
+    assert semana["lluvia_max"] == [25, 35]
+
+
+def test_prevision_sin_el_dia_de_hoy_usa_el_respaldo(monkeypatch):
+    monkeypatch.setattr(clima, "day_bucket_madrid", lambda: "2026-10-30")
+    hoy = ProveedorConPrevision(prevision_desde(16)).prevision_aemet()
+    assert hoy["respaldo"] == "climatologia"
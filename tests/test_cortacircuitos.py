@@ -0,0 +1,133 @@
+import json
+import threading
+import time
+
+import pytest
+
+from clima import ProveedorClima
+from cortacircuitos import CircuitoAbierto, Cortacircuitos
+
+
+class Servicio:
+    # API falsa: falla mientras `caido` sea True y cuenta las llamadas.
+    def __init__(self, caido=True, retraso=0.0):
+        self.caido = caido
+        self.retraso = retraso
+        self.llamadas = 0
+
+    def __call__(self):
+        self.llamadas += 1
+        time.sleep(self.retraso)
+        if self.caido:
+            raise ConnectionError("caído")
+        return "ok"
+
+
+def _fallar(circuito, servicio, veces):
+    for _ in range(veces):
+        with pytest.raises(ConnectionError):
+            circuito.llamar(servicio)
+
+
+def _esperar(condicion, limite=2.0):
+    fin = time.monotonic() + limite
+    while not condicion() and time.monotonic() < fin:
+        time.sleep(0.005)
+    return condicion()
+
+
+def test_se_abre_tras_el_umbral_y_rechaza_sin_llamar():
+    circuito = Cortacircuitos("api", umbral_fallos=3, tiempo_apertura=60)
+    servicio = Servicio()
+    _fallar(circuito, servicio, 3)
+    assert circuito.estado == "abierto"
+    for _ in range(5):
+        with pytest.raises(CircuitoAbierto):
+            circuito.llamar(servicio)
+    assert servicio.llamadas == 3
+    detalle = circuito.estado_detallado()
+    assert (detalle["aperturas"], detalle["rechazadas"]) == (1, 5)
+    assert detalle["ultimo_error"] == "caído"
+
+
+def test_un_exito_reinicia_los_fallos_seguidos():
+    circuito = Cortacircuitos("api", umbral_fallos=3)
+    servicio = Servicio()
+    _fallar(circuito, servicio, 2)
+    servicio.caido = False
+    assert circuito.llamar(servicio) == "ok"
+    servicio.caido = True
+    _fallar(circuito, servicio, 2)
+    assert circuito.estado == "cerrado"
+
+
+def test_semiabierto_deja_pasar_una_prueba_y_cierra():
+    circuito = Cortacircuitos("api", umbral_fallos=1, tiempo_apertura=0.05)
+    servicio = Servicio()
+    _fallar(circuito, servicio, 1)
+    time.sleep(0.06)
+    # La prueba tarda: mientras tanto el resto se rechaza.
+    servicio.caido, servicio.retraso = False, 0.1
+    prueba = threading.Thread(target=circuito.llamar, args=(servicio,))
+    prueba.start()
+    assert _esperar(lambda: circuito.estado == "semiabierto")
+    with pytest.raises(CircuitoAbierto):
+        circuito.llamar(servicio)
+    prueba.join()
+    assert circuito.estado == "cerrado"
+    assert servicio.llamadas == 2
+
+
+def test_prueba_fallida_duplica_el_plazo_hasta_el_maximo():
+    circuito = Cortacircuitos("api", umbral_fallos=1, tiempo_apertura=0.05, tiempo_apertura_max=0.15)
+    servicio = Servicio()
+    _fallar(circuito, servicio, 1)
+    for plazo in (0.1, 0.15, 0.15):
+        time.sleep(circuito._apertura_actual + 0.01)
+        _fallar(circuito, servicio, 1)
+        assert circuito.estado == "abierto"
+        assert circuito._apertura_actual == pytest.approx(plazo)
+    assert circuito.aperturas == 1
+
+
+def test_con_sonda_las_peticiones_nunca_hacen_de_prueba():
+    sonda = Servicio()
+    circuito = Cortacircuitos("api", umbral_fallos=1, tiempo_apertura=0.02, tiempo_apertura_max=0.05, sonda=sonda)
+    servicio = Servicio()
+    _fallar(circuito, servicio, 1)
+    assert _esperar(lambda: sonda.llamadas >= 3)
+    with pytest.raises(CircuitoAbierto):
+        circuito.llamar(servicio)
+    assert servicio.llamadas == 1
+    assert circuito.estado == "abierto"
+
+    sonda.caido = False
+    assert _esperar(lambda: circuito.estado == "cerrado")
+    servicio.caido = False
+    assert circuito.llamar(servicio) == "ok"
+    assert not circuito._sondeando
+
+
+class ProveedorCaido(ProveedorClima):
+    def __init__(self, ruta_ultimo_bueno):
+        super().__init__("clave", "clave", ruta_ultimo_bueno=ruta_ultimo_bueno)
+        self.aemet = Servicio()
+        self.circuito_aemet = Cortacircuitos("aemet", umbral_fallos=2, tiempo_apertura=60)
+
+    def _llamar_aemet(self):
+        return self.aemet()
+
+
+def test_con_aemet_abierto_se_sirve_el_ultimo_bueno(tmp_path):
+    ruta = tmp_path / "ultimo_clima.json"
+    ultimo = {"fecha": "2026-10-16T00:00:00", "tmax": 18, "tmin": 6, "lluvia": 20, "UV": 3}
+    ruta.write_text(json.dumps({"datos": ultimo, "guardado_en": time.time() - 3600}), encoding="utf-8")
+    proveedor = ProveedorCaido(str(ruta))
+    for _ in range(2):
+        with pytest.raises(ConnectionError):
+            proveedor.prevision_aemet()
+    assert proveedor.prevision_aemet() == dict(ultimo, respaldo="ultimo_bueno")
+    assert proveedor.aemet.llamadas == 2
+
+    ruta.unlink()
+    assert proveedor.prevision_aemet()["respaldo"] == "climatologia"
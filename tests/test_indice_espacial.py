@@ -0,0 +1,64 @@
+import time
+
+import numpy as np
+import pytest
+
+from indice_espacial import IndiceEspacial, haversine_km
+
+
+@pytest.fixture(scope="module")
+def indice():
+    rng = np.random.default_rng(0)
+    n = 2000
+    lats = 39.9 + rng.uniform(-0.5, 0.5, n)
+    lons = -1.8 + rng.uniform(-0.6, 0.6, n)
+    return IndiceEspacial([f"l{i}" for i in range(n)], lats, lons)
+
+
+def _bruta(indice, lat, lon, k=None, radio=None):
+    d = haversine_km(lat, lon, indice.lats, indice.lons)
+    orden = np.argsort(d, kind="stable")
+    if radio is not None:
+        orden = orden[d[orden] <= radio]
+    if k is not None:
+        orden = orden[:k]
+    return [indice.claves[i] for i in orden]
+
+
+@pytest.mark.parametrize("lat,lon", [(39.9, -1.8), (40.3, -2.3), (39.45, -1.25)])
+def test_k_cercanos_coincide_con_fuerza_bruta(indice, lat, lon):
+    assert [c for c, _ in indice.k_cercanos(lat, lon, 7)] == _bruta(indice, lat, lon, k=7)
+
+
+def test_en_radio_coincide_con_fuerza_bruta(indice):
+    assert [c for c, _ in indice.en_radio(39.9, -1.8, 5.0)] == _bruta(indice, 39.9, -1.8, radio=5.0)
+
+
+@pytest.mark.parametrize("lat,lon", [(0.0, 0.0), (-60.0, 170.0), (41.5, -1.8)])
+def test_consulta_lejana_es_rapida_y_correcta(indice, lat, lon):
+    inicio = time.perf_counter()
+    resultado = indice.k_cercanos(lat, lon, 5)
+    assert time.perf_counter() - inicio < 0.5
+    assert [c for c, _ in resultado] == _bruta(indice, lat, lon, k=5)
+    assert indice.k_cercanos(lat, lon, 5, radio_max_km=10) == []
+
+
+def test_radio_enorme_no_recorre_la_rejilla(indice):
+    inicio = time.perf_counter()
+    resultado = indice.en_radio(39.9, -1.8, 20000)
+    assert time.perf_counter() - inicio < 0.5
+    assert len(resultado) == len(indice)
+
+
+def test_permitidos_y_cercanos_a(indice):
+    permitidos = set(indice.claves[::3])
+    resultado = indice.cercanos_a("l0", 4, permitidos=permitidos)
+    assert "l0" not in [c for c, _ in resultado]
+    assert all(c in permitidos for c, _ in resultado)
+    assert len(resultado) == 4
+
+
+def test_distancia_extension(indice):
+    assert indice.distancia_extension_km(39.9, -1.8) == 0.0
+    assert 100 < indice.distancia_extension_km(42.0, -1.8) < 200
+    assert indice.distancia_extension_km(-60.0, 170.0) > 10000
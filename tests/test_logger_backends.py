@@ -0,0 +1,131 @@
+import os
+
+import pytest
+
+from logger_backends import BackendEnrutado, BackendEventos, crear_backend
+
+
+class BackendFalso(BackendEventos):
+    def __init__(self):
+        self.filas = []
+        self.fallar = False
+
+    def append_rows(self, filas):
+        if self.fallar:
+            raise ConnectionError("no disponible")
+        self.filas.extend(filas)
+
+
+def fila(i, evento):
+    return [f"2026-10-17T10:00:{i:02d}", evento, "{}"]
+
+
+def test_enrutado_no_duplica_al_reenviar_tras_un_fallo():
+    hoja, local = BackendFalso(), BackendFalso()
+    enrutado = BackendEnrutado(hoja, {"predicted": local})
+    lote = [fila(0, "predicted"), fila(1, "app_open"), fila(2, "predicted")]
+
+    hoja.fallar = True
+    with pytest.raises(ConnectionError):
+        enrutado.append_rows(lote)
+    # Antes de recuperarse la hoja, el spool reenvía el mismo lote.
+    with pytest.raises(ConnectionError):
+        enrutado.append_rows(lote)
+    assert local.filas == [fila(0, "predicted"), fila(2, "predicted")]
+
+    # El reenvío puede traer filas nuevas detrás de las del lote fallido.
+    hoja.fallar = False
+    enrutado.append_rows(lote + [fila(3, "predicted")])
+    assert local.filas == [fila(0, "predicted"), fila(2, "predicted"), fila(3, "predicted")]
+    assert hoja.filas == [fila(1, "app_open")]
+
+    # Tras un envío completo, el siguiente lote se manda entero.
+    enrutado.append_rows([fila(0, "predicted")])
+    assert local.filas[-1] == fila(0, "predicted") and len(local.filas) == 4
+
+
+def test_jsonl_y_parquet_no_comparten_directorio(tmp_path):
+    pytest.importorskip("pyarrow")
+    jsonl = crear_backend("jsonl", ficheros_dir=str(tmp_path))
+    parquet = crear_backend("parquet", ficheros_dir=str(tmp_path))
+    assert jsonl.directorio != parquet.directorio
+    jsonl.append_rows([fila(0, "a")])
+    parquet.append_rows([fila(1, "b")])
+    assert list(jsonl.leer()["evento"]) == ["a"]
+    assert list(parquet.leer()["evento"]) == ["b"]
+    jsonl.cerrar()
+
+
+def test_parquet_compacta_las_partes_de_cada_dia(tmp_path):
+    pytest.importorskip("pyarrow")
+    from logger_backends import BackendParquet
+
+    backend = BackendParquet(str(tmp_path), compactar_partes=5)
+    for lote in range(12):
+        backend.append_rows([fila(i, f"e{lote}") for i in range(3)])
+    particion = tmp_path / "fecha_dia=2026-10-17"
+    partes = [n for n in os.listdir(particion) if n.endswith(".parquet")]
+    # 12 lotes: dos compactaciones (a los 5 y a los 10) y dos partes sueltas.
+    assert backend.compactaciones == 2
+    assert len(partes) == 3
+    df = backend.leer()
+    assert len(df) == 36
+    assert sorted(df["evento"].unique()) == sorted(f"e{i}" for i in range(12))
+
+
+def test_enrutado_reenvio_mas_corto_o_distinto():
+    hoja, local = BackendFalso(), BackendFalso()
+    enrutado = BackendEnrutado(hoja, {"predicted": local})
+    p0, a1, p2, p3 = fila(0, "predicted"), fila(1, "app_open"), fila(2, "predicted"), fila(3, "predicted")
+
+    hoja.fallar = True
+    with pytest.raises(ConnectionError):
+        enrutado.append_rows([p0, a1, p2])
+    # Reenvío más corto: local ya tiene p0 (y p2, que llegará en el siguiente).
+    hoja.fallar = False
+    enrutado.append_rows([p0, a1])
+    assert local.filas == [p0, p2]
+    enrutado.append_rows([p2, p3])
+    assert local.filas == [p0, p2, p3]
+    assert hoja.filas == [a1]
+
+    # Un reenvío que no empieza igual se manda entero.
+    hoja.fallar = True
+    with pytest.raises(ConnectionError):
+        enrutado.append_rows([p0, a1])
+    hoja.fallar = False
+    enrutado.append_rows([p3, a1])
+    assert local.filas == [p0, p2, p3, p0, p3]
+
+
+def test_enrutado_filas_repetidas_en_lotes_correctos():
+    local = BackendFalso()
+    enrutado = BackendEnrutado(BackendFalso(), {"predicted": local})
+    enrutado.append_rows([fila(0, "predicted")])
+    enrutado.append_rows([fila(0, "predicted")])
+    assert local.filas == [fila(0, "predicted")] * 2
+
+
+def test_parquet_leer_durante_una_escritura(tmp_path, monkeypatch):
+    pytest.importorskip("pyarrow")
+    import pyarrow.parquet as pq
+    from logger_backends import BackendParquet
+
+    backend = BackendParquet(str(tmp_path))
+    backend.append_rows([fila(0, "a")])
+    escribir = pq.write_table
+    leidos = []
+
+    def escribir_a_medias(tabla, ruta, **opciones):
+        # El temporal existe (a medio escribir) cuando alguien lee.
+        with open(ruta, "wb") as f:
+            f.write(b"PAR1 a medias")
+        leidos.append(list(backend.leer()["evento"]))
+        escribir(tabla, ruta, **opciones)
+
+    monkeypatch.setattr(pq, "write_table", escribir_a_medias)
+    backend.append_rows([fila(1, "b")])
+    monkeypatch.undo()
+    assert leidos == [["a"]]
+    assert sorted(backend.leer()["evento"]) == ["a", "b"]
+    assert not [n for n in os.listdir(tmp_path / "fecha_dia=2026-10-17") if n.endswith(".tmp")]
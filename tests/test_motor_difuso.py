@@ -0,0 +1,76 @@
+import os
+
+import numpy as np
+import pytest
+
+pytest.importorskip("skfuzzy")
+from motor_difuso import (
+    ANTECEDENTES,
+    RUTA_LUT,
+    TOLERANCIA_VALIDACION,
+    MotorNumPy,
+    cargar_lut,
+    construir_sistema_difuso,
+    simular,
+)
+
+# skfuzzy avisa de un uso obsoleto de np.maximum en cada simulación.
+pytestmark = pytest.mark.filterwarnings("ignore::DeprecationWarning")
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture(scope="module")
+def sistema():
+    return construir_sistema_difuso()
+
+
+@pytest.fixture(scope="module")
+def motor_numpy():
+    return MotorNumPy()
+
+
+@pytest.fixture(scope="module")
+def motor_lut(motor_numpy):
+    return cargar_lut(os.path.join(RAIZ, RUTA_LUT), respaldo=motor_numpy)
+
+
+def _puntos(n, semilla, decimales):
+    rng = np.random.default_rng(semilla)
+    rangos = [ANTECEDENTES[nombre][0] for nombre in ANTECEDENTES]
+    if decimales:
+        return [[round(float(rng.uniform(lo, hi)), 2) for lo, hi in rangos] for _ in range(n)]
+    return [[int(rng.integers(lo, hi + 1)) for lo, hi in rangos] for _ in range(n)]
+
+
+def _comparar(motor, sistema, puntos, tolerancia):
+    for punto in puntos:
+        esperado = simular(sistema, *punto)
+        obtenido = motor.puntuar(*punto)
+        if esperado is None:
+            assert obtenido is None, punto
+        else:
+            assert obtenido == pytest.approx(esperado, abs=tolerancia), punto
+
+
+def test_numpy_igual_que_skfuzzy(motor_numpy, sistema):
+    _comparar(motor_numpy, sistema, _puntos(150, 0, decimales=False), 1e-6)
+    _comparar(motor_numpy, sistema, _puntos(150, 1, decimales=True), 1e-6)
+
+
+def test_lut_igual_que_skfuzzy_en_la_rejilla(motor_lut, sistema):
+    _comparar(motor_lut, sistema, _puntos(200, 2, decimales=False), 1e-5)
+
+
+def test_lut_interpola_dentro_de_la_tolerancia(motor_lut, sistema):
+    # Como llegan de AEMET y OpenUV: enteros salvo el UV.
+    puntos = [p[:-1] + [q[-1]] for p, q in zip(_puntos(200, 3, False), _puntos(200, 4, True))]
+    _comparar(motor_lut, sistema, puntos, TOLERANCIA_VALIDACION)
+
+
+@pytest.mark.parametrize("nombre", ["motor_numpy", "motor_lut"])
+def test_lote_igual_que_uno_a_uno(nombre, request):
+    motor = request.getfixturevalue(nombre)
+    puntos = np.array(_puntos(300, 5, decimales=True))
+    lote = motor.puntuar_lote(*puntos.T)
+    uno_a_uno = np.array([np.nan if (v := motor.puntuar(*p)) is None else v for p in puntos])
+    np.testing.assert_allclose(lote, uno_a_uno, atol=1e-9, equal_nan=True)
@@ -0,0 +1,56 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+pytest.importorskip("sklearn")
+
+import modelo_plano
+from recomendador import (
+    COLUMNAS_ENTRENAMIENTO,
+    LUGARES_MODELO,
+    codificar_matriz,
+    crear_prediccion_lote,
+    crear_prediccion_rapida,
+    perfiles_aleatorios,
+)
+
+
+@pytest.fixture(scope="module")
+def modelo(fabrica_modelos):
+    return fabrica_modelos()
+
+
+@pytest.fixture(scope="module")
+def perfiles():
+    return perfiles_aleatorios(300, semilla=7)
+
+
+def _esperadas(modelo, perfiles):
+    return modelo.predict(pd.DataFrame(perfiles)[COLUMNAS_ENTRENAMIENTO])
+
+
+def test_prediccion_rapida_igual_que_dataframe(modelo, perfiles):
+    rapida = crear_prediccion_rapida(modelo)
+    esperadas = _esperadas(modelo, perfiles)
+    assert [rapida(p) for p in perfiles] == [tuple(int(v) for v in fila) for fila in esperadas]
+
+
+def test_prediccion_lote_igual_que_dataframe(modelo, perfiles):
+    matriz = codificar_matriz(pd.DataFrame(perfiles))
+    esperadas = _esperadas(modelo, perfiles)
+    for rapido in (True, False):
+        lote = crear_prediccion_lote(modelo, rapido=rapido)(matriz)
+        assert lote.dtype == np.int8
+        np.testing.assert_array_equal(lote, esperadas)
+
+
+def test_modelo_plano_igual_que_dataframe(modelo, perfiles, tmp_path):
+    ruta = str(tmp_path / "modelo.arboles")
+    modelo_plano.exportar(modelo, ruta)
+    plano = modelo_plano.cargar(ruta)
+    assert plano.n_outputs_ == len(LUGARES_MODELO)
+    esperadas = _esperadas(modelo, perfiles)
+    np.testing.assert_array_equal(plano.predecir_matriz(codificar_matriz(pd.DataFrame(perfiles))), esperadas)
+    np.testing.assert_array_equal(plano.predict(pd.DataFrame(perfiles)), esperadas)
+    rapida = crear_prediccion_rapida(plano)
+    assert [rapida(p) for p in perfiles[:50]] == [tuple(int(v) for v in fila) for fila in esperadas[:50]]
@@ -0,0 +1,64 @@
+import os
+
+import joblib
+import pandas as pd
+import pytest
+
+from recomendador import COLUMNAS_ENTRENAMIENTO, PredictorCacheado, perfiles_aleatorios
+
+
+@pytest.fixture
+def ruta_modelo(tmp_path, fabrica_modelos):
+    ruta = str(tmp_path / "modelo.pkl")
+    joblib.dump(fabrica_modelos(), ruta)
+    return ruta
+
+
+def test_si_el_stat_falla_sigue_con_el_modelo_actual(ruta_modelo):
+    predictor = PredictorCacheado(ruta_modelo, intervalo_comprobacion=0)
+    modelo = predictor.modelo()
+    os.rename(ruta_modelo, ruta_modelo + ".bak")
+
+    assert predictor.modelo() is modelo
+    assert predictor.error_recarga
+
+    # Cuando vuelve el mismo fichero se resuelve de nuevo, sin recargar.
+    os.rename(ruta_modelo + ".bak", ruta_modelo)
+    assert predictor.modelo() is modelo
+    assert predictor.error_recarga is None
+    assert predictor.recargas == 1
+
+
+def test_en_la_primera_carga_el_error_se_propaga(tmp_path):
+    with pytest.raises(OSError):
+        PredictorCacheado(str(tmp_path / "no_existe.pkl")).modelo()
+
+
+def _predichas(modelo, perfil):
+    fila = modelo.predict(pd.DataFrame([perfil])[COLUMNAS_ENTRENAMIENTO])[0]
+    return tuple(int(v) for v in fila)
+
+
+def test_predicciones_memorizadas_por_perfil(ruta_modelo, fabrica_modelos):
+    predictor = PredictorCacheado(ruta_modelo)
+    perfil = perfiles_aleatorios(1, semilla=3)[0]
+    assert predictor.predecir(perfil) == _predichas(fabrica_modelos(), perfil)
+    # Mismo vector codificado aunque cambie el orden de las claves o falten
+    # columnas a 0.
+    reordenado = dict(reversed(list(perfil.items())))
+    sin_ceros = {k: v for k, v in perfil.items() if v != 0}
+    assert predictor.predecir(reordenado) == predictor.predecir(sin_ceros) == predictor.predecir(perfil)
+    estadisticas = predictor.cache.estadisticas()
+    assert (estadisticas["fallos"], estadisticas["aciertos"]) == (1, 3)
+
+
+def test_una_recarga_no_sirve_predicciones_del_modelo_anterior(ruta_modelo, fabrica_modelos):
+    anterior, nuevo = fabrica_modelos(), fabrica_modelos(3)
+    perfil = next(p for p in perfiles_aleatorios(200, semilla=4) if _predichas(anterior, p) != _predichas(nuevo, p))
+    predictor = PredictorCacheado(ruta_modelo, intervalo_comprobacion=0)
+    assert predictor.predecir(perfil) == _predichas(anterior, perfil)
+
+    joblib.dump(nuevo, ruta_modelo)
+    assert predictor.predecir(perfil) == _predichas(nuevo, perfil)
+    assert predictor.recargas == 2
+    assert predictor.cache.estadisticas()["invalidaciones"] == 2
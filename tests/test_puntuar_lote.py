@@ -0,0 +1,69 @@
+import json
+
+import joblib
+import pandas as pd
+import pytest
+
+import puntuar_lote
+from recomendador import COLUMNAS_ENTRENAMIENTO, LUGARES_MODELO, perfiles_aleatorios
+
+
+@pytest.fixture
+def ruta_modelo(tmp_path, fabrica_modelos):
+    ruta = str(tmp_path / "modelo.pkl")
+    joblib.dump(fabrica_modelos(), ruta)
+    return ruta
+
+
+@pytest.fixture
+def perfiles():
+    df = pd.DataFrame(perfiles_aleatorios(23, semilla=5))[COLUMNAS_ENTRENAMIENTO]
+    df.insert(0, "user_id", [f"u{i}" for i in range(len(df))])
+    return df
+
+
+def leer(ruta):
+    if ruta.endswith(".csv"):
+        return pd.read_csv(ruta)
+    return pd.read_json(ruta, lines=True, dtype=False)
+
+
+@pytest.mark.parametrize("extension", [".csv", ".jsonl"])
+def test_cli_puntua_por_bloques(tmp_path, capsys, ruta_modelo, perfiles, fabrica_modelos, extension):
+    entrada = str(tmp_path / f"perfiles{extension}")
+    salida = str(tmp_path / "salida" / f"puntuados{extension}")
+    if extension == ".csv":
+        perfiles.to_csv(entrada, index=False)
+    else:
+        perfiles.to_json(entrada, orient="records", lines=True)
+
+    assert puntuar_lote.main([entrada, salida, "--modelo", ruta_modelo, "--tam-bloque", "5",
+                              "--conservar", "user_id"]) == 0
+    resultado = json.loads(capsys.readouterr().out)
+    assert resultado["filas"] == 23
+    assert resultado["bloques"] == 5
+
+    df = leer(salida)
+    assert list(df.columns) == ["user_id"] + LUGARES_MODELO
+    assert len(df) == 23
+    assert list(df["user_id"]) == list(perfiles["user_id"])
+    esperado = fabrica_modelos().predict(perfiles[COLUMNAS_ENTRENAMIENTO])
+    assert (df[LUGARES_MODELO].to_numpy() == esperado).all()
+
+
+def test_cli_con_clima_aplica_el_filtro(tmp_path, capsys, ruta_modelo, perfiles):
+    entrada = str(tmp_path / "perfiles.csv")
+    perfiles.to_csv(entrada, index=False)
+    salida = str(tmp_path / "puntuados.jsonl")
+
+    # Con lluvia fuerte el filtro solo puede quitar recomendaciones.
+    assert puntuar_lote.main([entrada, salida, "--modelo", ruta_modelo, "--tam-bloque", "10",
+                              "--clima", "12", "5", "40", "1"]) == 0
+    resultado = json.loads(capsys.readouterr().out)
+    assert resultado["filas"] == 23 and resultado["bloques"] == 3
+    assert resultado["score_exterior"] is not None
+    sin_filtro = str(tmp_path / "sin_filtro.jsonl")
+    puntuar_lote.main([entrada, sin_filtro, "--modelo", ruta_modelo])
+    con, sin = leer(salida), leer(sin_filtro)
+    assert list(con.columns) == LUGARES_MODELO
+    assert (con.to_numpy() <= sin.to_numpy()).all()
@@ -0,0 +1,110 @@
+import json
+import threading
+import time
+
+import joblib
+import pandas as pd
+import pytest
+
+import registro_modelos
+from recomendador import COLUMNAS_ENTRENAMIENTO, PredictorCacheado, cargar_modelo, perfiles_aleatorios
+
+
+def _predichas(modelo, perfil):
+    fila = modelo.predict(pd.DataFrame([perfil])[COLUMNAS_ENTRENAMIENTO])[0]
+    return tuple(int(v) for v in fila)
+
+
+@pytest.fixture
+def registro(tmp_path, fabrica_modelos):
+    # Registro con la versión v1 activa y los dos modelos en disco para
+    # publicar; `perfil` da predicciones distintas con cada uno.
+    anterior, nuevo = fabrica_modelos(), fabrica_modelos(3)
+    for nombre, modelo in (("v1.pkl", anterior), ("v2.pkl", nuevo)):
+        joblib.dump(modelo, tmp_path / nombre)
+    directorio = str(tmp_path / "modelos")
+    registro_modelos.publicar(str(tmp_path / "v1.pkl"), "v1", directorio)
+    perfil = next(p for p in perfiles_aleatorios(200, semilla=4) if _predichas(anterior, p) != _predichas(nuevo, p))
+    return {"directorio": directorio, "origen": tmp_path, "anterior": anterior, "nuevo": nuevo, "perfil": perfil}
+
+
+def test_cambio_en_caliente_al_publicar_y_activar(registro):
+    predictor = PredictorCacheado(registro["directorio"], intervalo_comprobacion=0)
+    perfil = registro["perfil"]
+    assert predictor.predecir_con_version(perfil) == (_predichas(registro["anterior"], perfil), "v1")
+
+    registro_modelos.publicar(str(registro["origen"] / "v2.pkl"), "v2", registro["directorio"])
+    assert predictor.predecir_con_version(perfil) == (_predichas(registro["nuevo"], perfil), "v2")
+
+    registro_modelos.activar("v1", registro["directorio"])
+    assert predictor.predecir_con_version(perfil) == (_predichas(registro["anterior"], perfil), "v1")
+    assert predictor.recargas == 3
+    assert predictor.error_recarga is None
+
+
+def test_publicar_sin_activar_no_cambia_el_modelo(registro):
+    predictor = PredictorCacheado(registro["directorio"], intervalo_comprobacion=0)
+    registro_modelos.publicar(str(registro["origen"] / "v2.pkl"), "v2", registro["directorio"], activar=False)
+    assert predictor.version_modelo == "v1"
+    with pytest.raises(ValueError):
+        registro_modelos.publicar(str(registro["origen"] / "v2.pkl"), "v2", registro["directorio"])
+
+
+def test_hash_distinto_sigue_con_el_anterior(registro):
+    predictor = PredictorCacheado(registro["directorio"], intervalo_comprobacion=0)
+    modelo = predictor.modelo()
+    entrada = registro_modelos.publicar(str(registro["origen"] / "v2.pkl"), "v2", registro["directorio"], activar=False)
+    with open(f"{registro['directorio']}/{entrada['fichero']}", "ab") as f:
+        f.write(b"\0")
+    registro_modelos.activar("v2", registro["directorio"])
+
+    assert predictor.modelo() is modelo
+    assert predictor.version_modelo == "v1"
+    assert "hash" in predictor.error_recarga
+    assert registro_modelos.verificar(registro["directorio"])["modelos"] == {"v1": "ok", "v2": "hash distinto"}
+
+
+def test_esquema_distinto_sigue_con_el_anterior(registro):
+    predictor = PredictorCacheado(registro["directorio"], intervalo_comprobacion=0)
+    predictor.modelo()
+    ruta = registro_modelos.ruta_manifiesto(registro["directorio"])
+    with open(ruta, encoding="utf-8") as f:
+        manifiesto = json.load(f)
+    manifiesto["modelos"]["v1"]["salidas"] = manifiesto["modelos"]["v1"]["salidas"][:-1]
+    registro_modelos._escribir_manifiesto(registro["directorio"], manifiesto)
+
+    assert predictor.version_modelo == "v1"
+    assert "esquema" in predictor.error_recarga
+    with pytest.raises(ValueError):
+        registro_modelos.activar("v1", registro["directorio"])
+
+
+def test_mientras_se_carga_el_nuevo_se_sirve_el_anterior(registro):
+    cargando = threading.Event()
+
+    def cargar_lento(ruta):
+        if predictor.recargas:
+            cargando.set()
+            time.sleep(0.5)
+        return cargar_modelo(ruta)
+
+    predictor = PredictorCacheado(registro["directorio"], cargar=cargar_lento, intervalo_comprobacion=0)
+    perfil = registro["perfil"]
+    predictor.predecir(perfil)
+    registro_modelos.publicar(str(registro["origen"] / "v2.pkl"), "v2", registro["directorio"])
+
+    recarga = threading.Thread(target=predictor.predecir, args=(perfil,))
+    recarga.start()
+    assert cargando.wait(2)
+    inicio = time.monotonic()
+    assert predictor.predecir_con_version(perfil) == (_predichas(registro["anterior"], perfil), "v1")
+    assert time.monotonic() - inicio < 0.2
+    recarga.join()
+    assert predictor.predecir_con_version(perfil) == (_predichas(registro["nuevo"], perfil), "v2")
+
+
+def test_version_plana_en_el_registro(registro):
+    registro_modelos.publicar(str(registro["origen"] / "v2.pkl"), "v2-plano", registro["directorio"], plano=True)
+    predictor = PredictorCacheado(registro["directorio"])
+    perfil = registro["perfil"]
+    assert predictor.predecir_con_version(perfil) == (_predichas(registro["nuevo"], perfil), "v2-plano")
@@ -0,0 +1,253 @@
+import json
+import os
+import time
+
+import pytest
+
+import logger_gsheets
+from logger_gsheets import (
+    EscritorEventos,
+    ReplicadorSpool,
+    SpoolEnUso,
+    SpoolEventos,
+    adoptar_spools_huerfanos,
+    ruta_spool_proceso,
+)
+
+
+class HojaFalsa:
+    # append_rows que guarda las filas y falla mientras `fallar` sea True.
+    def __init__(self):
+        self.filas = []
+        self.llamadas = []
+        self.fallar = False
+
+    def append_rows(self, filas, value_input_option=None):
+        self.llamadas.append(time.monotonic())
+        if self.fallar:
+            raise ConnectionError("hoja no disponible")
+        self.filas.extend(filas)
+
+
+def fila(i):
+    return ["2026-10-17T10:00:00", "evento", json.dumps({"i": i})]
+
+
+def leer_offset(spool):
+    with open(spool.ruta_offset, encoding="utf-8") as f:
+        return int(f.read())
+
+
+def test_reenvia_lo_pendiente_tras_reiniciar(tmp_path):
+    ruta = str(tmp_path / "spool.jsonl")
+    spool = SpoolEventos(ruta)
+    for i in range(3):
+        spool.anadir(fila(i))
+    spool.cerrar()
+
+    spool = SpoolEventos(ruta)
+    assert spool.pendientes == 3
+    hoja = HojaFalsa()
+    assert ReplicadorSpool(spool, hoja, tam_lote=2).replicar() == 3
+    assert hoja.filas == [fila(i) for i in range(3)]
+    spool.cerrar()
+
+    # Lo confirmado no se vuelve a enviar.
+    spool = SpoolEventos(ruta)
+    assert spool.pendientes == 0
+    assert ReplicadorSpool(spool, hoja).replicar() == 0
+    spool.cerrar()
+
+
+def test_repara_una_ultima_linea_cortada(tmp_path):
+    ruta = str(tmp_path / "spool.jsonl")
+    spool = SpoolEventos(ruta)
+    spool.anadir(fila(0))
+    spool.cerrar()
+    with open(ruta, "ab") as f:
+        f.write(b'["2026-10-17T10:00:01", "evento", "{\\"i\\": ')
+    tam_sano = len((json.dumps(fila(0), ensure_ascii=False) + "\n").encode("utf-8"))
+
+    spool = SpoolEventos(ruta)
+    assert os.path.getsize(ruta) == tam_sano
+    assert spool.pendientes == 1
+    spool.anadir(fila(1))
+    hoja = HojaFalsa()
+    assert ReplicadorSpool(spool, hoja).replicar() == 2
+    assert hoja.filas == [fila(0), fila(1)]
+    spool.cerrar()
+
+
+def test_compactar_reinicia_el_offset(tmp_path):
+    ruta = str(tmp_path / "spool.jsonl")
+    spool = SpoolEventos(ruta, compactar_bytes=1)
+    hoja = HojaFalsa()
+    replicador = ReplicadorSpool(spool, hoja, tam_lote=10)
+    for i in range(4):
+        spool.anadir(fila(i))
+    assert replicador.replicar() == 4
+    assert os.path.getsize(ruta) == 0
+    assert leer_offset(spool) == 0
+
+    spool.anadir(fila(4))
+    assert replicador.replicar() == 1
+    assert hoja.filas == [fila(i) for i in range(5)]
+    spool.cerrar()
+
+
+def test_sin_compactar_mientras_quedan_pendientes(tmp_path):
+    ruta = str(tmp_path / "spool.jsonl")
+    spool = SpoolEventos(ruta, compactar_bytes=1)
+    for i in range(3):
+        spool.anadir(fila(i))
+    assert ReplicadorSpool(spool, HojaFalsa(), tam_lote=2).replicar(max_lotes=1) == 2
+    assert leer_offset(spool) > 0
+    assert spool.pendientes == 1
+    spool.cerrar()
+
+
+def test_un_fallo_no_avanza_el_offset(tmp_path):
+    spool = SpoolEventos(str(tmp_path / "spool.jsonl"))
+    hoja = HojaFalsa()
+    escritor = EscritorEventos(ReplicadorSpool(spool, hoja), intervalo_flush=60)
+    for i in range(3):
+        spool.anadir(fila(i))
+
+    hoja.fallar = True
+    assert escritor._replicar() is False
+    assert escritor.lotes_fallidos == 1
+    assert isinstance(escritor.ultimo_error, ConnectionError)
+    assert not os.path.exists(spool.ruta_offset)
+    assert spool.pendientes == 3
+
+    hoja.fallar = False
+    assert escritor._replicar() is True
+    assert escritor.enviados == 3
+    assert hoja.filas == [fila(i) for i in range(3)]
+    spool.cerrar()
+
+
+def test_backoff_exponencial_mientras_falla(tmp_path):
+    spool = SpoolEventos(str(tmp_path / "spool.jsonl"))
+    hoja = HojaFalsa()
+    hoja.fallar = True
+    escritor = EscritorEventos(ReplicadorSpool(spool, hoja), intervalo_flush=0.02, espera_max_reintento=0.16)
+    escritor.registrar(fila(0))
+    time.sleep(0.8)
+    escritor._parar.set()
+    escritor._aviso.set()
+    escritor._hilo.join(1)
+
+    # Sin backoff serían ~40 intentos; con él, 0.02+0.04+0.08+0.16+0.16...
+    assert 3 <= len(hoja.llamadas) <= 10
+    esperas = [b - a for a, b in zip(hoja.llamadas, hoja.llamadas[1:])]
+    assert esperas[1] > esperas[0] * 1.5
+    assert max(esperas) < 0.16 * 2
+    assert spool.pendientes == 1
+    assert not os.path.exists(spool.ruta_offset)
+    spool.cerrar()
+
+
+def test_registrar_no_se_salta_el_backoff(tmp_path):
+    # Con la hoja caída y lotes llenos en cada evento, los intentos siguen
+    # la espera exponencial y no uno por evento.
+    spool = SpoolEventos(str(tmp_path / "spool.jsonl"))
+    hoja = HojaFalsa()
+    hoja.fallar = True
+    escritor = EscritorEventos(ReplicadorSpool(spool, hoja, tam_lote=5), intervalo_flush=0.05, espera_max_reintento=0.4)
+    for i in range(200):
+        escritor.registrar(fila(i))
+        time.sleep(0.01)
+    escritor._parar.set()
+    escritor._aviso.set()
+    escritor._hilo.join(1)
+
+    # 0.05+0.1+0.2+0.4+0.4+0.4... en ~2 s: unos 7 intentos (196 sin backoff).
+    assert 3 <= len(hoja.llamadas) <= 12
+    assert spool.pendientes == 200
+    spool.cerrar()
+
+
+def test_tras_recuperarse_vuelve_a_enviar_por_lotes(tmp_path):
+    spool = SpoolEventos(str(tmp_path / "spool.jsonl"))
+    hoja = HojaFalsa()
+    escritor = EscritorEventos(ReplicadorSpool(spool, hoja, tam_lote=5), intervalo_flush=60)
+    escritor._reintentando = True
+    for i in range(5):
+        escritor.registrar(fila(i))
+    assert not escritor._aviso.is_set()
+    escritor._reintentando = False
+    escritor.registrar(fila(5))
+    assert escritor._aviso.is_set() or hoja.filas
+    escritor.cerrar()
+    assert len(hoja.filas) == 6
+    spool.cerrar()
+
+
+def test_ruta_por_proceso():
+    assert ruta_spool_proceso("logs/eventos_spool.jsonl", pid=123) == "logs/eventos_spool.123.jsonl"
+    assert ruta_spool_proceso("spool", pid=7) == "spool.7"
+
+
+@pytest.mark.skipif(logger_gsheets.fcntl is None, reason="sin flock")
+def test_un_spool_abierto_no_se_comparte(tmp_path):
+    ruta = str(tmp_path / "spool.jsonl")
+    spool = SpoolEventos(ruta)
+    with pytest.raises(SpoolEnUso):
+        SpoolEventos(ruta)
+    spool.cerrar()
+    SpoolEventos(ruta).cerrar()
+
+
+@pytest.mark.skipif(logger_gsheets.fcntl is None, reason="sin flock")
+def test_adopta_los_spools_de_procesos_muertos(tmp_path):
+    base = str(tmp_path / "eventos_spool.jsonl")
+    # Un proceso que ya terminó, con una fila confirmada y dos pendientes.
+    muerto = SpoolEventos(ruta_spool_proceso(base, pid=111))
+    hoja = HojaFalsa()
+    muerto.anadir(fila(0))
+    ReplicadorSpool(muerto, hoja).replicar()
+    muerto.anadir(fila(1))
+    muerto.anadir(fila(2))
+    muerto.cerrar()
+    # El spool compartido de versiones anteriores.
+    antiguo = SpoolEventos(base)
+    antiguo.anadir(fila(3))
+    antiguo.cerrar()
+    # Uno que sigue vivo: no se toca.
+    vivo = SpoolEventos(ruta_spool_proceso(base, pid=222))
+    vivo.anadir(fila(9))
+
+    spool = SpoolEventos(ruta_spool_proceso(base, pid=333))
+    assert adoptar_spools_huerfanos(spool, base) == 3
+    assert not os.path.exists(ruta_spool_proceso(base, pid=111))
+    assert not os.path.exists(base)
+    assert vivo.pendientes == 1 and os.path.exists(vivo.ruta)
+
+    ReplicadorSpool(spool, hoja).replicar()
+    assert sorted(hoja.filas[1:]) == sorted([fila(1), fila(2), fila(3)])
+    spool.cerrar()
+    vivo.cerrar()
+
+
+@pytest.mark.skipif(logger_gsheets.fcntl is None, reason="sin flock")
+def test_adopcion_con_el_spool_lleno_no_pierde_filas(tmp_path):
+    base = str(tmp_path / "eventos_spool.jsonl")
+    muerto = SpoolEventos(ruta_spool_proceso(base, pid=111))
+    for i in range(5):
+        muerto.anadir(fila(i))
+    muerto.cerrar()
+
+    spool = SpoolEventos(ruta_spool_proceso(base, pid=333), max_pendientes=3)
+    assert adoptar_spools_huerfanos(spool, base) == 3
+    assert os.path.exists(muerto.ruta)
+    assert adoptar_spools_huerfanos(spool, base) == 0
+
+    # Con sitio libre, el siguiente paso adopta el resto y lo borra.
+    hoja = HojaFalsa()
+    ReplicadorSpool(spool, hoja).replicar()
+    assert adoptar_spools_huerfanos(spool, base) == 2
+    assert not os.path.exists(muerto.ruta)
+    ReplicadorSpool(spool, hoja).replicar()
+    assert hoja.filas == [fila(i) for i in range(5)]
+    spool.cerrar()